@@ -1,18 +1,29 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from src.processors.ai_processor import process_interview_with_ai
+from typing import Dict, List, Optional
+from src.processors.ai_processor import stream_interview_with_ai, reprocess_interview_with_ai, segment_cache
+from src.processors.duplicates import find_duplicate_interviews, duplicate_interview_groups
 from src.utils.file_handlers import read_file_content
 from src.utils.storage import (
+    generate_interview_filename,
     save_interview,
     load_interviews,
     delete_interview,
     mark_for_analysis,
     save_analysis_version,
+    analysis_to_dict,
+    generate_analysis_version_filename,
     load_analysis_versions,
     get_latest_analysis_version
 )
-from src.models import Interview, Statement, StatementType
+from src.models import Analysis, Interview, Statement, StatementType
+from src.config import PATTERN_RECOGNITION, SENTIMENT_ANALYSIS, NETWORK_GRAPH_MIN_EDGE_WEIGHT
+from src.utils.usage import summarize_usage
+from src.utils.rate_limiter import scheduler
+from src.utils.tracing import tracer
+from src.utils.ledger import ledger as usage_ledger, summarize_ledger
+from src.utils.http_pool import http_pool
 
 st.set_page_config(
     page_title="AI Interview Analyzer",
@@ -25,17 +36,31 @@ st.set_page_config(
 if 'interviews' not in st.session_state:
     st.session_state.interviews = load_interviews()
 
-def process_interview_data(text: str, interviewee: str) -> Interview:
-    """Process interview data and return an Interview object."""
+def process_interview_data(text: str, interviewee: str, duplicates: List[Dict] = None) -> Interview:
+    """Process interview data and return an Interview object.
+    
+    ``duplicates`` are the stored interviews the transcript is a near-duplicate of.
+    """
     try:
-        print(f"\n=== Processing interview for: {interviewee} ===")
-        
-        # Process interview with AI
-        interview = process_interview_with_ai(text, interviewee)
+        # Generate filename with microseconds for uniqueness; the usage ledger links calls to it
+        filename = generate_interview_filename(interviewee)
         
-        # Generate filename with microseconds for uniqueness
-        filename = f"{interviewee.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
-        print(f"Generated filename: {filename}")
+        # Process interview with AI, filling the table while the model is still writing
+        interview = Interview(interviewee=interviewee, date=None, raw_text=text)
+        metrics = {}
+        live_table = st.empty()
+        with usage_ledger.link(interview=filename):
+            for statement in stream_interview_with_ai(text, interviewee, metrics=metrics):
+                interview.add_statement(statement)
+                live_table.dataframe(
+                    pd.DataFrame([{
+                        'Type': s.type.value,
+                        'Statement': s.text,
+                        'Confidence': f"{s.confidence:.2f}"
+                    } for s in interview.statements]),
+                    use_container_width=True
+                )
+        live_table.empty()
         
         # Initialize metadata if not present
         if not hasattr(interview, 'metadata') or interview.metadata is None:
@@ -43,26 +68,27 @@ def process_interview_data(text: str, interviewee: str) -> Interview:
         
         # Add filename to metadata
         interview.metadata['filename'] = filename
+        if duplicates:
+            interview.metadata['near_duplicates'] = duplicates
         interview.metadata['ready_for_analysis'] = False
         interview.metadata['created_at'] = datetime.now().isoformat()
-        
-        print(f"Interview metadata: {interview.metadata}")
-        print(f"Number of statements: {len(interview.statements)}")
+        interview.metadata['extraction_metrics'] = {k: v for k, v in metrics.items() if k not in ('llm_usage', 'segment_map')}
+        interview.metadata['segment_map'] = metrics.get('segment_map', [])
+        interview.metadata['llm_usage'] = metrics.get('llm_usage', [])
+        interview.metadata['llm_usage_summary'] = summarize_usage(interview.metadata['llm_usage'])
+        if metrics.get('failed_segments'):
+            interview.metadata['failed_segments'] = metrics['failed_segments']
         
         # Save interview
         if save_interview(interview):
-            print("✓ Interview saved successfully")
             st.session_state.interviews = load_interviews()  # Reload interviews
         else:
-            print("❌ Failed to save interview")
             raise Exception("Failed to save interview")
             
         return interview
         
     except Exception as e:
-        print(f"❌ Error in process_interview_data: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        tracer.error('process_interview_failed', interviewee=interviewee, error=f"{type(e).__name__}: {e}")
         raise
 
 def display_statements_table(interview: Interview, index: int = 0, context: str = "default"):
@@ -119,7 +145,6 @@ def display_statements_table(interview: Interview, index: int = 0, context: str
         # Add delete button with confirmation
         if not st.session_state[delete_key]:
             if st.button("🗑️ Verwijder", key=f"delete_btn_{key_base}", type="secondary"):
-                print(f"\n=== Delete button clicked for: {interview.metadata['filename']} ===")
                 st.session_state[delete_key] = True
                 st.rerun()
         else:
@@ -129,20 +154,13 @@ def display_statements_table(interview: Interview, index: int = 0, context: str
             with col1:
                 if st.button("✓ Ja", key=f"confirm_{key_base}", type="primary"):
                     try:
-                        print(f"\n=== Delete confirmed for: {interview.metadata['filename']} ===")
                         filename = interview.metadata.get('filename')
                         if not filename:
                             st.error("Geen bestandsnaam gevonden voor dit interview")
-                            print("❌ No filename found in metadata")
                         else:
-                            print(f"Attempting to delete file: {filename}")
                             if delete_interview(filename):
-                                print("✓ File deleted successfully")
                                 # Remove from session state immediately
-                                old_len = len(st.session_state.interviews)
                                 st.session_state.interviews = [i for i in st.session_state.interviews if i.metadata.get('filename') != filename]
-                                new_len = len(st.session_state.interviews)
-                                print(f"Interviews in session state: {old_len} -> {new_len}")
                                 
                                 # Clear delete state
                                 del st.session_state[delete_key]
@@ -150,15 +168,11 @@ def display_statements_table(interview: Interview, index: int = 0, context: str
                                 st.rerun()
                             else:
                                 st.error("Fout bij verwijderen interview")
-                                print("❌ delete_interview returned False")
                     except Exception as e:
-                        print(f"❌ Error in delete confirmation: {str(e)}")
-                        import traceback
-                        print(f"Traceback: {traceback.format_exc()}")
+                        tracer.error('delete_failed', filename=interview.metadata.get('filename'), error=f"{type(e).__name__}: {e}")
                         st.error(f"Fout bij verwijderen: {str(e)}")
             with col2:
                 if st.button("✗ Nee", key=f"cancel_{key_base}"):
-                    print(f"\n=== Delete cancelled for: {interview.metadata['filename']} ===")
                     del st.session_state[delete_key]
                     st.rerun()
     
@@ -196,13 +210,19 @@ def display_statements_table(interview: Interview, index: int = 0, context: str
     if not df.equals(edited_df):
         # Update statements
         new_statements = []
-        for _, row in edited_df.iterrows():
+        for row_index, row in edited_df.iterrows():
+            original = interview.statements[row_index] if isinstance(row_index, int) and row_index < len(interview.statements) else None
+            if (original is not None and original.text == row['Statement'] and original.type.value == row['Type']
+                    and f"{original.confidence:.2f}" == f"{float(row['Confidence']):.2f}"):
+                # Unchanged rows keep their source and segment information
+                new_statements.append(original)
+                continue
             statement = Statement(
                 text=row['Statement'],
                 type=StatementType(row['Type']),
                 source_text="",  # Empty for manually added/edited statements
                 confidence=float(row['Confidence']),
-                metadata={'edited': True}
+                metadata={**(original.metadata if original else {}), 'edited': True}
             )
             new_statements.append(statement)
         
@@ -228,10 +248,164 @@ def display_statements_table(interview: Interview, index: int = 0, context: str
             key=f"download_button_{key_base}"
         )
 
+def display_transcript_editor(interview: Interview, index: int = 0):
+    """Let the user correct the transcript and re-extract only the changed segments."""
+    key_base = f"{interview.metadata['filename']}_transcript_{index}"
+    if not st.toggle("Transcript corrigeren", key=f"toggle_{key_base}"):
+        return
+    
+    corrected = st.text_area("Transcript", interview.raw_text, height=300, key=f"text_{key_base}")
+    # Unchanged text can still be reprocessed to retry the segments that failed
+    failed = interview.metadata.get('failed_segments')
+    if st.button("Opnieuw verwerken", key=f"reprocess_{key_base}", disabled=corrected == interview.raw_text and not failed):
+        with st.spinner("Gewijzigde segmenten opnieuw verwerken..."):
+            with usage_ledger.link(interview=interview.metadata['filename']):
+                updated = reprocess_interview_with_ai(interview, corrected)
+            if save_interview(updated):
+                info = updated.metadata['reprocessing']
+                st.success(f"{info['extracted_segments']} van {info['segments']} segment(en) opnieuw verwerkt, "
+                           f"{info['reused_segments']} ongewijzigd behouden")
+                st.session_state.interviews = load_interviews()
+                st.rerun()
+            else:
+                st.error("Fout bij opslaan van wijzigingen")
+
+def show_analysis_notes(analysis_result: Dict):
+    """Tell the user how the analysis was made and whether it may be incomplete."""
+    st.success(f"Analyse voltooid! {analysis_result['statements_analyzed']} statements geanalyseerd van {analysis_result['interviews_analyzed']} interviews.")
+    if analysis_result.get('duplicates_collapsed'):
+        st.info(f"{analysis_result['duplicates_collapsed']} bijna-identieke statements zijn samengevoegd; hoe vaak iets gezegd is, is per statement meegestuurd.")
+    if analysis_result['relevance_selection']:
+        st.info(f"Per onderzoeksvraag zijn de meest relevante statements geselecteerd: {analysis_result['statements_analyzed']} van {analysis_result['statements_total']} statements meegestuurd.")
+    if analysis_result['mode'] == 'map_reduce':
+        st.info(f"Het corpus was te groot voor één analyse en is samengevat via {analysis_result['partial_analyses']} deelanalyses.")
+    if analysis_result['stop_reason'] == 'max_tokens':
+        st.warning("De analyse is afgebroken op de maximale lengte en kan onvolledig zijn.")
+
+def save_initial_analysis(analysis_result: Dict, version_filename: str, interviews: List[Interview]):
+    """Save a finished analysis, with the local themes and sentiment, as the initial version and make it the current analysis."""
+    from src.processors.analysis_processor import format_analysis_report
+    markdown_text = format_analysis_report(analysis_result)
+    
+    # Save initial version
+    version_metadata = {
+        'version_type': 'initial',
+        'interviews_analyzed': analysis_result['interviews_analyzed'],
+        'statements_analyzed': analysis_result['statements_analyzed'],
+        'analysis_mode': analysis_result['mode'],
+        'partial_analyses': analysis_result['partial_analyses'],
+        'statements_total': analysis_result['statements_total'],
+        'duplicates_collapsed': analysis_result.get('duplicates_collapsed', 0),
+        'relevance_selection': analysis_result['relevance_selection'],
+        'usage': analysis_result.get('usage', {}),
+        'local_analysis': analysis_to_dict(local_analysis(interviews))
+    }
+    save_analysis_version(markdown_text, analysis_result['questions'], version_metadata, version_filename)
+    
+    # Update current analysis in session state
+    st.session_state.current_analysis = {
+        'filename': version_filename,
+        'text': markdown_text,
+        'questions': analysis_result['questions'],
+        'metadata': version_metadata,
+        'timestamp': datetime.now().isoformat(),
+        'version_type': 'initial'
+    }
+
+def stream_analysis_view(interviews: List[Interview], questions: List[str]):
+    """Analyse each research question in parallel and show every section as soon as it is ready."""
+    from src.processors.analysis_processor import stream_analysis_by_question, assemble_sections
+    version_filename = generate_analysis_version_filename()
+    report = st.empty()
+    sections = {}
+    summary = None
+    result = {}
+    try:
+        with st.spinner("Onderzoeksvragen analyseren..."), usage_ledger.link(analysis_version=version_filename):
+            report.markdown(assemble_sections(questions, sections))
+            for section in stream_analysis_by_question(interviews, questions, result=result):
+                if section['index'] is None:
+                    summary = section['text']
+                else:
+                    sections[section['index']] = section['text']
+                report.markdown(assemble_sections(questions, sections, summary))
+    except Exception as e:
+        tracer.error('analysis_failed', mode='per_question', error=f"{type(e).__name__}: {e}")
+        st.error(f"Error tijdens analyse: {str(e)}")
+        return
+    
+    show_analysis_notes(result)
+    save_initial_analysis(result, version_filename, interviews)
+    report.markdown(st.session_state.current_analysis['text'])
+
+def local_analysis(interviews: List[Interview], research_questions: Optional[List[str]] = None) -> Analysis:
+    """Local themes and sentiment of the interviews, recomputed only when their statements change.
+
+    With ``research_questions`` the themes are (re)named by the model; names
+    are kept until the statements change.
+    """
+    from src.utils.cache import corpus_fingerprint
+    from src.processors.themes import theme_analysis
+    fingerprint = corpus_fingerprint(interviews, [])
+    if research_questions is not None or st.session_state.get('local_analysis', (None,))[0] != fingerprint:
+        analysis = theme_analysis(interviews, research_questions, name=research_questions is not None)
+        st.session_state.local_analysis = (fingerprint, analysis)
+    return st.session_state.local_analysis[1]
+
+def display_connection_pool():
+    """Show the statistics of the HTTP connection pool shared by all sessions."""
+    stats = http_pool.statistics()
+    with st.expander("API verbindingen"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Verzoeken", stats['requests'])
+        col2.metric("Nieuwe verbindingen", stats['connections_opened'])
+        col3.metric("Hergebruikt", stats['reused_requests'])
+        col4.metric("Max. gelijktijdig", f"{stats['peak_in_flight']} / {stats['max_connections']}")
+        open_connections = stats['sync_connections'] or {'open': 0, 'idle': 0}
+        st.caption(
+            f"Open verbindingen: {open_connections['open']} ({open_connections['idle']} inactief), "
+            f"fouten: {stats['errors']}, statuscodes: {stats['status_codes'] or '-'}"
+        )
+
+def display_usage_summary():
+    """Show token usage, latency and estimated cost of all LLM calls from the usage ledger."""
+    st.header("AI Verbruik")
+    display_connection_pool()
+    entries = usage_ledger.entries()
+    if not entries:
+        st.info("Nog geen AI-aanroepen geregistreerd.")
+        return
+    
+    total = summarize_ledger(entries, by='model')
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Aanroepen", sum(row['calls'] for row in total.values()))
+    col2.metric("Tokens (in / uit)", f"{sum(row['input_tokens'] + row['cache_creation_input_tokens'] + row['cache_read_input_tokens'] for row in total.values()):,} / "
+                f"{sum(row['output_tokens'] for row in total.values()):,}")
+    col3.metric("Geschatte kosten", f"${sum(row['cost'] for row in total.values()):.2f}")
+    
+    labels = {'day': 'Per dag', 'stage': 'Per stap', 'interview': 'Per interview', 'analysis_version': 'Per analyseversie'}
+    by = st.radio("Groepeer", list(labels), format_func=labels.get, horizontal=True, key="usage_group_by")
+    st.dataframe(
+        pd.DataFrame([{
+            labels[by]: key,
+            'Aanroepen': row['calls'],
+            'Input tokens': row['input_tokens'],
+            'Cache gelezen': row['cache_read_input_tokens'],
+            'Cache geschreven': row['cache_creation_input_tokens'],
+            'Output tokens': row['output_tokens'],
+            'Latency (s)': round(row['latency_total'], 1),
+            'p95 latency (s)': round(row['latency_p95'], 2) if row['latency_p95'] is not None else None,
+            'Output tokens/s': round(row['output_tokens_per_second'], 1) if row['output_tokens_per_second'] else None,
+            'Fouten': row['errors'],
+            'Kosten ($)': round(row['cost'], 4)
+        } for key, row in summarize_ledger(entries, by=by).items()]),
+        use_container_width=True
+    )
+
 def main():
     st.title("🎯 AI Interview Analyzer")
     
-    tab1, tab2 = st.tabs(["Interview Verwerking", "Analyse & Conclusies"])
+    tab1, tab2, tab3 = st.tabs(["Interview Verwerking", "Analyse & Conclusies", "Verbruik"])
     
     with tab1:
         st.header("Interview Verwerking")
@@ -285,10 +459,26 @@ def main():
                     else:
                         text = text_input
                     
+                    # Flag uploads that repeat an interview that is already stored
+                    duplicates = find_duplicate_interviews(text, st.session_state.interviews)
+                    for duplicate in duplicates:
+                        st.warning(f"Dit interview lijkt voor {duplicate['similarity']:.0%} op het interview met {duplicate['interviewee']} ({duplicate['filename']}).")
+                    
                     # Process interview
-                    interview = process_interview_data(text, interviewee)
+                    interview = process_interview_data(text, interviewee, duplicates)
                     
                     st.success("Interview succesvol verwerkt!")
+                    metrics = interview.metadata.get('extraction_metrics', {})
+                    if 'time_to_first_statement' in metrics:
+                        st.caption(f"Eerste statement na {metrics['time_to_first_statement']:.1f}s, totaal {metrics['total_time']:.1f}s voor {metrics['segments']} segment(en)")
+                    usage = interview.metadata.get('llm_usage_summary', {})
+                    if usage.get('calls'):
+                        st.caption(f"{usage['calls']} AI-aanroep(en): {usage['input_tokens']} input, {usage['cache_read_input_tokens']} uit prompt cache gelezen, {usage['cache_creation_input_tokens']} naar cache geschreven, {usage['output_tokens']} output tokens")
+                    cache_stats = segment_cache.stats()
+                    st.caption(f"Segment cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['entries']} items opgeslagen)")
+                    scheduler_stats = scheduler.stats()
+                    if scheduler_stats['throttled'] or scheduler_stats['retried']:
+                        st.caption(f"API limieten: {scheduler_stats['throttled']} keer gewacht, {scheduler_stats['retried']} herhaalde aanroepen, {scheduler_stats['failed']} mislukt")
                     
                     # Display results
                     st.subheader("Resultaten")
@@ -300,10 +490,16 @@ def main():
         # Show existing interviews
         if st.session_state.interviews:
             st.subheader("Verwerkte Interviews")
+            duplicate_groups = duplicate_interview_groups(st.session_state.interviews)
             for idx, interview in enumerate(st.session_state.interviews):
                 ready_status = "✅" if interview.metadata.get('ready_for_analysis', False) else "⏳"
-                with st.expander(f"Interview: {interview.interviewee} {ready_status}"):
+                duplicates_of = duplicate_groups.get(interview.metadata['filename'], [])
+                duplicate_status = " 🔁" if duplicates_of else ""
+                with st.expander(f"Interview: {interview.interviewee} {ready_status}{duplicate_status}"):
+                    if duplicates_of:
+                        st.warning(f"Bijna identiek aan: {', '.join(duplicates_of)}")
                     display_statements_table(interview, idx, context="list")
+                    display_transcript_editor(interview, idx)
     
     with tab2:
         st.header("Analyse & Conclusies")
@@ -317,7 +513,9 @@ def main():
             st.success(f"{len(ready_interviews)} interview(s) klaar voor analyse")
             
             # Create tabs for different analysis views
-            analysis_tab1, analysis_tab2 = st.tabs(["Onderzoeksvragen", "Statements Doorzoeken"])
+            analysis_tab1, analysis_tab2, analysis_tab3, analysis_tab4, analysis_tab5, analysis_tab6 = st.tabs(
+                ["Onderzoeksvragen", "Statements Doorzoeken", "Thema's", "Sentiment", "Netwerk", "Woordwolk"]
+            )
             
             with analysis_tab1:
                 st.subheader("Onderzoeksvragen Analyseren")
@@ -362,57 +560,40 @@ def main():
                 if 'current_analysis' not in st.session_state and latest_version:
                     st.session_state.current_analysis = latest_version
                 
+                analysis_modes = {
+                    'per_question': "Per onderzoeksvraag (secties verschijnen zodra ze klaar zijn)",
+                    'single': "Eén rapport"
+                }
+                analysis_mode = st.radio("Analysemodus", list(analysis_modes), format_func=analysis_modes.get, horizontal=True, key="analysis_mode")
+                
                 # Analyze button
+                streamed_questions = None
                 if st.button("🔍 Analyseer", type="primary") or (not latest_version and not st.session_state.get('current_analysis')):
                     # Validate questions
                     valid_questions = [q for q in st.session_state.research_questions if q.strip()]
                     if not valid_questions:
                         st.error("Voer ten minste één onderzoeksvraag in.")
+                    elif analysis_mode == 'per_question':
+                        # Runs inside the formatted view below, so the sections appear there
+                        streamed_questions = valid_questions
                     else:
                         with st.spinner("Interviews analyseren..."):
                             try:
                                 from src.processors.analysis_processor import analyze_interviews
-                                analysis_result = analyze_interviews(ready_interviews, valid_questions)
+                                version_filename = generate_analysis_version_filename()
+                                with usage_ledger.link(analysis_version=version_filename):
+                                    analysis_result = analyze_interviews(ready_interviews, valid_questions)
                                 
                                 if analysis_result:
-                                    st.success(f"Analyse voltooid! {analysis_result['statements_analyzed']} statements geanalyseerd van {analysis_result['interviews_analyzed']} interviews.")
-                                    
-                                    # Create formatted markdown with metadata
-                                    markdown_text = f"""# Interview Analyse Rapport
-Datum: {datetime.now().strftime('%d-%m-%Y %H:%M')}
-Aantal interviews: {analysis_result['interviews_analyzed']}
-Aantal statements: {analysis_result['statements_analyzed']}
-
-## Onderzoeksvragen
-{chr(10).join(f"- {q}" for q in analysis_result['questions'])}
-
-## Analyse
-{analysis_result['raw_response']}
-"""
-                                    
-                                    # Save initial version
-                                    version_metadata = {
-                                        'version_type': 'initial',
-                                        'interviews_analyzed': analysis_result['interviews_analyzed'],
-                                        'statements_analyzed': analysis_result['statements_analyzed']
-                                    }
-                                    save_analysis_version(markdown_text, valid_questions, version_metadata)
-                                    
-                                    # Update current analysis in session state
-                                    st.session_state.current_analysis = {
-                                        'text': markdown_text,
-                                        'questions': valid_questions,
-                                        'metadata': version_metadata,
-                                        'timestamp': datetime.now().isoformat(),
-                                        'version_type': 'initial'
-                                    }
+                                    show_analysis_notes(analysis_result)
+                                    save_initial_analysis(analysis_result, version_filename, ready_interviews)
                                 else:
                                     st.error("Er is een fout opgetreden bij de analyse.")
                             except Exception as e:
                                 st.error(f"Error tijdens analyse: {str(e)}")
                 
                 # Only show analysis tabs if we have an analysis
-                if st.session_state.get('current_analysis'):
+                if st.session_state.get('current_analysis') or streamed_questions:
                     # Create tabs for different views
                     view_tab, raw_tab, chat_tab, versions_tab = st.tabs([
                         "📊 Opgemaakte Weergave",
@@ -422,7 +603,13 @@ Aantal statements: {analysis_result['statements_analyzed']}
                     ])
                     
                     with view_tab:
-                        st.markdown(st.session_state.current_analysis['text'])
+                        if streamed_questions:
+                            stream_analysis_view(ready_interviews, streamed_questions)
+                        else:
+                            st.markdown(st.session_state.current_analysis['text'])
+                    
+                    if not st.session_state.get('current_analysis'):
+                        st.stop()
                     
                     with raw_tab:
                         # Display editable markdown block
@@ -440,9 +627,11 @@ Aantal statements: {analysis_result['statements_analyzed']}
                                 'interviews_analyzed': st.session_state.current_analysis['metadata']['interviews_analyzed'],
                                 'statements_analyzed': st.session_state.current_analysis['metadata']['statements_analyzed']
                             }
-                            if save_analysis_version(edited_markdown, st.session_state.current_analysis['questions'], version_metadata):
+                            new_filename = save_analysis_version(edited_markdown, st.session_state.current_analysis['questions'], version_metadata)
+                            if new_filename:
                                 st.success("Wijzigingen opgeslagen als nieuwe versie")
                                 # Update current analysis
+                                st.session_state.current_analysis['filename'] = new_filename
                                 st.session_state.current_analysis['text'] = edited_markdown
                                 st.session_state.current_analysis['metadata'] = version_metadata
                                 st.session_state.current_analysis['timestamp'] = datetime.now().isoformat()
@@ -474,40 +663,51 @@ Aantal statements: {analysis_result['statements_analyzed']}
                                 st.markdown(prompt)
                             
                             with st.chat_message("assistant"):
-                                with st.spinner("AI denkt na..."):
-                                    from src.processors.analysis_processor import chat_with_analysis
-                                    response = chat_with_analysis(
-                                        prompt,
-                                        ready_interviews,
+                                # One session per browser session: the corpus context is only rebuilt when it changes
+                                from src.processors.analysis_processor import ChatSession
+                                if 'chat_session' not in st.session_state:
+                                    st.session_state.chat_session = ChatSession()
+                                try:
+                                    with usage_ledger.link(analysis_version=st.session_state.current_analysis.get('filename')):
+                                        st.write_stream(st.session_state.chat_session.stream_reply(
+                                            prompt,
+                                            ready_interviews,
+                                            st.session_state.current_analysis['questions'],
+                                            st.session_state.chat_history[:-1]
+                                        ))
+                                    response = st.session_state.chat_session.last_reply
+                                except Exception as e:
+                                    tracer.error('chat_failed', error=f"{type(e).__name__}: {e}")
+                                    response = {'message': f"Er is een fout opgetreden: {str(e)}"}
+                                    st.markdown(response['message'])
+                                
+                                # Update current analysis if we got a new version
+                                if response.get('new_analysis'):
+                                    st.info(response['message'])
+                                    version_metadata = {
+                                        'version_type': 'ai_chat',
+                                        'prompt': prompt,
+                                        'interviews_analyzed': st.session_state.current_analysis['metadata']['interviews_analyzed'],
+                                        'statements_analyzed': st.session_state.current_analysis['metadata']['statements_analyzed'],
+                                        'usage': response.get('usage', {})
+                                    }
+                                    new_filename = save_analysis_version(
+                                        response['new_analysis'],
                                         st.session_state.current_analysis['questions'],
-                                        st.session_state.chat_history
+                                        version_metadata
                                     )
-                                    
-                                    st.markdown(response['message'])
-                                    
-                                    # Update current analysis if we got a new version
-                                    if response.get('new_analysis'):
-                                        version_metadata = {
-                                            'version_type': 'ai_chat',
-                                            'prompt': prompt,
-                                            'interviews_analyzed': st.session_state.current_analysis['metadata']['interviews_analyzed'],
-                                            'statements_analyzed': st.session_state.current_analysis['metadata']['statements_analyzed']
-                                        }
-                                        save_analysis_version(
-                                            response['new_analysis'],
-                                            st.session_state.current_analysis['questions'],
-                                            version_metadata
-                                        )
-                                        # Update current analysis
-                                        st.session_state.current_analysis['text'] = response['new_analysis']
-                                        st.session_state.current_analysis['metadata'] = version_metadata
-                                        st.session_state.current_analysis['timestamp'] = datetime.now().isoformat()
-                                        st.session_state.current_analysis['version_type'] = 'ai_chat'
+                                    # Update current analysis
+                                    st.session_state.current_analysis['filename'] = new_filename
+                                    st.session_state.current_analysis['text'] = response['new_analysis']
+                                    st.session_state.current_analysis['metadata'] = version_metadata
+                                    st.session_state.current_analysis['timestamp'] = datetime.now().isoformat()
+                                    st.session_state.current_analysis['version_type'] = 'ai_chat'
                             
-                            # Add assistant response to history
+                            # Add assistant response to history; a new report is kept as a reference to its version
                             st.session_state.chat_history.append({
                                 "role": "assistant",
-                                "content": response['message']
+                                "content": response['message'],
+                                "analysis_version": st.session_state.current_analysis['filename'] if response.get('new_analysis') else None
                             })
                     
                     with versions_tab:
@@ -541,20 +741,45 @@ Aantal statements: {analysis_result['statements_analyzed']}
                 st.subheader("Statements Doorzoeken")
                 
                 # Search functionality
-                search_query = st.text_input("🔍 Zoek in alle statements", placeholder="Typ om te zoeken...")
+                search_query = st.text_input(
+                    "🔍 Zoek in alle statements",
+                    placeholder="Typ om te zoeken...",
+                    help='Woorden worden herkend in alle vervoegingen. Gebruik "aanhalingstekens" voor een zinsdeel en * voor een woordbegin, bijv. kost*.'
+                )
+                
+                filter_col1, filter_col2, filter_col3 = st.columns(3)
+                with filter_col1:
+                    search_types = st.multiselect("Type", options=[t.value for t in StatementType])
+                with filter_col2:
+                    search_interviewees = st.multiselect(
+                        "Geïnterviewde",
+                        options=sorted({i.interviewee for i in ready_interviews})
+                    )
+                with filter_col3:
+                    min_confidence, max_confidence = st.slider("Confidence", 0.0, 1.0, (0.0, 1.0), step=0.05)
                 
                 if search_query:
-                    from src.processors.analysis_processor import search_analysis_statements
-                    matching_statements = search_analysis_statements(ready_interviews, search_query)
+                    from src.processors.analysis_processor import search_statements
+                    hits = search_statements(
+                        ready_interviews,
+                        search_query,
+                        types=search_types,
+                        interviewees=search_interviewees,
+                        min_confidence=min_confidence,
+                        max_confidence=max_confidence
+                    )
                     
-                    if matching_statements:
+                    if hits:
+                        st.caption(f"{len(hits)} statements gevonden")
+                        
                         # Create DataFrame
                         data = [{
-                            'Interview': s.metadata.get('interview_name', 'Onbekend'),
-                            'Type': s.type.value,
-                            'Statement': s.text,
-                            'Confidence': f"{s.confidence:.2f}"
-                        } for s in matching_statements]
+                            'Interview': hit['interviewee'],
+                            'Type': hit['type'],
+                            'Statement': hit['text'],
+                            'Confidence': f"{hit['confidence']:.2f}",
+                            'Score': round(hit['score'], 2)
+                        } for hit in hits]
                         
                         df = pd.DataFrame(data)
                         
@@ -567,6 +792,7 @@ Aantal statements: {analysis_result['statements_analyzed']}
                                 "Type": st.column_config.TextColumn("Type", width="small"),
                                 "Statement": st.column_config.TextColumn("Statement", width="large"),
                                 "Confidence": st.column_config.TextColumn("Confidence", width="small"),
+                                "Score": st.column_config.NumberColumn("Score", width="small"),
                             }
                         )
                         
@@ -581,6 +807,277 @@ Aantal statements: {analysis_result['statements_analyzed']}
                             )
                     else:
                         st.info("Geen statements gevonden die aan je zoekcriteria voldoen.")
+                
+                # Similar statements across all ready interviews
+                st.markdown("#### Vergelijkbare statements")
+                similar_options = {}
+                if search_query and hits:
+                    similar_options = {
+                        f"{hit['interviewee']}: {hit['text'][:120]}": hit
+                        for hit in hits[:50]
+                    }
+                similar_choice = st.selectbox(
+                    "Wie zei er nog meer iets vergelijkbaars?",
+                    options=["Eigen tekst"] + list(similar_options),
+                    help="Kies een zoekresultaat of vul zelf een statement in."
+                )
+                if similar_choice in similar_options:
+                    source_hit = similar_options[similar_choice]
+                    similar_text = source_hit['text']
+                    similar_exclude = (source_hit['filename'], source_hit['statement'])
+                else:
+                    similar_text = st.text_input("Statement", placeholder="Bijv. De installatie duurde veel te lang")
+                    similar_exclude = None
+                
+                if similar_text:
+                    from src.processors.analysis_processor import find_similar_statements
+                    similar_hits = find_similar_statements(ready_interviews, similar_text, exclude=similar_exclude)
+                    if similar_hits:
+                        st.dataframe(
+                            pd.DataFrame([{
+                                'Interview': hit['interviewee'],
+                                'Type': hit['type'],
+                                'Statement': hit['text'],
+                                'Gelijkenis': round(hit['score'], 2)
+                            } for hit in similar_hits]),
+                            use_container_width=True,
+                            column_config={
+                                "Interview": st.column_config.TextColumn("Interview", width="medium"),
+                                "Type": st.column_config.TextColumn("Type", width="small"),
+                                "Statement": st.column_config.TextColumn("Statement", width="large"),
+                                "Gelijkenis": st.column_config.ProgressColumn("Gelijkenis", min_value=0.0, max_value=1.0, format="%.2f"),
+                            }
+                        )
+                    else:
+                        st.info("Geen vergelijkbare statements gevonden.")
+
+            with analysis_tab3:
+                st.subheader("Thema's")
+                
+                if not PATTERN_RECOGNITION:
+                    st.info("Patroonherkenning staat uit in de configuratie.")
+                else:
+                    themes_analysis = local_analysis(ready_interviews)
+                    clusters = themes_analysis.patterns
+                    
+                    if not clusters['themes']:
+                        st.info("Te weinig inhoud in de statements om thema's te vinden.")
+                    else:
+                        themes = clusters['themes']
+                        
+                        col1, col2 = st.columns([3, 1])
+                        with col1:
+                            caption = f"{len(themes)} thema's in {clusters['statements']} statements"
+                            if clusters['unassigned']:
+                                caption += f" ({clusters['unassigned']} zonder inhoudswoorden)"
+                            st.caption(caption)
+                        with col2:
+                            if st.button("🤖 Thema's benoemen", disabled=bool(themes_analysis.metadata['named_by'])):
+                                with st.spinner("Thema's worden benoemd..."):
+                                    questions = [q for q in st.session_state.get('research_questions', []) if q.strip()]
+                                    local_analysis(ready_interviews, questions)
+                                st.rerun()
+                        
+                        for theme in themes:
+                            with st.expander(f"{theme['name']} — {theme['size']} statements ({theme['share']:.0%}), {theme['interviewees']} geïnterviewde(n)"):
+                                if theme['interpretation']:
+                                    st.write(theme['interpretation'])
+                                st.caption("Kenmerkende woorden: " + ", ".join(theme['terms']))
+                                for representative in theme['representatives']:
+                                    st.markdown(f"- {representative['text']}")
+                        
+                        st.markdown("#### Verdeling per interview")
+                        st.dataframe(
+                            pd.DataFrame(
+                                [row['themes'] for row in clusters['distribution']],
+                                index=[row['interviewee'] for row in clusters['distribution']],
+                                columns=[theme['name'] for theme in themes]
+                            ),
+                            use_container_width=True,
+                            column_config={
+                                theme['name']: st.column_config.ProgressColumn(theme['name'], min_value=0.0, max_value=1.0, format="%.2f")
+                                for theme in themes
+                            }
+                        )
+
+            with analysis_tab4:
+                st.subheader("Sentiment")
+                
+                if not SENTIMENT_ANALYSIS:
+                    st.info("Sentimentanalyse staat uit in de configuratie.")
+                else:
+                    # Scored locally with a word list and cached per statement, so no AI call is needed
+                    sentiment = local_analysis(ready_interviews).sentiment_scores
+                    overall = sentiment['overall']
+                    
+                    def sentiment_row(label: str, aggregate: Dict) -> Dict:
+                        total = max(aggregate['statements'], 1)
+                        return {
+                            '': label,
+                            'Statements': aggregate['statements'],
+                            'Gemiddeld': round(aggregate['mean'], 2),
+                            'Positief': aggregate['positive'] / total,
+                            'Neutraal': aggregate['neutral'] / total,
+                            'Negatief': aggregate['negative'] / total
+                        }
+                    
+                    sentiment_columns = {
+                        "Gemiddeld": st.column_config.NumberColumn("Gemiddeld", help="Van -1 (negatief) tot 1 (positief)"),
+                        "Positief": st.column_config.ProgressColumn("Positief", min_value=0.0, max_value=1.0, format="%.2f"),
+                        "Neutraal": st.column_config.ProgressColumn("Neutraal", min_value=0.0, max_value=1.0, format="%.2f"),
+                        "Negatief": st.column_config.ProgressColumn("Negatief", min_value=0.0, max_value=1.0, format="%.2f"),
+                    }
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Gemiddeld sentiment", f"{overall['mean']:+.2f}")
+                    col2.metric("Positief", overall['positive'])
+                    col3.metric("Neutraal", overall['neutral'])
+                    col4.metric("Negatief", overall['negative'])
+                    
+                    st.markdown("#### Per interview")
+                    st.dataframe(
+                        pd.DataFrame([sentiment_row(row['interviewee'], row) for row in sentiment['interviews']]),
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config=sentiment_columns
+                    )
+                    
+                    st.markdown("#### Per type")
+                    st.dataframe(
+                        pd.DataFrame([sentiment_row(value, aggregate) for value, aggregate in sentiment['types'].items()]),
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config=sentiment_columns
+                    )
+                    
+                    scored = [
+                        (score, interview.interviewee, statement.text)
+                        for interview in ready_interviews
+                        for statement, score in zip(
+                            interview.statements,
+                            sentiment['statements'][interview.metadata.get('filename') or interview.interviewee]
+                        )
+                    ]
+                    scored.sort(key=lambda row: row[0])
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown("#### Meest positief")
+                        for score, interviewee, text in reversed(scored[-5:]):
+                            if score > 0:
+                                st.markdown(f"- **{score:+.2f}** {text}")
+                    with col2:
+                        st.markdown("#### Meest negatief")
+                        for score, interviewee, text in scored[:5]:
+                            if score < 0:
+                                st.markdown(f"- **{score:+.2f}** {text}")
+
+            with analysis_tab5:
+                st.subheader("Netwerk van begrippen")
+                st.caption("Begrippen zijn verbonden als ze samen in statements voorkomen; dikkere lijnen betekenen vaker samen.")
+                
+                min_edge_weight = st.number_input(
+                    "Minimaal aantal gedeelde statements",
+                    min_value=1,
+                    value=NETWORK_GRAPH_MIN_EDGE_WEIGHT,
+                    help="Verbindingen die minder vaak voorkomen worden weggelaten."
+                )
+                
+                from src.processors.network import cooccurrence_network
+                # Cached by corpus hash, so reruns read the network and its layout from disk
+                network = cooccurrence_network(ready_interviews, min_weight=int(min_edge_weight))
+                
+                if not network['edges']:
+                    st.info("Geen begrippen die vaak genoeg samen voorkomen. Verlaag het minimum of voeg interviews toe.")
+                else:
+                    import plotly.graph_objects as go
+                    
+                    nodes, edges = network['nodes'], network['edges']
+                    heaviest = max(weight for _, _, weight in edges)
+                    figure = go.Figure()
+                    # One trace per line width keeps the number of traces small for large networks
+                    for width in (1, 2, 4):
+                        xs, ys = [], []
+                        for source, target, weight in edges:
+                            if 1 << int(2 * weight / heaviest) == width:
+                                xs += [nodes[source]['x'], nodes[target]['x'], None]
+                                ys += [nodes[source]['y'], nodes[target]['y'], None]
+                        figure.add_trace(go.Scatter(
+                            x=xs, y=ys, mode='lines', hoverinfo='none',
+                            line=dict(width=width, color='rgba(150, 150, 150, 0.5)')
+                        ))
+                    largest = max(node['count'] for node in nodes)
+                    figure.add_trace(go.Scatter(
+                        x=[node['x'] for node in nodes],
+                        y=[node['y'] for node in nodes],
+                        mode='markers+text',
+                        text=[node['term'] for node in nodes],
+                        textposition='top center',
+                        hovertext=[f"{node['term']}: {node['count']} statements" for node in nodes],
+                        hoverinfo='text',
+                        marker=dict(
+                            size=[10 + 30 * (node['count'] / largest) ** 0.5 for node in nodes],
+                            color=[node['community'] for node in nodes],
+                            colorscale='Turbo',
+                            line=dict(width=1, color='white')
+                        )
+                    ))
+                    figure.update_layout(
+                        showlegend=False,
+                        height=700,
+                        margin=dict(l=0, r=0, t=0, b=0),
+                        xaxis=dict(visible=False),
+                        yaxis=dict(visible=False)
+                    )
+                    st.plotly_chart(figure, use_container_width=True)
+                    
+                    caption = f"{len(nodes)} begrippen en {len(edges)} verbindingen uit {network['statements']} statements"
+                    if network['pruned']:
+                        caption += f"; {network['pruned']} zwakkere verbindingen niet getoond"
+                    st.caption(caption)
+
+            with analysis_tab6:
+                st.subheader("Woordwolk")
+                
+                from src.processors.text_processor import statement_content
+                from src.processors.wordclouds import wordcloud, wordcloud_available
+                
+                cloud_scope = st.radio("Woordwolk van", ["Alle interviews", "Per interview", "Per type"], horizontal=True)
+                if cloud_scope == "Per interview":
+                    cloud_interview = st.selectbox(
+                        "Interview",
+                        options=range(len(ready_interviews)),
+                        format_func=lambda i: ready_interviews[i].interviewee
+                    )
+                    cloud_sources = [(ready_interviews[cloud_interview], s) for s in ready_interviews[cloud_interview].statements]
+                elif cloud_scope == "Per type":
+                    cloud_type = st.selectbox("Type", options=[t.value for t in StatementType])
+                    cloud_sources = [(i, s) for i in ready_interviews for s in i.statements if s.type.value == cloud_type]
+                else:
+                    cloud_sources = [(i, s) for i in ready_interviews for s in i.statements]
+                
+                # Tables and images are cached by the content of the statements, so reruns do not redraw them
+                cloud = wordcloud([statement_content(s.text, i.interviewee) for i, s in cloud_sources])
+                if not cloud['frequencies']:
+                    st.info("Geen woorden om te tonen.")
+                else:
+                    if cloud['image']:
+                        st.image(cloud['image'], use_column_width=True)
+                    else:
+                        if not wordcloud_available():
+                            st.caption("Het pakket wordcloud is niet geïnstalleerd; de meest gebruikte woorden staan hieronder.")
+                        st.bar_chart(
+                            pd.DataFrame(cloud['frequencies'][:30], columns=['Woord', 'Aantal']).set_index('Woord'),
+                            height=400
+                        )
+                    with st.expander("Woordfrequenties"):
+                        st.dataframe(
+                            pd.DataFrame(cloud['frequencies'], columns=['Woord', 'Aantal']),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+
+    with tab3:
+        display_usage_summary()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Wall time of process_interview_with_ai versus extraction concurrency.
+
+Uses the FakeBackend with injected latency, so no network is needed.
+
+    python -m benchmarks.bench_concurrent_extraction [--latency 0.5] [--segments 20]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+from src.processors import ai_processor
+from src.utils.llm_backend import FakeBackend, set_backend
+from src.utils.ledger import ledger
+from src.utils.rate_limiter import RequestScheduler
+
+# The fake backend has no rate limits, so do not throttle against the real ones;
+# failed calls are not retried so injected failures show up as failed segments
+ai_processor.scheduler = RequestScheduler(1e9, 1e12, 1e12, max_retries=0)
+# Keep fake calls out of the real usage ledger
+ledger.directory = tempfile.mkdtemp(prefix="ledger_")
+
+
+def run(latency: float, segments: int, concurrency_levels, failure_rate: float):
+    # One line per segment: each line fills most of a 50-token budget
+    text = "\n".join(f"Segment {i}: Erik vertelt over zijn ervaringen met de app en de kosten." * 2 for i in range(segments))
+    print(f"{segments} segments, latency {latency:.2f}s, failure rate {failure_rate:.0%}")
+    print(f"{'workers':>8} {'wall (s)':>10} {'speedup':>8} {'statements':>11} {'failed':>7}")
+    baseline = None
+    for workers in concurrency_levels:
+        set_backend(FakeBackend(latency=latency, failure_rate=failure_rate, seed=workers))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            interview = ai_processor.process_interview_with_ai(
+                text, "Erik", max_segment_tokens=50, overlap_sentences=0, max_workers=workers, use_cache=False
+            )
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        failed = len(interview.metadata.get('failed_segments', []))
+        print(f"{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>7.1f}x {len(interview.statements):>11} {failed:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    run(args.latency, args.segments, args.workers, args.failure_rate)
@@ -0,0 +1,131 @@
+"""Measure the statement search index on a synthetic corpus.
+
+Writes synthetic interview files to a temporary data directory, builds the
+index from them (cold), reloads it from its shards (warm), applies an
+incremental update and removal, and reports the latency of word, phrase,
+prefix and filtered queries next to the substring scan the search used to do.
+
+    python -m benchmarks.bench_search_index --statements 100000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from src.models import Statement, StatementType
+from src.utils.statement_index import StatementIndex
+
+SUBJECTS = ["de app", "de kosten", "het contract", "de klantenservice", "de zonnepanelen", "de installatie",
+            "de monteur", "de factuur", "het energieverbruik", "de thuisbatterij", "de subsidie", "de buren"]
+VERBS = ["vindt", "denkt dat", "voelt zich onzeker over", "wil meer weten over", "ergert zich aan",
+         "is tevreden over", "twijfelt over", "maakt zich zorgen over", "verwacht veel van", "praat vaak over"]
+DETAILS = ["omdat het duur is", "sinds de verhuizing", "na het gesprek met de monteur", "vanwege de lange wachttijd",
+           "door de hoge energieprijzen", "omdat de gebruiksvriendelijkheid tegenvalt", "zonder duidelijke uitleg",
+           "na een storing in de winter", "omdat de buren goede ervaringen hebben", "door onduidelijke communicatie"]
+
+QUERIES = {
+    'word': ["kosten", "monteur", "subsidie", "wachttijd", "zorgen"],
+    'phrase': ['"hoge energieprijzen"', '"lange wachttijd"', '"goede ervaringen"'],
+    'prefix': ["energie*", "gebruiks*", "zonne*", "kost*"],
+    'multi': ["kosten zorgen", "app tevreden", "installatie storing winter"]
+}
+
+
+def write_corpus(data_dir: str, statements: int, per_interview: int, seed: int):
+    rng = random.Random(seed)
+    # Made-up words give the corpus a long tail of rare terms, like names and products in real interviews
+    syllables = ["ka", "ver", "lo", "te", "mi", "dra", "sto", "ben", "rui", "gel", "pa", "wes"]
+    rare = [''.join(rng.choice(syllables) for _ in range(3)) for _ in range(5000)]
+    types = [t.value for t in StatementType]
+    for i in range(0, statements, per_interview):
+        count = min(per_interview, statements - i)
+        data = {
+            'interviewee': f"Deelnemer{i // per_interview}",
+            'date': datetime.now().isoformat(),
+            'raw_text': "",
+            'statements': [{
+                'text': f"De deelnemer {rng.choice(VERBS)} {rng.choice(SUBJECTS)} {rng.choice(DETAILS)}, zoals bij {rng.choice(rare)}.",
+                'type': rng.choice(types),
+                'source_text': "",
+                'confidence': round(rng.uniform(0.5, 1.0), 2),
+                'metadata': {}
+            } for _ in range(count)],
+            'metadata': {}
+        }
+        with open(os.path.join(data_dir, f"deelnemer{i // per_interview}.json"), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency(samples):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    return f"p50 {statistics.median(samples) * 1000:.2f}ms, p95 {p95 * 1000:.2f}ms"
+
+
+def main(args):
+    root = tempfile.mkdtemp(prefix="search_index_")
+    data_dir = os.path.join(root, 'data')
+    index_dir = os.path.join(data_dir, 'index')
+    os.makedirs(data_dir)
+    write_corpus(data_dir, args.statements, args.per_interview, args.seed)
+
+    _, cold = timed(StatementIndex(index_dir, data_dir).load)
+    index = StatementIndex(index_dir, data_dir)
+    _, warm = timed(index.load)
+    stats = index.stats()
+    print(f"Corpus: {stats['statements']} statements in {stats['interviews']} interviews, {stats['terms']} terms")
+    print(f"Build from interview files: {cold:.2f}s, reload from shards: {warm:.2f}s")
+
+    update = [Statement(text="Nieuwe uitspraak over de thuisbatterij en de subsidie", type=StatementType.THOUGHT,
+                        source_text="", confidence=0.9)] * args.per_interview
+    _, updated = timed(index.update_interview, "deelnemer0.json", "Deelnemer0", update)
+    _, removed = timed(index.remove_interview, "deelnemer1.json")
+    print(f"Incremental update of {args.per_interview} statements: {updated * 1000:.1f}ms, removal: {removed * 1000:.1f}ms")
+
+    texts = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith('.json'):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                texts.extend(s['text'] for s in json.load(f)['statements'])
+
+    rng = random.Random(args.seed)
+    for kind, queries in QUERIES.items():
+        samples, matches = [], 0
+        for _ in range(args.queries):
+            hits, seconds = timed(index.search, rng.choice(queries), limit=50)
+            samples.append(seconds)
+            matches += len(hits)
+        print(f"{kind:>8}: {latency(samples)} ({matches / args.queries:.0f} hits)")
+
+    samples = []
+    for _ in range(args.queries):
+        _, seconds = timed(index.search, rng.choice(QUERIES['word']), types=['voelt', 'denkt'],
+                           interviewees=[f"Deelnemer{n}" for n in range(0, 100, 3)], min_confidence=0.8, limit=50)
+        samples.append(seconds)
+    print(f"filtered: {latency(samples)}")
+
+    samples = []
+    for _ in range(min(args.queries, 20)):
+        query = rng.choice(QUERIES['word'])
+        _, seconds = timed(lambda: [t for t in texts if query in t.lower()])
+        samples.append(seconds)
+    print(f"substring scan: {latency(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=100000)
+    parser.add_argument("--per-interview", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
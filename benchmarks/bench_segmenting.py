@@ -0,0 +1,85 @@
+"""Call count and estimated input tokens: fixed 2000-char slices versus the token-budget packer.
+
+Runs the extraction prompts against a recording fake backend, so no network is needed.
+
+    python -m benchmarks.bench_segmenting [--repeat 1 10 50]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import tempfile
+
+from src.config import DATA_DIR
+from src.processors import ai_processor
+from src.processors.text_processor import estimate_tokens
+from src.utils.llm_backend import FakeBackend, get_backend, set_backend
+from src.utils.ledger import ledger
+from src.utils.rate_limiter import RequestScheduler
+
+# The fake backend has no rate limits, so do not throttle against the real ones
+ai_processor.scheduler = RequestScheduler(1e9, 1e12, 1e12)
+# Keep fake calls out of the real usage ledger
+ledger.directory = tempfile.mkdtemp(prefix="ledger_")
+
+
+class RecordingBackend(FakeBackend):
+    """Fake backend that records the estimated prompt size of every call."""
+
+    def __init__(self):
+        super().__init__(responder=lambda params: "")
+        self.input_tokens = 0
+
+    def create(self, **kwargs):
+        system = kwargs.get('system', '')
+        if isinstance(system, list):
+            system = ''.join(block['text'] for block in system)
+        messages = ''.join(
+            m['content'] if isinstance(m['content'], str) else ''.join(b['text'] for b in m['content'])
+            for m in kwargs['messages']
+        )
+        self.input_tokens += estimate_tokens(system) + estimate_tokens(messages)
+        return super().create(**kwargs)
+
+
+def sample_transcript() -> str:
+    """Longest raw transcript among the stored interviews."""
+    texts = []
+    for path in glob.glob(f"{DATA_DIR}/*.json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if 'raw_text' in data:
+            texts.append(data['raw_text'])
+    return max(texts, key=len)
+
+
+def measure(text: str, packed: bool):
+    recorder = RecordingBackend()
+    original_backend = get_backend()
+    set_backend(recorder)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if packed:
+                ai_processor.process_interview_with_ai(text, "Erik", max_workers=1, use_cache=False)
+            else:
+                for i in range(0, len(text), 2000):
+                    ai_processor._extract_statements(text[i:i + 2000], "Erik")
+    finally:
+        set_backend(original_backend)
+    return recorder.calls, recorder.input_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, nargs="+", default=[1, 10, 50],
+                        help="how many times the sample transcript is concatenated")
+    args = parser.parse_args()
+
+    sample = sample_transcript()
+    print(f"{'transcript':>12} {'calls before':>13} {'calls after':>12} {'tokens before':>14} {'tokens after':>13}")
+    for repeat in args.repeat:
+        text = "\n\n".join([sample] * repeat)
+        calls_before, tokens_before = measure(text, packed=False)
+        calls_after, tokens_after = measure(text, packed=True)
+        print(f"{len(text):>10}ch {calls_before:>13} {calls_after:>12} {tokens_before:>14} {tokens_after:>13}")
@@ -0,0 +1,81 @@
+"""Measure "find similar statements" on a synthetic corpus.
+
+Builds the similarity index over the synthetic interviews of
+``bench_search_index``, then compares the LSH lookup with exhaustive cosine
+scoring: query latency of both and the recall of the LSH top-k against the
+exact top-k, for queries that are corpus statements with words dropped.
+Incremental updates and removals are timed as well.
+
+    python -m benchmarks.bench_similar_statements --statements 100000 --queries 200 --top-k 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_search_index import latency, timed, write_corpus
+from src.models import Statement, StatementType
+from src.utils.similarity_index import SimilarityIndex
+from src.utils.statement_index import StatementIndex
+
+
+def main(args):
+    root = tempfile.mkdtemp(prefix="similarity_index_")
+    data_dir = os.path.join(root, 'data')
+    os.makedirs(data_dir)
+    write_corpus(data_dir, args.statements, args.per_interview, args.seed)
+    source = StatementIndex(os.path.join(data_dir, 'index'), data_dir)
+    source.load()
+
+    index = SimilarityIndex(source, tables=args.tables, bits=args.bits, probes=args.probes, exact_below=0)
+    _, build = timed(index.load)
+    print(f"Corpus: {index._live} statements, built in {build:.2f}s "
+          f"({args.tables} tables x {args.bits} bits, {args.probes} probes)")
+
+    update = [Statement(text="Nieuwe uitspraak over de thuisbatterij en de subsidie", type=StatementType.THOUGHT,
+                        source_text="", confidence=0.9)] * args.per_interview
+    _, updated = timed(index.update_interview, "deelnemer0.json", "Deelnemer0", update)
+    _, removed = timed(index.remove_interview, "deelnemer1.json")
+    index.similar("warmup")
+    print(f"Incremental update of {args.per_interview} statements: {updated * 1000:.1f}ms, removal: {removed * 1000:.1f}ms")
+
+    rng = random.Random(args.seed)
+    documents = [doc for doc in index._docs if doc is not None]
+    queries = [rng.choice(documents) for _ in range(args.queries)]
+    # Dropping words makes the query a paraphrase rather than a copy of a corpus statement
+    queries = [
+        doc[:5] + (" ".join(w for w in doc[5].split() if rng.random() >= args.drop),)
+        for doc in queries
+    ]
+
+    approximate, exact, recalls = [], [], []
+    for filename, position, _, _, _, text in queries:
+        index.exact_below = 0
+        lsh_hits, seconds = timed(index.similar, text, top_k=args.top_k, exclude=(filename, position))
+        approximate.append(seconds)
+        index.exact_below = float('inf')
+        exact_hits, seconds = timed(index.similar, text, top_k=args.top_k, exclude=(filename, position))
+        exact.append(seconds)
+        # Ties make the exact top-k ambiguous, so count hits scoring at least the k-th exact score
+        if exact_hits:
+            threshold = exact_hits[-1]['score'] - 1e-9
+            recalls.append(min(1.0, sum(h['score'] >= threshold for h in lsh_hits) / len(exact_hits)))
+
+    print(f"LSH:   {latency(approximate)}")
+    print(f"exact: {latency(exact)}")
+    print(f"recall@{args.top_k}: {sum(recalls) / len(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=100000)
+    parser.add_argument("--per-interview", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--drop", type=float, default=0.3, help="fraction of query words dropped")
+    parser.add_argument("--tables", type=int, default=SimilarityIndex().tables)
+    parser.add_argument("--bits", type=int, default=SimilarityIndex().bits)
+    parser.add_argument("--probes", type=int, default=SimilarityIndex().probes)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
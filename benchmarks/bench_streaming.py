@@ -0,0 +1,51 @@
+"""Time to first statement: blocking extraction versus streaming extraction.
+
+Uses the FakeBackend emitting tokens at a fixed rate, so no network is needed.
+
+    python -m benchmarks.bench_streaming [--tokens-per-second 200] [--segments 4]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+from src.processors import ai_processor
+from src.utils.llm_backend import FakeBackend, set_backend
+from src.utils.ledger import ledger
+from src.utils.rate_limiter import RequestScheduler
+
+# The fake backend has no rate limits, so do not throttle against the real ones
+ai_processor.scheduler = RequestScheduler(1e9, 1e12, 1e12)
+# Keep fake calls out of the real usage ledger
+ledger.directory = tempfile.mkdtemp(prefix="ledger_")
+
+
+def run(tokens_per_second: float, segments: int, sentences: int):
+    text = "\n".join(
+        " ".join(f"In segment {i} vertelt Erik over onderwerp {j} van de app." for j in range(sentences))
+        for i in range(segments)
+    )
+    kwargs = dict(max_segment_tokens=20 * sentences, overlap_sentences=0, use_cache=False)
+    set_backend(FakeBackend(latency=0.05, tokens_per_second=tokens_per_second))
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        blocking = ai_processor.process_interview_with_ai(text, "Erik", **kwargs)
+        blocking_time = time.perf_counter() - start
+
+        metrics = {}
+        streamed = list(ai_processor.stream_interview_with_ai(text, "Erik", metrics=metrics, **kwargs))
+
+    print(f"{metrics['segments']} segments x {sentences} statements at {tokens_per_second:.0f} tokens/s")
+    print(f"{'mode':>10} {'first statement (s)':>20} {'total (s)':>10} {'statements':>11}")
+    print(f"{'blocking':>10} {blocking_time:>20.2f} {blocking_time:>10.2f} {len(blocking.statements):>11}")
+    print(f"{'streaming':>10} {metrics['time_to_first_statement']:>20.2f} {metrics['total_time']:>10.2f} {len(streamed):>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--statements", type=int, default=10)
+    args = parser.parse_args()
+    run(args.tokens_per_second, args.segments, args.statements)
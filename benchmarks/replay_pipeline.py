@@ -0,0 +1,113 @@
+"""Record and replay the LLM traffic of the whole pipeline.
+
+``record`` runs extraction (blocking and streaming), analysis and chat over
+synthetic or stored interviews against a backend and writes every
+request/response pair to a cassette. ``replay`` runs the same workload from
+the cassette only, with the recorded timing scaled by ``--time-scale``, so
+changes to segmenting, concurrency or parsing can be measured end to end
+without API access and with identical model output.
+
+    python -m benchmarks.replay_pipeline record --cassette cassettes/pipeline.jsonl
+    python -m benchmarks.replay_pipeline replay --cassette cassettes/pipeline.jsonl --time-scale 0.1
+
+Recording uses the FakeBackend unless ``--anthropic`` is given.
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+from src.processors import ai_processor, analysis_processor
+from src.utils.cassette import CassetteBackend
+from src.utils.llm_backend import AnthropicBackend, FakeBackend, set_backend
+from src.utils.ledger import ledger
+from src.utils.rate_limiter import RequestScheduler
+
+QUESTIONS = ["Wat vinden deelnemers van de app?", "Welke zorgen hebben deelnemers over de kosten?"]
+
+
+def synthetic_transcripts(count: int, sentences: int):
+    topics = ["de app", "de kosten", "het contract", "de klantenservice", "de zonnepanelen"]
+    return [
+        (f"Deelnemer{i}", " ".join(
+            f"Deelnemer {i} vertelt in zin {j} iets over {topics[(i + j) % len(topics)]}."
+            for j in range(sentences)
+        ))
+        for i in range(count)
+    ]
+
+
+def stored_transcripts():
+    from src.utils.storage import load_interviews
+    return [(i.interviewee, i.raw_text) for i in load_interviews() if i.raw_text]
+
+
+def run_workload(transcripts, workers: int):
+    timings = {}
+    start = time.perf_counter()
+    interviews = [
+        ai_processor.process_interview_with_ai(text, name, max_workers=workers, use_cache=False)
+        for name, text in transcripts
+    ]
+    timings['extraction'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    metrics = {}
+    for name, text in transcripts[:1]:
+        for _ in ai_processor.stream_interview_with_ai(text, name, max_workers=workers, use_cache=False, metrics=metrics):
+            pass
+    timings['streaming'] = time.perf_counter() - start
+    timings['time_to_first_statement'] = metrics.get('time_to_first_statement') or 0.0
+
+    start = time.perf_counter()
+    analysis = analysis_processor.analyze_interviews(interviews, QUESTIONS)
+    timings['analysis'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chat = analysis_processor.chat_with_analysis("Vat de analyse samen", interviews, QUESTIONS, [])
+    timings['chat'] = time.perf_counter() - start
+
+    statements = sum(len(i.statements) for i in interviews)
+    return timings, statements, analysis, chat
+
+
+def main(args):
+    scheduler = RequestScheduler(1e9, 1e12, 1e12)
+    ledger.directory = tempfile.mkdtemp(prefix="ledger_")
+    ai_processor.scheduler = scheduler
+    analysis_processor.scheduler = scheduler
+
+    if args.mode == 'record':
+        inner = AnthropicBackend() if args.anthropic else FakeBackend(latency=args.latency, tokens_per_second=args.tokens_per_second)
+        backend = CassetteBackend(args.cassette, 'record', inner)
+    else:
+        backend = CassetteBackend(args.cassette, 'replay', time_scale=args.time_scale)
+    set_backend(backend)
+
+    transcripts = stored_transcripts() if args.stored else synthetic_transcripts(args.interviews, args.sentences)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings, statements, analysis, chat = run_workload(transcripts, args.workers)
+    total = time.perf_counter() - start
+
+    print(f"Mode: {args.mode}" + (f" (time scale {args.time_scale})" if args.mode == 'replay' else ""))
+    print(f"Interviews: {len(transcripts)}, statements: {statements}, "
+          f"analysis {'ok' if analysis else 'failed'}, chat {'ok' if 'usage' in chat else 'failed'}")
+    print("Timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    print(f"End to end: {total:.2f}s, recorded {backend.recorded}, replayed {backend.hits}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", default="cassettes/pipeline.jsonl")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="replay speed factor for recorded timing")
+    parser.add_argument("--stored", action="store_true", help="use the raw text of the interviews in data/")
+    parser.add_argument("--anthropic", action="store_true", help="record against the real API")
+    parser.add_argument("--interviews", type=int, default=3)
+    parser.add_argument("--sentences", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    main(parser.parse_args())
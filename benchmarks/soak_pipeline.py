@@ -0,0 +1,111 @@
+"""Soak test of the whole pipeline against the FakeBackend.
+
+Processes many synthetic interviews concurrently (extract, save, reload,
+analyse, chat) with injected latency, throughput limits and failures, and
+reports throughput, latency percentiles, scheduler counters and per-span
+timings. Everything is
+written to a temporary data directory.
+
+    python -m benchmarks.soak_pipeline [--interviews 50] [--failure-rate 0.05]
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import DATA_DIR, CACHE_DIR, BATCH_DIR, LEDGER_DIR, INDEX_DIR
+from src.processors import ai_processor, analysis_processor
+from src.utils.llm_backend import FakeBackend, set_backend
+from src.utils.rate_limiter import RequestScheduler
+from src.utils.tracing import MemorySink, summarize_spans, tracer
+
+
+def synthetic_transcript(index: int, sentences: int) -> str:
+    topics = ["de app", "de kosten", "het contract", "de klantenservice", "de zonnepanelen"]
+    return " ".join(
+        f"Deelnemer {index} vertelt in zin {j} iets over {topics[(index + j) % len(topics)]}."
+        for j in range(sentences)
+    )
+
+
+def run_interview(index: int, sentences: int, workers: int) -> float:
+    from src.utils.storage import save_interview
+    start = time.perf_counter()
+    interview = ai_processor.process_interview_with_ai(
+        synthetic_transcript(index, sentences), f"Deelnemer{index}", max_workers=workers, use_cache=False
+    )
+    interview.metadata['filename'] = f"deelnemer{index}.json"
+    interview.metadata['ready_for_analysis'] = True
+    if not save_interview(interview):
+        raise RuntimeError(f"saving interview {index} failed")
+    return time.perf_counter() - start
+
+
+def main(args):
+    scheduler = RequestScheduler(args.rpm, 1e12, 1e12, base_delay=0.05, max_delay=0.5)
+    ai_processor.scheduler = scheduler
+    analysis_processor.scheduler = scheduler
+    backend = FakeBackend(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        seed=42
+    )
+    set_backend(backend)
+    spans = MemorySink()
+    tracer.add_sink(spans)
+
+    workdir = tempfile.mkdtemp(prefix="soak_")
+    os.chdir(workdir)
+    # config creates its directories relative to the working directory at import, so recreate them here
+    for directory in [DATA_DIR, CACHE_DIR, BATCH_DIR, LEDGER_DIR, INDEX_DIR,
+                      ai_processor.segment_cache.directory, analysis_processor.partial_cache.directory]:
+        os.makedirs(directory, exist_ok=True)
+    from src.utils.storage import load_interviews
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.parallel_interviews) as executor:
+            latencies = list(executor.map(
+                lambda i: run_interview(i, args.sentences, args.workers), range(args.interviews)
+            ))
+        extraction_time = time.perf_counter() - start
+
+        interviews = load_interviews()
+        analysis_start = time.perf_counter()
+        analysis = analysis_processor.analyze_interviews(interviews, ["Wat vinden deelnemers van de app?"])
+        chat = analysis_processor.chat_with_analysis("Vat de analyse samen", interviews, ["Wat vinden deelnemers van de app?"], [])
+        analysis_time = time.perf_counter() - analysis_start
+
+    statements = sum(len(i.statements) for i in interviews)
+    failed = sum(len(i.metadata.get('failed_segments', [])) for i in interviews)
+    latencies.sort()
+    print(f"Data directory: {workdir}")
+    print(f"Interviews: {len(interviews)} reloaded, {statements} statements, {failed} failed segments")
+    print(f"Extraction: {extraction_time:.2f}s wall, {len(interviews) / extraction_time:.1f} interviews/s, "
+          f"{statements / extraction_time:.0f} statements/s")
+    print(f"Per interview: p50 {statistics.median(latencies):.2f}s, "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.2f}s, max {latencies[-1]:.2f}s")
+    print(f"Analysis + chat: {analysis_time:.2f}s, analysis {'ok' if analysis else 'failed'}, "
+          f"chat {'ok' if 'usage' in chat else 'failed'}")
+    print(f"Backend calls: {backend.calls}, scheduler: {scheduler.stats()}")
+    for name, entry in sorted(summarize_spans(spans.records).items()):
+        print(f"  {name:<18} {entry['count']:>6}x  p50 {entry['p50_ms']:8.1f}ms  p95 {entry['p95_ms']:8.1f}ms  "
+              f"total {entry['total_ms'] / 1000:7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interviews", type=int, default=50)
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--parallel-interviews", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4, help="segment workers per interview")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--rpm", type=float, default=4000, help="requests per minute allowed by the scheduler")
+    main(parser.parse_args())
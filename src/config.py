@@ -6,12 +6,39 @@ load_dotenv()
 
 # API Configuration
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'anthropic')  # 'fake' runs fully offline
+LLM_CASSETTE = os.getenv('LLM_CASSETTE')  # path of a cassette file to record to or replay from
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'replay')  # 'record' or 'replay'
+LLM_CASSETTE_TIME_SCALE = float(os.getenv('LLM_CASSETTE_TIME_SCALE', '1.0'))  # 0 replays without delays
 AI_MODEL = "claude-3-5-haiku-20241022"  # Correcte model naam voor Claude-3
+AI_MAX_CONCURRENCY = 4  # parallel segment extraction calls per interview
+BATCH_POLL_INTERVAL = 30  # seconds between Message Batches status checks
+
+# Rate limits shared by all Anthropic calls (set to your organisation's tier)
+API_REQUESTS_PER_MINUTE = 50
+API_INPUT_TOKENS_PER_MINUTE = 40000
+API_OUTPUT_TOKENS_PER_MINUTE = 8000
+API_OUTPUT_TOKEN_ESTIMATE = 1024  # output tokens reserved per call until the real usage is known
+API_MAX_RETRIES = 5
+API_RETRY_BASE_DELAY = 1.0  # seconds, doubled per retry (with jitter)
+API_RETRY_MAX_DELAY = 60.0
+
+# HTTP connection pool shared by all API clients
+HTTP_MAX_CONNECTIONS = 20  # at least the concurrent extraction, analysis and chat calls
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY = 60.0  # seconds an idle connection is kept open
+HTTP_CONNECT_TIMEOUT = 10.0
+HTTP_READ_TIMEOUT = 300.0  # per read, so long streamed responses are not cut off
+HTTP_WRITE_TIMEOUT = 30.0
+HTTP_POOL_TIMEOUT = 30.0  # wait for a free connection
 
 # File Processing
 ALLOWED_EXTENSIONS = {'.txt', '.doc', '.docx', '.pdf'}
 MAX_FILE_SIZE_MB = 10
 CHUNK_SIZE = 2000  # characters per chunk for processing
+CHARS_PER_TOKEN = 4  # rough average for Dutch text
+SEGMENT_TOKEN_BUDGET = 1500  # estimated input tokens of interview text per AI call
+SEGMENT_OVERLAP_SENTENCES = 1  # sentences repeated between consecutive AI segments
 
 # Analysis Settings
 DEFAULT_LANGUAGE = 'nl'  # Dutch
@@ -19,16 +46,82 @@ SENTIMENT_ANALYSIS = True
 PATTERN_RECOGNITION = True
 MINIMUM_STATEMENT_LENGTH = 10
 MAXIMUM_STATEMENT_LENGTH = 750
+ANALYSIS_MAX_PROMPT_TOKENS = 60000  # larger corpora are analysed map-reduce instead of in one prompt
+ANALYSIS_MAP_CHUNK_TOKENS = 15000  # statement tokens per partial analysis; longer interviews are split
+ANALYSIS_MAP_MAX_TOKENS = 2048  # output tokens per partial analysis
+ANALYSIS_MAX_CONCURRENCY = 4  # parallel partial analysis calls
+ANALYSIS_SECTION_MAX_TOKENS = 4096  # output tokens per research question in per-question mode
+ANALYSIS_SUMMARY_MAX_TOKENS = 1024  # output tokens of the summary over the sections
+ANALYSIS_RELEVANCE_TOP_K = 40  # best matching statements sent per research question (None sends all)
+ANALYSIS_RELEVANCE_SAMPLE = 30  # extra statements sampled across interviewees and statement types
+ANALYSIS_RELEVANCE_MIN_STATEMENTS = 300  # smaller corpora are sent complete
+CHAT_HISTORY_TOKEN_BUDGET = 3000  # estimated tokens of recent chat turns sent verbatim; older turns go into a memo
+CHAT_MEMO_MAX_TOKENS = 400  # output tokens of the memo that summarises older chat turns
+CHAT_MEMO_MODEL = AI_MODEL  # the memo is a plain summary, so the small model writes it
+
+# Similar statements
+SIMILARITY_HASH_FEATURES = 2 ** 18  # hashed word and word pair features per statement vector
+SIMILARITY_LSH_TABLES = 20
+SIMILARITY_LSH_BITS = 12  # random hyperplanes per table; fewer bits give more candidates and a higher recall
+SIMILARITY_LSH_PROBES = 4  # extra buckets per table, reached by flipping the least certain bits
+SIMILARITY_EXACT_BELOW = 100000  # smaller corpora are compared with every statement; exact scoring is as fast there
+SIMILARITY_TOP_K = 10
+
+# Near-duplicates
+DUPLICATE_NUM_PERM = 64  # MinHash values per signature
+DUPLICATE_BANDS = 16  # LSH bands of 4 values; pairs from a Jaccard similarity of about 0.5 become candidates
+DUPLICATE_STATEMENT_THRESHOLD = 0.7  # estimated Jaccard similarity of the character 4-grams of two statements
+DUPLICATE_INTERVIEW_THRESHOLD = 0.8  # estimated Jaccard similarity of the word 3-grams of two transcripts
+ANALYSIS_COLLAPSE_DUPLICATES = True  # send near-duplicate statements once, with how often they were made
+
+# Themes
+THEME_COUNT = None  # number of clusters; None derives it from the number of statements
+THEME_MAX_COUNT = 12
+THEME_TOP_TERMS = 6  # terms shown per theme
+THEME_REPRESENTATIVES = 3  # statements closest to the centre of each theme
+THEME_NAMING_MAX_TOKENS = 1024  # output tokens of the call that names the themes
+
+# Sentiment
+SENTIMENT_NEUTRAL_BAND = 0.05  # statement scores closer to zero than this count as neutral
+SENTIMENT_NEGATION_WINDOW = 3  # words after 'niet', 'geen', ... whose sentiment is flipped
+SENTIMENT_CACHE_MAX_ENTRIES = 200000  # statement scores kept in memory
 
 # Visualization
 MAX_WORDCLOUD_WORDS = 100
+WORDCLOUD_WIDTH = 800  # pixels of the rendered word cloud
+WORDCLOUD_HEIGHT = 400
 NETWORK_GRAPH_MIN_EDGE_WEIGHT = 2
+NETWORK_GRAPH_MAX_TERMS = 150  # most frequent terms kept as nodes; bounds the co-occurrence matrix and the drawing
+NETWORK_GRAPH_MAX_EDGES = 400  # strongest edges kept after pruning
 
 # Storage
 DATA_DIR = 'data'
 TEMP_DIR = 'temp'
 EXPORT_DIR = 'exports'
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+BATCH_DIR = os.path.join(DATA_DIR, 'batches')
+LEDGER_DIR = os.path.join(DATA_DIR, 'ledger')
+INDEX_DIR = os.path.join(DATA_DIR, 'index')  # statement search index, one shard per interview
+
+# Cost estimates in USD per million input/output tokens
+MODEL_PRICES = {
+    'claude-3-5-sonnet-20241022': (3.00, 15.00),
+    'claude-3-5-haiku-20241022': (0.80, 4.00)
+}
+CACHE_WRITE_PRICE_FACTOR = 1.25  # prompt cache writes relative to the input price
+CACHE_READ_PRICE_FACTOR = 0.1  # prompt cache reads relative to the input price
+BATCH_PRICE_FACTOR = 0.5  # Message Batches discount
+
+# Tracing
+TRACE_LEVEL = os.getenv('TRACE_LEVEL', 'INFO')  # DEBUG, INFO, WARNING, ERROR or OFF for the trace file
+TRACE_FILE = os.getenv('TRACE_FILE')  # JSON-lines file for spans and events; unset disables it
+TRACE_CONSOLE_LEVEL = os.getenv('TRACE_CONSOLE_LEVEL', 'WARNING')  # minimum level printed to stderr
+
+# Cache
+SEGMENT_CACHE_MAX_ENTRIES = 5000
+SEGMENT_CACHE_MAX_MB = 50
+SEGMENT_CACHE_MAX_AGE_DAYS = 30
 
 # Create necessary directories if they don't exist
-for directory in [DATA_DIR, TEMP_DIR, EXPORT_DIR]:
+for directory in [DATA_DIR, TEMP_DIR, EXPORT_DIR, CACHE_DIR, BATCH_DIR, LEDGER_DIR, INDEX_DIR]:
     os.makedirs(directory, exist_ok=True) 
\ No newline at end of file
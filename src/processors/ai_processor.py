@@ -1,34 +1,127 @@
-from typing import List, Dict
-import anthropic
+import os
+import re
+import time
+import queue
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Dict, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ..models import Statement, StatementType, Interview
-from ..config import ANTHROPIC_API_KEY, AI_MODEL
+from ..config import (
+    AI_MODEL, AI_MAX_CONCURRENCY, CACHE_DIR,
+    SEGMENT_CACHE_MAX_ENTRIES, SEGMENT_CACHE_MAX_MB, SEGMENT_CACHE_MAX_AGE_DAYS,
+    SEGMENT_TOKEN_BUDGET, SEGMENT_OVERLAP_SENTENCES
+)
+from .text_processor import plan_segments, segment_sentences, segment_hash
+from ..utils.cache import DiskCache
+from ..utils.storage import statement_to_dict, statement_from_dict
+from ..utils.usage import usage_to_dict, summarize_usage
+from ..utils.rate_limiter import scheduler, PRIORITY_EXTRACTION
+from ..utils.llm_backend import get_backend
+from ..utils.tracing import tracer, DEBUG
+from ..utils.ledger import ledger
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+EXTRACTION_MODEL = "claude-3-5-sonnet-20241022"
+# Bump whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = "2"
 
-def analyze_text_segment(text: str, interviewee: str) -> List[Statement]:
-    """Analyze a segment of text using Claude to extract statements."""
+segment_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'segments'),
+    max_entries=SEGMENT_CACHE_MAX_ENTRIES,
+    max_mb=SEGMENT_CACHE_MAX_MB,
+    max_age_days=SEGMENT_CACHE_MAX_AGE_DAYS
+)
+
+STATEMENT_TYPES = {
+    'denkt': StatementType.THOUGHT,
+    'voelt': StatementType.FEELING,
+    'doet': StatementType.ACTION,
+    'zegt': StatementType.STATEMENT
+}
+
+class StatementParser:
+    """Incrementally parse TYPE:/TEKST:/ZEKERHEID: blocks from model output.
+
+    Text can be fed in arbitrary chunks (e.g. streamed tokens); a statement is
+    returned as soon as the blank line that closes its block has arrived.
+    """
     
-    try:
-        print(f"\n=== Analyzing text segment for {interviewee} ===")
-        print(f"Text length: {len(text)}")
-        print(f"First 100 chars of text: {text[:100]}")  # Debug: Show start of text
+    def __init__(self):
+        self._buffer = ""
+        self._current = {}
+    
+    def feed(self, chunk: str) -> List[Statement]:
+        """Add a chunk of output and return the statements it completed."""
+        self._buffer += chunk
+        statements = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            statement = self._process_line(line)
+            if statement:
+                statements.append(statement)
+        return statements
+    
+    def close(self) -> List[Statement]:
+        """Flush the remaining buffered output at the end of the response."""
+        statements = []
+        for line in [self._buffer, '']:
+            statement = self._process_line(line)
+            if statement:
+                statements.append(statement)
+        self._buffer = ""
+        return statements
+    
+    def _process_line(self, line: str) -> Optional[Statement]:
+        line = line.strip()
+        if not line:
+            current, self._current = self._current, {}
+            return self._build_statement(current) if current else None
         
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=8192,
-            temperature=0.0,  # Zeer lage temperature voor consistente output
-            system=[
-                {
-                    "type": "text",
-                    "text": f"""Je bent een expert in het analyseren van interviews.
-Je extraheert belangrijke uitspraken en formuleert ze ALTIJD in het exacte format: "{interviewee} [werkwoord] [statement]"
-Gebruik altijd de naam '{interviewee}' aan het begin van elke zin.
+        if line.startswith('TYPE:'):
+            self._current['type'] = line.replace('TYPE:', '').strip()
+        elif line.startswith('TEKST:'):
+            self._current['text'] = line.replace('TEKST:', '').strip()
+        elif line.startswith('ZEKERHEID:'):
+            try:
+                # Drop trailing comments such as "1.0  # Directe uitspraak"
+                self._current['confidence'] = float(line.replace('ZEKERHEID:', '').split('#')[0].strip())
+            except ValueError:
+                self._current['confidence'] = 0.8
+        return None
+    
+    @staticmethod
+    def _build_statement(data: Dict) -> Optional[Statement]:
+        try:
+            statement = Statement(
+                text=data['text'],
+                type=STATEMENT_TYPES[data['type'].lower()],
+                source_text=data.get('text', ''),
+                confidence=float(data.get('confidence', 0.8))
+            )
+        except (KeyError, ValueError) as e:
+            tracer.warning('statement_invalid', error=str(e), data=data)
+            return None
+        return statement
+
+def parse_statements(response_text: str) -> List[Statement]:
+    """Parse a complete model response into statements."""
+    with tracer.span('parse', chars=len(response_text)) as span:
+        parser = StatementParser()
+        statements = parser.feed(response_text)
+        statements.extend(parser.close())
+        span.set(statements=len(statements))
+    return statements
+
+# Static extraction instructions. They contain no interviewee name or interview
+# text, so the whole block is a stable prefix that the API can cache.
+EXTRACTION_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interviews.
+Je extraheert belangrijke uitspraken en formuleert ze ALTIJD in het exacte format: "[naam] [werkwoord] [statement]"
+Gebruik altijd de naam van de geïnterviewde (zoals opgegeven in het bericht) aan het begin van elke zin.
 Begin elke zin met:
-- "{interviewee} denkt..." voor meningen en gedachten
-- "{interviewee} voelt..." voor emoties en gevoelens
-- "{interviewee} doet..." voor acties en handelingen
-- "{interviewee} zegt..." voor uitspraken en mededelingen
+- "[naam] denkt..." voor meningen en gedachten
+- "[naam] voelt..." voor emoties en gevoelens
+- "[naam] doet..." voor acties en handelingen
+- "[naam] zegt..." voor uitspraken en mededelingen
 
 Zorg dat elke uitspraak op een nieuwe regel begint en gebruik een lege regel tussen uitspraken.
 
@@ -40,126 +133,360 @@ Bepaal voor elke uitspraak een betrouwbaarheidsscore (ZEKERHEID) tussen 0.0 en 1
 - 0.6: Voorzichtige interpretaties
 - 0.5 of lager: Speculatieve of onduidelijke interpretaties
 
-Als je een aanpassing maakt in de analyse, vermeld dan expliciet dat de gebruiker de wijzigingen kan bekijken in de markdown-tab van de applicatie."""
-                }
-            ],
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""Analyseer het volgende interview segment en extraheer belangrijke uitspraken.
-Formuleer elke uitspraak in het exacte format: "{interviewee} [werkwoord] [statement]"
+Als je een aanpassing maakt in de analyse, vermeld dan expliciet dat de gebruiker de wijzigingen kan bekijken in de markdown-tab van de applicatie.
+
+Analyseer het interview segment uit het bericht en extraheer belangrijke uitspraken.
+Formuleer elke uitspraak in het exacte format: "[naam] [werkwoord] [statement]"
 
 Voor elke relevante uitspraak, bepaal het type:
-- DENKT: "{interviewee} denkt/vindt/gelooft..." (voor meningen, overtuigingen, gedachten)
-- VOELT: "{interviewee} voelt/is/wordt..." (voor emoties, stemmingen, ervaringen)
-- DOET: "{interviewee} gaat/maakt/gebruikt..." (voor acties, gedrag, handelingen)
-- ZEGT: "{interviewee} zegt/vertelt/geeft aan..." (voor directe uitspraken, verklaringen)
+- DENKT: "[naam] denkt/vindt/gelooft..." (voor meningen, overtuigingen, gedachten)
+- VOELT: "[naam] voelt/is/wordt..." (voor emoties, stemmingen, ervaringen)
+- DOET: "[naam] gaat/maakt/gebruikt..." (voor acties, gedrag, handelingen)
+- ZEGT: "[naam] zegt/vertelt/geeft aan..." (voor directe uitspraken, verklaringen)
 
 Geef voor elke uitspraak terug:
 TYPE: [denkt/voelt/doet/zegt]
-TEKST: {interviewee} [werkwoord] [statement]
+TEKST: [naam] [werkwoord] [statement]
 ZEKERHEID: [0.0-1.0] (hoe zekerder de interpretatie, hoe hoger de score)
 
-Voorbeeld format:
+Voorbeeld format (voor een geïnterviewde met de naam Sanne):
 TYPE: zegt
-TEKST: {interviewee} zegt verschillende hobby's te hebben
+TEKST: Sanne zegt verschillende hobby's te hebben
 ZEKERHEID: 1.0  # Directe uitspraak
 
 TYPE: denkt
-TEKST: {interviewee} vindt zijn hobby's belangrijk
-ZEKERHEID: 0.8  # Interpretatie gebaseerd op context
+TEKST: Sanne vindt haar hobby's belangrijk
+ZEKERHEID: 0.8  # Interpretatie gebaseerd op context"""
+
+def _extraction_request(text: str, interviewee: str) -> Dict:
+    """Build the messages API parameters for extracting statements from a segment."""
+    return {
+        "model": EXTRACTION_MODEL,
+        "max_tokens": 8192,
+        "temperature": 0.0,  # Zeer lage temperature voor consistente output
+        "system": [
+            {
+                "type": "text",
+                "text": EXTRACTION_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": f"""Naam geïnterviewde: {interviewee}
+Begin elke uitspraak met "{interviewee}".
 
 Interview segment met {interviewee}:
 {text}"""
-                }
-            ]
-        )
-        
-        print("\n=== AI Response ===")
-        print(f"Raw response type: {type(response)}")  # Debug: Show response type
-        print(f"Response content type: {type(response.content)}")  # Debug: Show content type
-        print(f"Response content length: {len(response.content)}")  # Debug: Show content length
-        print("Full response content:")  # Debug: Show full response
-        print(response.content[0].text)
-        
-        # Process the response
-        statements = []
-        current_statement = {}
-        
-        for line in response.content[0].text.split('\n'):
-            line = line.strip()
-            print(f"Processing line: {line}")  # Debug: Show each line being processed
-            if not line:
-                if current_statement:
-                    # Create statement object
-                    try:
-                        statement_type = {
-                            'denkt': StatementType.THOUGHT,
-                            'voelt': StatementType.FEELING,
-                            'doet': StatementType.ACTION,
-                            'zegt': StatementType.STATEMENT
-                        }[current_statement['type'].lower()]
-                        
-                        statement = Statement(
-                            text=current_statement['text'],
-                            type=statement_type,
-                            source_text=current_statement.get('text', ''),
-                            confidence=float(current_statement.get('confidence', 0.8))
-                        )
-                        statements.append(statement)
-                        print(f"✓ Created statement: {statement.text} (Type: {statement.type.value}, Confidence: {statement.confidence})")
-                    except (KeyError, ValueError) as e:
-                        print(f"❌ Error creating statement: {str(e)}")
-                        print(f"Current statement data: {current_statement}")
-                current_statement = {}
-                continue
-            
-            if line.startswith('TYPE:'):
-                current_statement['type'] = line.replace('TYPE:', '').strip()
-            elif line.startswith('TEKST:'):
-                current_statement['text'] = line.replace('TEKST:', '').strip()
-            elif line.startswith('ZEKERHEID:'):
-                try:
-                    current_statement['confidence'] = float(line.replace('ZEKERHEID:', '').strip())
-                except ValueError:
-                    current_statement['confidence'] = 0.8
-        
-        # Process the last statement if exists
-        if current_statement:
-            try:
-                statement_type = {
-                    'denkt': StatementType.THOUGHT,
-                    'voelt': StatementType.FEELING,
-                    'doet': StatementType.ACTION,
-                    'zegt': StatementType.STATEMENT
-                }[current_statement['type'].lower()]
-                
-                statement = Statement(
-                    text=current_statement['text'],
-                    type=statement_type,
-                    source_text=current_statement.get('text', ''),
-                    confidence=float(current_statement.get('confidence', 0.8))
-                )
-                statements.append(statement)
-                print(f"✓ Created final statement: {statement.text} (Type: {statement.type.value}, Confidence: {statement.confidence})")
-            except (KeyError, ValueError) as e:
-                print(f"❌ Error creating final statement: {str(e)}")
-                print(f"Current statement data: {current_statement}")
-        
-        print(f"\nTotal statements created: {len(statements)}")
-        return statements
+            }
+        ]
+    }
+
+def _extract_statements(text: str, interviewee: str, usage_log: Optional[List[Dict]] = None) -> List[Statement]:
+    """Send a segment to Claude and parse the extracted statements. Raises on API errors."""
+    with tracer.span('llm_call', stage='extraction', model=EXTRACTION_MODEL, interviewee=interviewee, chars=len(text)) as span, \
+            ledger.track('extraction', EXTRACTION_MODEL, interviewee=interviewee) as call:
+        response = scheduler.create_message(get_backend(), _extraction_request(text, interviewee), PRIORITY_EXTRACTION)
+        usage = usage_to_dict(response.usage)
+        span.set(stop_reason=response.stop_reason, **usage)
+        call.update(usage=usage, stop_reason=response.stop_reason)
+    if usage_log is not None:
+        usage_log.append(usage)
+    if tracer.enabled(DEBUG):
+        tracer.debug('llm_response', stage='extraction', interviewee=interviewee, text=response.content[0].text)
     
+    return parse_statements(response.content[0].text)
+
+def _segment_cache_key(text: str, interviewee: str) -> str:
+    return DiskCache.make_key(EXTRACTION_MODEL, EXTRACTION_PROMPT_VERSION, interviewee, text)
+
+def analyze_text_segment(
+    text: str,
+    interviewee: str,
+    use_cache: bool = True,
+    usage_log: Optional[List[Dict]] = None
+) -> List[Statement]:
+    """Analyze a segment of text using Claude to extract statements.
+
+    Results are cached on disk by model, prompt version, interviewee and
+    segment text, so a cache hit returns without any network call. Token
+    usage of the API call (including prompt cache reads/writes) is appended
+    to ``usage_log`` when given.
+    """
+    try:
+        return _analyze_segment(text, interviewee, use_cache, usage_log)
     except Exception as e:
-        print(f"❌ Error in analyze_text_segment: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        tracer.error('segment_failed', interviewee=interviewee, error=f"{type(e).__name__}: {e}")
         return []
 
-def process_interview_with_ai(text: str, interviewee: str, max_segment_length: int = 2000) -> Interview:
-    """Process complete interview using AI analysis."""
-    print(f"\n=== Processing interview for {interviewee} ===")
-    print(f"Total text length: {len(text)}")
+def _analyze_segment(
+    text: str,
+    interviewee: str,
+    use_cache: bool = True,
+    usage_log: Optional[List[Dict]] = None
+) -> List[Statement]:
+    """Cached extraction for one segment. Raises once the scheduler gives up retrying."""
+    cache_key = _segment_cache_key(text, interviewee)
+    if use_cache:
+        cached = segment_cache.get(cache_key)
+        if cached is not None:
+            tracer.debug('segment_cache_hit', interviewee=interviewee, statements=len(cached))
+            return [statement_from_dict(s) for s in cached]
+    
+    statements = _extract_statements(text, interviewee, usage_log)
+    
+    # Only successful responses are cached, failed calls are retried next time
+    if use_cache:
+        segment_cache.set(cache_key, [statement_to_dict(s) for s in statements])
+    return statements
+
+def _stream_statements(
+    text: str,
+    interviewee: str,
+    use_cache: bool = True,
+    usage_log: Optional[List[Dict]] = None
+) -> Iterator[Statement]:
+    """Stream statements for a segment as the model writes them. Raises on API errors."""
+    cache_key = _segment_cache_key(text, interviewee)
+    if use_cache:
+        cached = segment_cache.get(cache_key)
+        if cached is not None:
+            for data in cached:
+                yield statement_from_dict(data)
+            return
+    
+    parser = StatementParser()
+    statements = []
+    with tracer.span('llm_call', stage='extraction', model=EXTRACTION_MODEL, interviewee=interviewee, chars=len(text), stream=True) as span, \
+            ledger.track('extraction', EXTRACTION_MODEL, interviewee=interviewee, stream=True) as call:
+        start = time.perf_counter()
+        stream, reserved_output_tokens = scheduler.open_stream(
+            get_backend(), _extraction_request(text, interviewee), PRIORITY_EXTRACTION
+        )
+        final_message = None
+        try:
+            for chunk in stream.text_stream:
+                for statement in parser.feed(chunk):
+                    if not statements:
+                        span.set(time_to_first_statement_ms=(time.perf_counter() - start) * 1000)
+                        call['time_to_first_statement'] = time.perf_counter() - start
+                    statements.append(statement)
+                    yield statement
+            final_message = stream.get_final_message()
+        finally:
+            stream.close()
+            # Also when the stream failed or the consumer stopped iterating, so no reservation is left behind
+            scheduler.reconcile(reserved_output_tokens, final_message.usage if final_message is not None else None)
+        usage = final_message.usage
+        span.set(stop_reason=final_message.stop_reason, **usage_to_dict(usage))
+        call.update(usage=usage_to_dict(usage), stop_reason=final_message.stop_reason)
+    if usage_log is not None:
+        usage_log.append(usage_to_dict(usage))
+    for statement in parser.close():
+        statements.append(statement)
+        yield statement
     
+    if use_cache:
+        segment_cache.set(cache_key, [statement_to_dict(s) for s in statements])
+
+def stream_text_segment(
+    text: str,
+    interviewee: str,
+    use_cache: bool = True,
+    metrics: Optional[Dict] = None
+) -> Iterator[Statement]:
+    """Yield statements for a segment while the model is still writing.
+
+    If ``metrics`` is given, ``time_to_first_statement`` and ``total_time``
+    (seconds) are recorded in it.
+    """
+    start = time.perf_counter()
+    try:
+        for statement in _stream_statements(text, interviewee, use_cache):
+            if metrics is not None and 'time_to_first_statement' not in metrics:
+                metrics['time_to_first_statement'] = time.perf_counter() - start
+            yield statement
+    except Exception as e:
+        tracer.error('segment_failed', interviewee=interviewee, error=f"{type(e).__name__}: {e}")
+    if metrics is not None:
+        metrics['total_time'] = time.perf_counter() - start
+
+def stream_interview_with_ai(
+    text: str,
+    interviewee: str,
+    max_segment_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES,
+    max_workers: int = AI_MAX_CONCURRENCY,
+    use_cache: bool = True,
+    metrics: Optional[Dict] = None
+) -> Iterator[Statement]:
+    """Yield the statements of a complete interview as they are extracted.
+
+    Segments are streamed concurrently, but statements are yielded in segment
+    order: the first segment is yielded token by token while later segments
+    are buffered until their turn. ``metrics`` receives the time to first
+    statement, total time, segment and statement counts, the segment map
+    (``segment_map``), failed segments and the per-call token usage
+    (``llm_usage``). Each statement records the hash of its segment.
+    """
+    segments, segment_map = plan_segments(text, max_segment_tokens, overlap_sentences)
+    metrics = metrics if metrics is not None else {}
+    metrics.update({
+        'segments': len(segments), 'segment_map': segment_map,
+        'statements': 0, 'failed_segments': [], 'llm_usage': []
+    })
+    start = time.perf_counter()
+    
+    queues = [queue.Queue() for _ in segments]
+    
+    def worker(i: int, segment: str):
+        usage_log = []
+        try:
+            for statement in _stream_statements(segment, interviewee, use_cache, usage_log):
+                queues[i].put(_tag_segment(statement, segment_map[i]['hash']))
+        except Exception as e:
+            tracer.error('segment_failed', interviewee=interviewee, segment=i, error=f"{type(e).__name__}: {e}")
+            metrics['failed_segments'].append(i)
+        finally:
+            metrics['llm_usage'].extend(dict(segment=i, **usage) for usage in usage_log)
+            queues[i].put(None)
+    
+    previous = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segments)))) as executor:
+        for i, segment in enumerate(segments):
+            executor.submit(tracer.wrap(worker), i, segment)
+        
+        for i, segment_queue in enumerate(queues):
+            # Only the overlap with the previous segment can repeat a statement, as in deduplicate_statements
+            overlaps = i > 0 and segment_map[i]['start'] < segment_map[i - 1]['end']
+            current = {}
+            statement = segment_queue.get()
+            while statement is not None:
+                if not _overlap_repeat(statement, previous if overlaps else {}, current, segment_map[i]['hash']):
+                    if 'time_to_first_statement' not in metrics:
+                        metrics['time_to_first_statement'] = time.perf_counter() - start
+                    metrics['statements'] += 1
+                    yield statement
+                statement = segment_queue.get()
+            previous = current
+    
+    metrics['failed_segments'].sort()
+    metrics['llm_usage'].sort(key=lambda usage: usage['segment'])
+    metrics['total_time'] = time.perf_counter() - start
+    tracer.info(
+        'interview_streamed', interviewee=interviewee, segments=len(segments), statements=metrics['statements'],
+        failed_segments=len(metrics['failed_segments']), total_ms=metrics['total_time'] * 1000,
+        time_to_first_statement_ms=(metrics.get('time_to_first_statement') or 0) * 1000
+    )
+
+def _statement_key(statement: Statement) -> str:
+    """Normalised statement text used to spot duplicates from overlapping segments."""
+    return re.sub(r'\W+', ' ', statement.text.lower()).strip()
+
+def _overlap_repeat(
+    statement: Statement,
+    previous: Dict[str, Statement],
+    current: Dict[str, Statement],
+    segment_hash: str
+) -> bool:
+    """Whether ``statement`` repeats one kept from the previous segment (``previous``, by statement key).
+
+    The kept statement then also lists ``segment_hash`` in its
+    ``overlap_hashes``. ``current`` collects the kept statements of this segment.
+    """
+    key = _statement_key(statement)
+    kept = previous.get(key)
+    if kept is not None:
+        overlap_hashes = kept.metadata.get('overlap_hashes', [])
+        if segment_hash not in overlap_hashes:
+            kept.metadata = {**kept.metadata, 'overlap_hashes': overlap_hashes + [segment_hash]}
+    current.setdefault(key, kept or statement)
+    return kept is not None
+
+def deduplicate_statements(segment_statements: List[List[Statement]], segment_map: List[Dict]) -> List[Statement]:
+    """The statements of all segments in order, without those repeated from the overlap window.
+
+    Only adjacent segments share sentences, so a statement is dropped only if
+    the segment before it, when the two overlap, produced the same statement.
+    Statements repeated elsewhere in the interview are kept. The kept copy
+    lists the segments it was dropped from in ``metadata['overlap_hashes']``,
+    so reprocessing keeps it when only one of its segments changed.
+    """
+    unique = []
+    previous = {}
+    for i, statements in enumerate(segment_statements):
+        overlaps = i > 0 and segment_map[i]['start'] < segment_map[i - 1]['end']
+        current = {}
+        for statement in statements:
+            if not _overlap_repeat(statement, previous if overlaps else {}, current, segment_map[i]['hash']):
+                unique.append(statement)
+        previous = current
+    return unique
+
+def _tag_segment(statement: Statement, segment_hash: str) -> Statement:
+    """Record which segment a statement was extracted from."""
+    statement.metadata = {**(statement.metadata or {}), 'segment_hash': segment_hash}
+    return statement
+
+def _extract_segments(
+    segments: List[str],
+    indices: List[int],
+    interviewee: str,
+    max_workers: int = AI_MAX_CONCURRENCY,
+    use_cache: bool = True
+):
+    """Extract the segments at ``indices`` concurrently.
+
+    Returns per-segment statements and usage logs (indexed like ``segments``)
+    and the sorted indices of failed segments.
+    """
+    results: List[List[Statement]] = [[] for _ in segments]
+    usage_logs: List[List[Dict]] = [[] for _ in segments]
+    failed_segments = []
+    
+    if max_workers <= 1 or len(indices) <= 1:
+        for i in indices:
+            try:
+                results[i] = _analyze_segment(segments[i], interviewee, use_cache, usage_logs[i])
+            except Exception as e:
+                tracer.error('segment_failed', interviewee=interviewee, segment=i, error=f"{type(e).__name__}: {e}")
+                failed_segments.append(i)
+    else:
+        workers = min(max_workers, len(indices))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(tracer.wrap(_analyze_segment), segments[i], interviewee, use_cache, usage_logs[i]): i
+                for i in indices
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # One failed segment must not drop the statements of the others
+                    tracer.error('segment_failed', interviewee=interviewee, segment=i, error=f"{type(e).__name__}: {e}")
+                    failed_segments.append(i)
+    
+    return results, usage_logs, sorted(failed_segments)
+
+def process_interview_with_ai(
+    text: str,
+    interviewee: str,
+    max_segment_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES,
+    max_workers: int = AI_MAX_CONCURRENCY,
+    use_cache: bool = True
+) -> Interview:
+    """Process complete interview using AI analysis.
+
+    The text is packed into sentence-aligned segments of at most
+    ``max_segment_tokens`` estimated tokens, which are sent to the model
+    concurrently (at most ``max_workers`` calls in flight). Statements are
+    added in segment order, with duplicates from the overlap window removed.
+    Each statement records its segment hash, and the segment map is kept in
+    ``metadata['segment_map']`` for reprocess_interview_with_ai.
+    """
     # Create interview object
     interview = Interview(
         interviewee=interviewee,
@@ -167,18 +494,115 @@ def process_interview_with_ai(text: str, interviewee: str, max_segment_length: i
         raw_text=text
     )
     
-    # Split text into manageable segments
-    segments = [text[i:i+max_segment_length] for i in range(0, len(text), max_segment_length)]
-    print(f"Split into {len(segments)} segments")
-    
-    # Process each segment
-    total_statements = 0
-    for i, segment in enumerate(segments, 1):
-        print(f"\nProcessing segment {i}/{len(segments)}")
-        statements = analyze_text_segment(segment, interviewee)
-        total_statements += len(statements)
-        for statement in statements:
+    with tracer.span('extract_interview', interviewee=interviewee, chars=len(text)) as span:
+        # Pack whole sentences into segments that fit the token budget
+        segments, segment_map = plan_segments(text, max_segment_tokens, overlap_sentences)
+        
+        results, usage_logs, failed_segments = _extract_segments(
+            segments, list(range(len(segments))), interviewee, max_workers, use_cache
+        )
+        
+        segment_statements = [
+            [_tag_segment(statement, segment_map[i]['hash']) for statement in statements]
+            for i, statements in enumerate(results)
+        ]
+        for statement in deduplicate_statements(segment_statements, segment_map):
             interview.add_statement(statement)
+        span.set(segments=len(segments), statements=len(interview.statements), failed_segments=len(failed_segments))
+    
+    interview.metadata['segment_map'] = segment_map
+    if failed_segments:
+        interview.metadata['failed_segments'] = failed_segments
     
-    print(f"\nTotal statements added to interview: {len(interview.statements)}")
-    return interview 
\ No newline at end of file
+    interview.metadata['llm_usage'] = [
+        dict(segment=i, **usage) for i, usage_log in enumerate(usage_logs) for usage in usage_log
+    ]
+    interview.metadata['llm_usage_summary'] = summarize_usage(interview.metadata['llm_usage'])
+    return interview
+
+def reprocess_interview_with_ai(
+    interview: Interview,
+    text: str,
+    max_segment_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES,
+    max_workers: int = AI_MAX_CONCURRENCY,
+    use_cache: bool = True
+) -> Interview:
+    """Re-extract an interview after its transcript was corrected.
+
+    The new text is segmented so that segments from the stored segment map
+    that are still present keep their boundaries. Only segments whose content
+    hash is new are sent to the model; the statements of unchanged segments,
+    manual edits included, are kept as they are. Manually edited statements
+    whose segment changed or that were added by hand are kept at the end.
+    Segments listed in ``metadata['failed_segments']`` are extracted again and
+    stay listed only if they fail again.
+    Returns a new Interview with the same filename; the caller saves it.
+    """
+    with tracer.span('reextract_interview', interviewee=interview.interviewee, chars=len(text)) as span:
+        previous = segment_sentences(interview.raw_text or "", interview.metadata.get('segment_map', []), max_segment_tokens)
+        segments, segment_map = plan_segments(text, max_segment_tokens, overlap_sentences, previous)
+        
+        known_hashes = {segment_hash(' '.join(sentences)) for sentences in previous}
+        # Segments that failed last time have no statements yet, so extract them again
+        previous_map = interview.metadata.get('segment_map', [])
+        known_hashes -= {
+            previous_map[i]['hash'] for i in interview.metadata.get('failed_segments', []) if i < len(previous_map)
+        }
+        changed = [i for i, entry in enumerate(segment_map) if entry['hash'] not in known_hashes]
+        
+        results, usage_logs, failed_segments = _extract_segments(segments, changed, interview.interviewee, max_workers, use_cache)
+        span.set(segments=len(segments), extracted_segments=len(changed), failed_segments=len(failed_segments))
+    
+    reused_hashes = {entry['hash'] for entry in segment_map if entry['hash'] in known_hashes}
+    kept_by_hash: Dict[str, List[Statement]] = {}
+    orphaned_edits = []
+    for statement in interview.statements:
+        metadata = statement.metadata or {}
+        # A statement from an overlap is kept with whichever of its segments is reused
+        statement_hash = next(
+            (h for h in [metadata.get('segment_hash')] + metadata.get('overlap_hashes', []) if h in reused_hashes), None
+        )
+        if statement_hash is not None:
+            # deduplicate_statements lists the overlaps of the new segmentation again
+            metadata = {k: v for k, v in metadata.items() if k != 'overlap_hashes'}
+            kept_by_hash.setdefault(statement_hash, []).append(
+                replace(statement, metadata={**metadata, 'segment_hash': statement_hash})
+            )
+        elif metadata.get('edited'):
+            orphaned_edits.append(statement)
+    
+    segment_statements = []
+    for i, entry in enumerate(segment_map):
+        if entry['hash'] in reused_hashes:
+            segment_statements.append(kept_by_hash.pop(entry['hash'], []))
+        else:
+            segment_statements.append([_tag_segment(statement, entry['hash']) for statement in results[i]])
+    
+    usage = [dict(segment=i, **u) for i, usage_log in enumerate(usage_logs) for u in usage_log]
+    metadata = dict(interview.metadata)
+    metadata.pop('failed_segments', None)
+    metadata.update({
+        'segment_map': segment_map,
+        'reprocessed_at': datetime.now().isoformat(),
+        'reprocessing': {
+            'segments': len(segments),
+            'reused_segments': len(segments) - len(changed),
+            'extracted_segments': len(changed),
+            'kept_edits': len(orphaned_edits),
+            'llm_usage_summary': summarize_usage(usage)
+        },
+        'llm_usage': metadata.get('llm_usage', []) + usage
+    })
+    metadata['llm_usage_summary'] = summarize_usage(metadata['llm_usage'])
+    if failed_segments:
+        metadata['failed_segments'] = failed_segments
+    
+    updated = Interview(
+        interviewee=interview.interviewee,
+        date=interview.date,
+        raw_text=text,
+        statements=deduplicate_statements(segment_statements, segment_map) + orphaned_edits,
+        metadata=metadata
+    )
+    return updated
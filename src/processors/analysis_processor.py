@@ -1,32 +1,44 @@
-from typing import List, Dict, Optional
-import anthropic
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Iterator, Optional
 from ..models import Interview, Statement
-from ..config import ANTHROPIC_API_KEY, AI_MODEL
+from ..config import (
+    CACHE_DIR, SEGMENT_CACHE_MAX_ENTRIES, SEGMENT_CACHE_MAX_MB, SEGMENT_CACHE_MAX_AGE_DAYS,
+    ANALYSIS_MAX_PROMPT_TOKENS, ANALYSIS_MAP_CHUNK_TOKENS, ANALYSIS_MAP_MAX_TOKENS, ANALYSIS_MAX_CONCURRENCY,
+    ANALYSIS_RELEVANCE_TOP_K, ANALYSIS_RELEVANCE_SAMPLE, ANALYSIS_RELEVANCE_MIN_STATEMENTS,
+    ANALYSIS_SECTION_MAX_TOKENS, ANALYSIS_SUMMARY_MAX_TOKENS, CHAT_HISTORY_TOKEN_BUDGET, CHAT_MEMO_MAX_TOKENS,
+    CHAT_MEMO_MODEL,
+    SIMILARITY_TOP_K, ANALYSIS_COLLAPSE_DUPLICATES
+)
+from .text_processor import estimate_tokens
+from .relevance import select_relevant_statements
+from .duplicates import collapse_near_duplicates
+from ..utils.cache import DiskCache, corpus_fingerprint
+from ..utils.usage import usage_to_dict, summarize_usage
+from ..utils.rate_limiter import scheduler, estimate_request_tokens, PRIORITY_ANALYSIS, PRIORITY_INTERACTIVE
+from ..utils.llm_backend import get_backend
+from ..utils.tracing import tracer
+from ..utils.ledger import ledger
+from ..utils.statement_index import StatementIndex, statement_index
+from ..utils.similarity_index import similarity_index
 from datetime import datetime
 
-# Initialize Anthropic client
-client = anthropic.Anthropic()
+ANALYSIS_MODEL = "claude-3-5-sonnet-20241022"
+# Bump whenever the partial analysis prompt changes so cached partials are not reused
+ANALYSIS_PROMPT_VERSION = "1"
 
-def analyze_interviews(interviews: List[Interview], research_questions: List[str]) -> Dict:
-    """Analyze interviews and generate conclusions based on research questions."""
-    
-    # Prepare all statements for analysis
-    all_statements = []
-    for interview in interviews:
-        all_statements.extend([
-            f"{statement.text} (Betrouwbaarheid: {statement.confidence:.2f})"
-            for statement in interview.statements
-        ])
-    
-    try:
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=8192,
-            temperature=0.0,
-            system=[
-                {
-                    "type": "text",
-                    "text": """Je bent een expert in het analyseren van interview data en het trekken van diepgaande conclusies.
+partial_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'analysis'),
+    max_entries=SEGMENT_CACHE_MAX_ENTRIES,
+    max_mb=SEGMENT_CACHE_MAX_MB,
+    max_age_days=SEGMENT_CACHE_MAX_AGE_DAYS
+)
+
+# Static instructions come first and carry a cache marker; the statement corpus
+# follows as its own cached block, and only the research questions vary per call.
+ANALYSIS_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interview data en het trekken van diepgaande conclusies.
 Je analyseert grondig alle patronen, thema's en verbanden tussen de verschillende statements.
 Je onderbouwt al je conclusies met concrete voorbeelden en citaten uit de interviews.
 Je structureert je antwoorden zeer duidelijk met:
@@ -38,13 +50,9 @@ Je structureert je antwoorden zeer duidelijk met:
 - Nuances en kanttekeningen waar nodig
 - Aanbevelingen voor vervolgonderzoek
 
-Wees zo uitgebreid als nodig om de vragen goed te beantwoorden."""
-                }
-            ],
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""Analyseer de volgende interview statements en beantwoord de onderzoeksvragen.
+Wees zo uitgebreid als nodig om de vragen goed te beantwoorden.
+
+Analyseer de interview statements uit het bericht en beantwoord de onderzoeksvragen.
 Geef een zeer grondige analyse met:
 
 1. Samenvatting
@@ -63,133 +71,791 @@ Geef een zeer grondige analyse met:
 3. Overkoepelende conclusies
 - Synthese van alle bevindingen
 - Belangrijkste inzichten
-- Aanbevelingen voor vervolgonderzoek
+- Aanbevelingen voor vervolgonderzoek"""
 
-Onderzoeksvragen:
-{chr(10).join(f"- {q}" for q in research_questions)}
+# Map step of the map-reduce analysis: one part of the corpus against all research questions
+PARTIAL_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interview data.
+Je krijgt een deel van de interview statements (of van eerdere deelanalyses) en de onderzoeksvragen.
+Een latere stap combineert alle deelanalyses tot één eindrapport, schrijf daarom beknopt en feitelijk.
 
-Interview Statements:
-{chr(10).join(all_statements)}"""
-                }
-            ]
+Geef per onderzoeksvraag:
+- De relevante bevindingen en patronen in dit deel
+- Letterlijke citaten van de belangrijkste statements, met hun betrouwbaarheid
+- Hoeveel statements de bevinding ondersteunen en eventuele tegenstrijdigheden
+
+Schrijf 'Geen relevante statements' bij een vraag waarover dit deel niets zegt.
+Trek geen conclusies over de interviews die je niet hebt gezien."""
+
+# Reduce step: synthesise the partial analyses into the final report
+SYNTHESIS_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interview data en het trekken van diepgaande conclusies.
+Je krijgt deelanalyses die elk een deel van de interviews behandelen, met bevindingen en citaten per onderzoeksvraag.
+Combineer ze tot één samenhangende analyse: weeg bevindingen naar het aantal interviews en statements dat ze ondersteunt,
+benoem patronen die in meerdere deelanalyses terugkomen en verschillen tussen groepen geïnterviewden.
+Onderbouw je conclusies met de citaten uit de deelanalyses; verzin geen nieuwe citaten.
+
+Structureer je antwoord als volgt:
+
+1. Samenvatting
+- Korte overview van de belangrijkste bevindingen
+- Algemene patronen en thema's
+- Belangrijkste conclusies
+
+2. Per onderzoeksvraag:
+- Duidelijk antwoord op de vraag
+- Uitgebreide onderbouwing met relevante statements
+- Analyse van patronen en thema's
+- Concrete voorbeelden en citaten
+- Nuances en kanttekeningen
+- Deelconclusies
+
+3. Overkoepelende conclusies
+- Synthese van alle bevindingen
+- Belangrijkste inzichten
+- Aanbevelingen voor vervolgonderzoek"""
+
+# Per-question mode: one call per research question, then a short summary over the sections
+QUESTION_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interview data en het trekken van diepgaande conclusies.
+Je beantwoordt één onderzoeksvraag op basis van de interview statements uit het bericht.
+Je onderbouwt al je conclusies met concrete voorbeelden en citaten uit de interviews.
+
+Geef:
+- Een duidelijk antwoord op de vraag
+- Uitgebreide onderbouwing met relevante statements
+- Analyse van patronen en thema's
+- Concrete voorbeelden en citaten
+- Nuances en kanttekeningen
+- Een deelconclusie
+
+Je antwoord wordt een sectie van een groter rapport: herhaal de vraag niet als kop en gebruik ### voor subkopjes."""
+
+SUMMARY_SYSTEM_PROMPT = """Je bent een expert in het analyseren van interview data.
+Je krijgt de analyses per onderzoeksvraag van één onderzoek. Schrijf de openingssectie van het rapport:
+- Een korte samenvatting van de belangrijkste bevindingen (maximaal 5 zinnen)
+- Algemene patronen en thema's die over de vragen heen terugkomen
+- Overkoepelende conclusies en aanbevelingen voor vervolgonderzoek
+
+Wees beknopt, baseer je alleen op de analyses en gebruik ### voor subkopjes."""
+
+CHAT_SYSTEM_PROMPT = """Je bent een behulpzame assistent die ondersteuning biedt bij het analyseren van interviews.
+Je hebt toegang tot de onderzoeksvragen en de statements uit de interviews, die in het bericht worden meegegeven.
+
+Je taak is om de gebruiker te helpen met:
+1. Het beantwoorden van vragen over de analyse
+2. Het herformatteren van de analyse op verzoek
+3. Het verduidelijken van conclusies
+
+Belangrijke regels:
+- Baseer je conclusies ALLEEN op de gegeven statements
+- Wees duidelijk en professioneel
+- Als je een nieuwe versie van de analyse maakt, gebruik dan markdown formatting
+- Begin elke nieuwe versie van de analyse met de standaard metadata sectie
+
+Als je een nieuwe versie van de analyse maakt, begin dan met '# Interview Analyse Rapport'
+Als je alleen een vraag beantwoordt, geef dan een normaal antwoord."""
+
+def _format_statement(statement: Statement) -> str:
+    count = statement.metadata.get('evidence_count', 1)
+    if count > 1:
+        interviewees = len(statement.metadata.get('evidence_interviewees', []))
+        return f"{statement.text} (Betrouwbaarheid: {statement.confidence:.2f}; {count}x genoemd door {interviewees} geïnterviewde(n))"
+    return f"{statement.text} (Betrouwbaarheid: {statement.confidence:.2f})"
+
+def _selection_corpus(selection: Dict) -> List[str]:
+    """Statements grouped under the research question they were selected for, then the sample."""
+    lines = []
+    for question, statements in selection['per_question'].items():
+        lines.append(f"Relevant voor de vraag '{question}':")
+        lines.extend(_format_statement(s) for s in statements)
+        lines.append("")
+    if selection['sample']:
+        lines.append("Steekproef van de overige statements:")
+        lines.extend(_format_statement(s) for s in selection['sample'])
+    return lines
+
+def _prepare_corpus(
+    interviews: List[Interview],
+    research_questions: List[str],
+    relevance_top_k: Optional[int],
+    relevance_sample: int,
+    collapse_duplicates: bool = ANALYSIS_COLLAPSE_DUPLICATES
+) -> Dict:
+    """Statement lines for the analysis prompt, reduced to the relevant ones for large corpora.
+    
+    Near-duplicate statements are sent once, with how often they were made,
+    unless ``collapse_duplicates`` is False.
+    """
+    statements_total = sum(len(interview.statements) for interview in interviews)
+    duplicates_collapsed = 0
+    statement_indexes = None
+    if collapse_duplicates:
+        with tracer.span('collapse_duplicates', statements=statements_total) as span:
+            collapsed = collapse_near_duplicates(interviews)
+            span.set(kept=collapsed['statements_after'], groups=collapsed['groups'])
+        interviews = collapsed['interviews']
+        statement_indexes = collapsed['statement_indexes']
+        duplicates_collapsed = statements_total - collapsed['statements_after']
+    statements_unique = statements_total - duplicates_collapsed
+    
+    if not relevance_top_k or statements_unique < ANALYSIS_RELEVANCE_MIN_STATEMENTS:
+        return {
+            'selection': None,
+            'label': "Interview Statements",
+            'lines': [_format_statement(s) for interview in interviews for s in interview.statements],
+            'interviews': interviews,
+            'statements_analyzed': statements_unique,
+            'statements_total': statements_total,
+            'duplicates_collapsed': duplicates_collapsed
+        }
+    
+    with tracer.span('relevance', statements=statements_unique, questions=len(research_questions)) as span:
+        selection = select_relevant_statements(
+            interviews, research_questions, relevance_top_k, relevance_sample, statement_indexes=statement_indexes
         )
+        span.set(selected=selection['record']['selected'])
+    return {
+        'selection': selection,
+        'label': "Interview Statements per onderzoeksvraag",
+        'lines': _selection_corpus(selection),
+        'interviews': selection['interviews'],
+        'statements_analyzed': selection['record']['selected'],
+        'statements_total': statements_total,
+        'duplicates_collapsed': duplicates_collapsed
+    }
+
+def _analysis_request(system_prompt: str, corpus_label: str, corpus: List[str], research_questions: List[str], max_tokens: int) -> Dict:
+    """Messages API parameters with a cached system prompt and corpus block, followed by the questions."""
+    return dict(
+        model=ANALYSIS_MODEL,
+        max_tokens=max_tokens,
+        temperature=0.0,
+        system=[
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"""{corpus_label}:
+{chr(10).join(corpus)}""",
+                        "cache_control": {"type": "ephemeral"}
+                    },
+                    {
+                        "type": "text",
+                        "text": f"""Onderzoeksvragen:
+{chr(10).join(f"- {q}" for q in research_questions)}"""
+                    }
+                ]
+            }
+        ]
+    )
+
+def _call_analysis(stage: str, params: Dict, **details):
+    with tracer.span('llm_call', stage=stage, model=ANALYSIS_MODEL, **details) as span, \
+            ledger.track(stage, ANALYSIS_MODEL, **details) as call:
+        response = scheduler.create_message(get_backend(), params, PRIORITY_ANALYSIS)
+        span.set(stop_reason=response.stop_reason, **usage_to_dict(response.usage))
+        call.update(usage=usage_to_dict(response.usage), stop_reason=response.stop_reason)
+    if response.stop_reason == 'max_tokens':
+        tracer.warning('analysis_truncated', stage=stage, **details)
+    return response
+
+def _map_units(interviews: List[Interview], chunk_tokens: int) -> List[Dict]:
+    """One unit of statements per interview; interviews above ``chunk_tokens`` are split into chunks."""
+    units = []
+    for interview in interviews:
+        lines = [_format_statement(s) for s in interview.statements]
+        chunks, current, current_tokens = [], [], 0
+        for line in lines:
+            tokens = estimate_tokens(line)
+            if current and current_tokens + tokens > chunk_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        for i, chunk in enumerate(chunks):
+            label = interview.interviewee if len(chunks) == 1 else f"{interview.interviewee} (deel {i + 1}/{len(chunks)})"
+            units.append({'label': label, 'lines': chunk})
+    return units
+
+def _partial_analysis(
+    label: str,
+    lines: List[str],
+    research_questions: List[str],
+    use_cache: bool = True,
+    corpus_label: str = "Interview Statements"
+) -> Dict:
+    """Analyse one unit of statements (or earlier partial analyses), cached by its content."""
+    cache_key = DiskCache.make_key(ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION, corpus_label, research_questions, lines)
+    if use_cache:
+        cached = partial_cache.get(cache_key)
+        if cached is not None:
+            tracer.debug('partial_cache_hit', label=label)
+            return {**cached, 'label': label, 'usage': {}, 'cached': True}
+    
+    params = _analysis_request(PARTIAL_SYSTEM_PROMPT, corpus_label, lines, research_questions, ANALYSIS_MAP_MAX_TOKENS)
+    response = _call_analysis('analysis_map', params, part=label, statements=len(lines))
+    partial = {'text': response.content[0].text, 'statements': len(lines)}
+    if use_cache:
+        partial_cache.set(cache_key, partial)
+    return {**partial, 'label': label, 'usage': usage_to_dict(response.usage), 'cached': False}
+
+def _partial_blocks(partials: List[Dict]) -> List[str]:
+    return [
+        f"### Deelanalyse: {p['label']} ({p['statements']} statements)\n{p['text']}\n"
+        for p in partials
+    ]
+
+def _group_by_tokens(blocks: List[str], max_tokens: int) -> List[List[int]]:
+    groups, current, current_tokens = [], [], 0
+    for i, block in enumerate(blocks):
+        tokens = estimate_tokens(block)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def _run_partials(
+    jobs: List[Dict],
+    research_questions: List[str],
+    max_workers: int,
+    use_cache: bool,
+    corpus_label: str = "Interview Statements"
+) -> List[Dict]:
+    workers = max(1, min(max_workers, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            tracer.wrap(lambda job: _partial_analysis(job['label'], job['lines'], research_questions, use_cache, corpus_label)),
+            jobs
+        ))
+
+def _map_reduce_analysis(
+    interviews: List[Interview],
+    research_questions: List[str],
+    max_prompt_tokens: int,
+    chunk_tokens: int,
+    max_workers: int,
+    use_cache: bool
+):
+    """Partial analyses per interview in parallel, combined until they fit one synthesis prompt."""
+    usage_log = []
+    with tracer.span('analysis_map', interviews=len(interviews)) as span:
+        partials = _run_partials(_map_units(interviews, chunk_tokens), research_questions, max_workers, use_cache)
+        span.set(partials=len(partials), cached=sum(p['cached'] for p in partials))
+    usage_log.extend(p['usage'] for p in partials if p['usage'])
+    
+    # Too many partials for one synthesis prompt: combine groups of them first
+    level = 1
+    while len(partials) > 1 and estimate_tokens(''.join(_partial_blocks(partials))) > max_prompt_tokens:
+        blocks = _partial_blocks(partials)
+        groups = _group_by_tokens(blocks, max_prompt_tokens)
+        if len(groups) == len(partials):
+            break  # every partial alone fills the budget, combining cannot shrink the prompt
+        jobs = [
+            {'label': f"Combinatie {level}.{n + 1}", 'lines': [blocks[i] for i in group]}
+            for n, group in enumerate(groups)
+        ]
+        combined = _run_partials(jobs, research_questions, max_workers, use_cache, "Deelanalyses")
+        for partial, group in zip(combined, groups):
+            partial['statements'] = sum(partials[i]['statements'] for i in group)
+        usage_log.extend(p['usage'] for p in combined if p['usage'])
+        partials = combined
+        level += 1
+    
+    params = _analysis_request(SYNTHESIS_SYSTEM_PROMPT, "Deelanalyses", _partial_blocks(partials), research_questions, 8192)
+    response = _call_analysis('analysis_reduce', params, partials=len(partials))
+    usage_log.append(usage_to_dict(response.usage))
+    return response, usage_log, len(partials)
+
+def analyze_interviews(
+    interviews: List[Interview],
+    research_questions: List[str],
+    mode: str = 'auto',
+    max_prompt_tokens: int = ANALYSIS_MAX_PROMPT_TOKENS,
+    chunk_tokens: int = ANALYSIS_MAP_CHUNK_TOKENS,
+    max_workers: int = ANALYSIS_MAX_CONCURRENCY,
+    use_cache: bool = True,
+    relevance_top_k: Optional[int] = ANALYSIS_RELEVANCE_TOP_K,
+    relevance_sample: int = ANALYSIS_RELEVANCE_SAMPLE
+) -> Dict:
+    """Analyze interviews and generate conclusions based on research questions.
+    
+    ``mode`` is ``'single'`` (all statements in one prompt), ``'map_reduce'``
+    (partial analyses per interview, then a synthesis) or ``'auto'``, which
+    uses map-reduce when the single prompt would exceed ``max_prompt_tokens``.
+    
+    Corpora of at least ANALYSIS_RELEVANCE_MIN_STATEMENTS statements are first
+    reduced to the ``relevance_top_k`` best matching statements per question
+    plus a stratified sample of ``relevance_sample`` others; the selection is
+    returned as ``relevance_selection``. Pass ``relevance_top_k=None`` to send
+    every statement. Near-duplicate statements are collapsed before that (see
+    ANALYSIS_COLLAPSE_DUPLICATES); ``duplicates_collapsed`` counts the copies
+    that were left out.
+    """
+    
+    try:
+        corpus = _prepare_corpus(interviews, research_questions, relevance_top_k, relevance_sample)
+        selection = corpus['selection']
+        all_statements = corpus['lines']
+        statements_sent = corpus['statements_analyzed']
+        statements_total = corpus['statements_total']
+        
+        params = _analysis_request(ANALYSIS_SYSTEM_PROMPT, corpus['label'], all_statements, research_questions, 8192)
+        prompt_tokens = estimate_request_tokens(params)
+        if mode == 'auto':
+            mode = 'map_reduce' if prompt_tokens > max_prompt_tokens else 'single'
+        
+        with tracer.span('analysis', mode=mode, prompt_tokens=prompt_tokens, interviews=len(interviews)):
+            if mode == 'map_reduce':
+                response, usage_log, partials = _map_reduce_analysis(
+                    corpus['interviews'], research_questions, max_prompt_tokens, chunk_tokens, max_workers, use_cache
+                )
+                usage = summarize_usage(usage_log)
+            else:
+                response = _call_analysis('analysis', params, statements=statements_sent, questions=len(research_questions))
+                usage = usage_to_dict(response.usage)
+                partials = None
         
         # Process and structure the response
         analysis_result = {
             'raw_response': response.content[0].text if isinstance(response.content, list) else response.content,
             'questions': research_questions,
             'timestamp': datetime.now().isoformat(),
-            'statements_analyzed': len(all_statements),
+            'statements_analyzed': statements_sent,
+            'statements_total': statements_total,
+            'duplicates_collapsed': corpus['duplicates_collapsed'],
             'interviews_analyzed': len(interviews),
-            'model_used': "claude-3-5-sonnet-20241022"
+            'model_used': ANALYSIS_MODEL,
+            'mode': mode,
+            'estimated_prompt_tokens': prompt_tokens,
+            'partial_analyses': partials,
+            'stop_reason': response.stop_reason,
+            'relevance_selection': selection['record'] if selection else None,
+            'usage': usage
         }
         
         return analysis_result
     
     except Exception as e:
-        print(f"Error in analysis: {str(e)}")
+        tracer.error('analysis_failed', error=f"{type(e).__name__}: {e}")
         return None
 
-def search_analysis_statements(interviews: List[Interview], search_query: str) -> List[Statement]:
-    """Search through all statements marked for analysis."""
-    matching_statements = []
-    
-    for interview in interviews:
-        for statement in interview.statements:
-            if search_query.lower() in statement.text.lower():
-                matching_statements.append(statement)
-    
-    return matching_statements 
+PENDING_SECTION = "_Wordt geanalyseerd..._"
 
-def chat_with_analysis(
-    prompt: str,
+def assemble_sections(research_questions: List[str], sections: Dict[int, str], summary: Optional[str] = None) -> str:
+    """Analysis markdown from the summary and the sections per question; missing parts show as pending."""
+    parts = [f"## Samenvatting\n{summary if summary is not None else PENDING_SECTION}"]
+    for i, question in enumerate(research_questions):
+        parts.append(f"## {question}\n{sections.get(i, PENDING_SECTION)}")
+    return "\n\n".join(parts)
+
+def format_analysis_report(analysis_result: Dict) -> str:
+    """The ``# Interview Analyse Rapport`` markdown that is stored as an analysis version."""
+    return f"""# Interview Analyse Rapport
+Datum: {datetime.now().strftime('%d-%m-%Y %H:%M')}
+Aantal interviews: {analysis_result['interviews_analyzed']}
+Aantal statements: {analysis_result['statements_analyzed']}
+
+## Onderzoeksvragen
+{chr(10).join(f"- {q}" for q in analysis_result['questions'])}
+
+## Analyse
+{analysis_result['raw_response']}
+"""
+
+def _question_lines(corpus: Dict, question: str) -> List[str]:
+    selection = corpus['selection']
+    if selection is None:
+        return corpus['lines']
+    return [_format_statement(s) for s in selection['per_question'][question] + selection['sample']]
+
+def _analyze_question(index: int, question: str, corpus: Dict) -> Dict:
+    lines = _question_lines(corpus, question)
+    params = _analysis_request(QUESTION_SYSTEM_PROMPT, "Interview Statements", lines, [question], ANALYSIS_SECTION_MAX_TOKENS)
+    response = _call_analysis('analysis_question', params, question=index + 1, statements=len(lines))
+    return {
+        'index': index,
+        'question': question,
+        'text': response.content[0].text,
+        'stop_reason': response.stop_reason,
+        'usage': usage_to_dict(response.usage)
+    }
+
+def stream_analysis_by_question(
     interviews: List[Interview],
     research_questions: List[str],
-    chat_history: List[Dict]
-) -> Dict:
-    """Chat with AI about the analysis, allowing for clarifications and reformatting."""
-    try:
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        
-        # Prepare context
-        statements_text = "\n".join([
-            f"- {s.text} (Type: {s.type.value}, Confidence: {s.confidence:.2f})"
-            for interview in interviews
-            for s in interview.statements
-        ])
-        
-        questions_text = "\n".join([f"- {q}" for q in research_questions])
-        
-        # Prepare chat history
-        history_text = "\n".join([
-            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-            for msg in chat_history[-5:]  # Only include last 5 messages for context
-        ])
+    max_workers: int = ANALYSIS_MAX_CONCURRENCY,
+    relevance_top_k: Optional[int] = ANALYSIS_RELEVANCE_TOP_K,
+    relevance_sample: int = ANALYSIS_RELEVANCE_SAMPLE,
+    result: Optional[Dict] = None
+) -> Iterator[Dict]:
+    """Answer every research question in its own concurrent call and yield each section when it completes.
+    
+    Yields dicts with ``index``, ``question`` and ``text``; the short summary
+    written from the finished sections is yielded last with ``index`` None.
+    A failed question yields a section noting the failure. When done,
+    ``result`` is filled like the return value of ``analyze_interviews``, with
+    the sections assembled into ``raw_response``.
+    """
+    result = result if result is not None else {}
+    corpus = _prepare_corpus(interviews, research_questions, relevance_top_k, relevance_sample)
+    sections: Dict[int, str] = {}
+    usage_log = []
+    truncated = False
+    
+    with tracer.span('analysis', mode='per_question', questions=len(research_questions), interviews=len(interviews)) as span:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(research_questions)))) as executor:
+            futures = {
+                executor.submit(tracer.wrap(_analyze_question), i, question, corpus): i
+                for i, question in enumerate(research_questions)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    section = future.result()
+                    usage_log.append(section['usage'])
+                    truncated = truncated or section['stop_reason'] == 'max_tokens'
+                except Exception as e:
+                    tracer.error('analysis_failed', question=i + 1, error=f"{type(e).__name__}: {e}")
+                    section = {'index': i, 'question': research_questions[i], 'text': "_De analyse van deze vraag is mislukt._"}
+                sections[i] = section['text']
+                yield {'index': i, 'question': section['question'], 'text': section['text']}
         
-        # Create system message
-        system_message = """Je bent een behulpzame assistent die ondersteuning biedt bij het analyseren van interviews.
-Je hebt toegang tot de volgende informatie:
+        try:
+            blocks = [f"## {q}\n{sections[i]}" for i, q in enumerate(research_questions)]
+            params = _analysis_request(SUMMARY_SYSTEM_PROMPT, "Analyses per onderzoeksvraag", blocks, research_questions, ANALYSIS_SUMMARY_MAX_TOKENS)
+            response = _call_analysis('analysis_summary', params, questions=len(research_questions))
+            usage_log.append(usage_to_dict(response.usage))
+            summary = response.content[0].text
+        except Exception as e:
+            tracer.error('analysis_failed', stage='summary', error=f"{type(e).__name__}: {e}")
+            summary = "_De samenvatting is mislukt._"
+        yield {'index': None, 'question': None, 'text': summary}
+        span.set(calls=len(usage_log))
+    
+    result.update({
+        'raw_response': assemble_sections(research_questions, sections, summary),
+        'questions': research_questions,
+        'timestamp': datetime.now().isoformat(),
+        'statements_analyzed': corpus['statements_analyzed'],
+        'statements_total': corpus['statements_total'],
+        'duplicates_collapsed': corpus['duplicates_collapsed'],
+        'interviews_analyzed': len(interviews),
+        'model_used': ANALYSIS_MODEL,
+        'mode': 'per_question',
+        'partial_analyses': None,
+        'stop_reason': 'max_tokens' if truncated else 'end_turn',
+        'relevance_selection': corpus['selection']['record'] if corpus['selection'] else None,
+        'usage': summarize_usage(usage_log)
+    })
 
-ONDERZOEKSVRAGEN:
-{}
+def _search_hits(interviews: List[Interview], search_query: str, **filters) -> List[tuple]:
+    """Search hits within ``interviews`` as (hit, statement) pairs, best first.
 
-STATEMENTS UIT INTERVIEWS:
-{}
+    Saved interviews are searched in the persistent statement index. Once an
+    unsaved interview is involved, all of them are indexed in a transient
+    in-memory index instead, so scores stay comparable. Each hit's
+    ``filename`` is that of its interview, None for unsaved ones.
+    """
+    if all(i.metadata.get('filename') for i in interviews):
+        hits = statement_index.search(search_query, filenames=[i.metadata['filename'] for i in interviews], **filters)
+        by_key = {i.metadata['filename']: i for i in interviews}
+    else:
+        index = StatementIndex(directory=None)
+        by_key = {}
+        for position, interview in enumerate(interviews):
+            key = interview.metadata.get('filename') or f"unsaved-{position}"
+            index.update_interview(key, interview.interviewee, interview.statements)
+            by_key[key] = interview
+        hits = index.search(search_query, **filters)
 
-RECENTE CHAT GESCHIEDENIS:
-{}
+    matches = []
+    for hit in hits:
+        interview = by_key[hit['filename']]
+        # The index follows the stored files; skip statements edited since the interview was loaded
+        if hit['statement'] < len(interview.statements) and interview.statements[hit['statement']].text == hit['text']:
+            hit['filename'] = interview.metadata.get('filename')
+            matches.append((hit, interview.statements[hit['statement']]))
+    return matches
 
-Je taak is om de gebruiker te helpen met:
-1. Het beantwoorden van vragen over de analyse
-2. Het herformatteren van de analyse op verzoek
-3. Het verduidelijken van conclusies
+def search_statements(
+    interviews: List[Interview],
+    search_query: str,
+    types: Optional[List[str]] = None,
+    interviewees: Optional[List[str]] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """Ranked search hits within ``interviews``, see ``StatementIndex.search`` for the query syntax.
 
-Belangrijke regels:
-- Baseer je conclusies ALLEEN op de gegeven statements
-- Wees duidelijk en professioneel
-- Als je een nieuwe versie van de analyse maakt, gebruik dan markdown formatting
-- Begin elke nieuwe versie van de analyse met de standaard metadata sectie
+    Hits on interviews that were not saved yet have ``filename`` None.
+    """
+    matches = _search_hits(
+        interviews,
+        search_query,
+        types=types,
+        interviewees=interviewees,
+        min_confidence=min_confidence,
+        max_confidence=max_confidence,
+        limit=limit
+    )
+    return [hit for hit, _ in matches]
 
-Als je een nieuwe versie van de analyse maakt, begin dan met '# Interview Analyse Rapport'
-Als je alleen een vraag beantwoordt, geef dan een normaal antwoord.""".format(
-            questions_text,
-            statements_text,
-            history_text
+def search_analysis_statements(interviews: List[Interview], search_query: str, **filters) -> List[Statement]:
+    """Search through all statements marked for analysis, best match first."""
+    return [statement for _, statement in _search_hits(interviews, search_query, **filters)]
+
+def find_similar_statements(
+    interviews: List[Interview],
+    text: str,
+    top_k: int = SIMILARITY_TOP_K,
+    exclude: Optional[tuple] = None
+) -> List[Dict]:
+    """Statements within ``interviews`` that say something like ``text``, most similar first.
+
+    ``exclude`` is the (filename, statement index) of the statement itself.
+    """
+    return similarity_index.similar(
+        text,
+        top_k=top_k,
+        filenames=[i.metadata['filename'] for i in interviews if i.metadata.get('filename')],
+        exclude=tuple(exclude) if exclude else None
+    )
+
+# Compacts chat turns that no longer fit the history budget
+CHAT_MEMO_SYSTEM_PROMPT = """Je vat een gesprek tussen een onderzoeker en een AI-assistent over een interviewanalyse samen tot een kort memo.
+Neem op: de vragen en verzoeken van de onderzoeker, de antwoorden en conclusies van de assistent,
+gemaakte afspraken over vorm en stijl, en welke analyseversies zijn gemaakt.
+Schrijf hooguit 10 korte opsommingstekens in het Nederlands, zonder inleiding."""
+
+REPORT_HEADER = "# Interview Analyse Rapport"
+
+def compact_chat_message(message: Dict) -> str:
+    """Message text for the prompt, with report bodies replaced by a reference to their saved version."""
+    content = message['content']
+    if REPORT_HEADER not in content:
+        return content
+    version = message.get('analysis_version')
+    if version:
+        return f"[Analyserapport opgeslagen als versie {version}; de volledige tekst staat in de versiegeschiedenis]"
+    return f"[Analyserapport van {len(content)} tekens weggelaten]"
+
+class ChatSession:
+    """Chat about the analysis with the corpus context built once per set of ready interviews.
+    
+    The research questions and statements form a cached prompt prefix that is
+    only rebuilt when the interviews or questions change, so follow-up turns
+    read it from the prompt cache. Replies are streamed token by token.
+    
+    The chat history is sent as real conversation turns, newest first, up to
+    ``history_budget`` estimated tokens. Older turns are folded into a short
+    memo once and the memo is sent in their place.
+    """
+    
+    def __init__(self, history_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        self.history_budget = history_budget
+        self.fingerprint = None
+        self.context_text = None
+        self.statements = 0
+        self.rebuilds = 0
+        self.memo = None
+        self.memo_upto = 0  # number of history messages folded into the memo
+        self.last_reply: Optional[Dict] = None
+    
+    def prepare(self, interviews: List[Interview], research_questions: List[str]) -> bool:
+        """Build the context prefix if the corpus changed; returns True when it was rebuilt."""
+        fingerprint = corpus_fingerprint(interviews, research_questions)
+        if fingerprint == self.fingerprint:
+            return False
+        
+        with tracer.span('chat_context', interviews=len(interviews)) as span:
+            statements_text = "\n".join([
+                f"- {s.text} (Type: {s.type.value}, Confidence: {s.confidence:.2f})"
+                for interview in interviews
+                for s in interview.statements
+            ])
+            questions_text = "\n".join([f"- {q}" for q in research_questions])
+            self.context_text = f"""ONDERZOEKSVRAGEN:
+{questions_text}
+
+STATEMENTS UIT INTERVIEWS:
+{statements_text}"""
+            self.statements = sum(len(interview.statements) for interview in interviews)
+            span.set(statements=self.statements, chars=len(self.context_text))
+        self.fingerprint = fingerprint
+        self.rebuilds += 1
+        return True
+    
+    def _history_start(self, chat_history: List[Dict]) -> int:
+        """Index of the oldest message that is sent verbatim; it is always a user message."""
+        start = len(chat_history)
+        tokens = 0
+        for i in range(len(chat_history) - 1, self.memo_upto - 1, -1):
+            tokens += estimate_tokens(compact_chat_message(chat_history[i]))
+            if tokens > self.history_budget:
+                break
+            if chat_history[i]['role'] == 'user':
+                start = i
+        return start
+    
+    def _update_memo(self, messages: List[Dict]):
+        """Fold ``messages`` (and the previous memo) into a new memo."""
+        transcript = "\n".join(
+            f"{'Onderzoeker' if msg['role'] == 'user' else 'Assistent'}: {compact_chat_message(msg)}"
+            for msg in messages
+        )
+        previous = f"EERDER MEMO:\n{self.memo}\n\n" if self.memo else ""
+        params = dict(
+            model=CHAT_MEMO_MODEL,
+            max_tokens=CHAT_MEMO_MAX_TOKENS,
+            temperature=0.0,
+            system=CHAT_MEMO_SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": f"{previous}GESPREK:\n{transcript}"}]
         )
+        try:
+            with tracer.span('llm_call', stage='chat_memo', model=CHAT_MEMO_MODEL, messages=len(messages)) as span, \
+                    ledger.track('chat_memo', CHAT_MEMO_MODEL, messages=len(messages)) as call:
+                response = scheduler.create_message(get_backend(), params, PRIORITY_INTERACTIVE)
+                span.set(stop_reason=response.stop_reason, **usage_to_dict(response.usage))
+                call.update(usage=usage_to_dict(response.usage), stop_reason=response.stop_reason)
+            self.memo = response.content[0].text
+        except Exception as e:
+            # Without a memo the turns would silently disappear, keep their openings instead
+            tracer.warning('chat_memo_failed', error=f"{type(e).__name__}: {e}")
+            lines = [line[:200] for line in transcript.split("\n") if line.strip()]
+            self.memo = "\n".join(([self.memo] if self.memo else []) + lines)
+    
+    def _messages(self, prompt: str, chat_history: List[Dict]) -> List[Dict]:
+        if len(chat_history) < self.memo_upto:
+            # The history was cleared or replaced
+            self.memo = None
+            self.memo_upto = 0
         
-        # Send message to AI
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+        start = self._history_start(chat_history)
+        if start > self.memo_upto:
+            self._update_memo(chat_history[self.memo_upto:start])
+            self.memo_upto = start
+        
+        # Consecutive messages of the same role are merged, the API needs alternating turns
+        turns = []
+        for msg in chat_history[start:] + [{'role': 'user', 'content': prompt}]:
+            text = compact_chat_message(msg)
+            if turns and turns[-1]['role'] == msg['role']:
+                turns[-1]['content'][0]['text'] += f"\n\n{text}"
+            else:
+                turns.append({'role': msg['role'], 'content': [{'type': 'text', 'text': text}]})
+        
+        # The previous reply closes the part that is identical on the next turn
+        if len(turns) > 1:
+            turns[-2]['content'][-1]['cache_control'] = {"type": "ephemeral"}
+        
+        # The research questions and statements form a cached prefix in the first user turn
+        prefix = [{"type": "text", "text": self.context_text, "cache_control": {"type": "ephemeral"}}]
+        if self.memo:
+            prefix.append({"type": "text", "text": f"SAMENVATTING VAN HET EERDERE GESPREK:\n{self.memo}"})
+        turns[0]['content'] = prefix + turns[0]['content']
+        return turns
+    
+    def _request(self, prompt: str, chat_history: List[Dict]) -> Dict:
+        return dict(
+            model=ANALYSIS_MODEL,
             max_tokens=8192,
             temperature=0.1,
-            system=system_message,
-            messages=[{"role": "user", "content": prompt}]
+            system=[
+                {
+                    "type": "text",
+                    "text": CHAT_SYSTEM_PROMPT,
+                    "cache_control": {"type": "ephemeral"}
+                }
+            ],
+            messages=self._messages(prompt, chat_history)
         )
+    
+    def stream_reply(
+        self,
+        prompt: str,
+        interviews: List[Interview],
+        research_questions: List[str],
+        chat_history: List[Dict]
+    ) -> Iterator[str]:
+        """Yield the reply as it is generated; afterwards ``last_reply`` holds the result.
         
-        # Parse response
-        try:
-            # Extract text from response content
-            if isinstance(response.content, list):
-                response_text = response.content[0].text
-            else:
-                response_text = response.content
-            
-            # Check if response contains a new analysis version
-            if "# Interview Analyse Rapport" in response_text:
-                return {
-                    'message': "Ik heb een nieuwe versie van de analyse gemaakt op basis van je verzoek.",
-                    'new_analysis': response_text
-                }
-            else:
-                return {
-                    'message': response_text
-                }
-        except Exception as e:
-            return {
-                'message': f"Er is een fout opgetreden bij het verwerken van het antwoord: {str(e)}"
+        ``chat_history`` holds the earlier messages, without ``prompt``;
+        ``last_reply`` has the same keys as the result of ``chat_with_analysis``.
+        """
+        self.last_reply = None
+        self.prepare(interviews, research_questions)
+        params = self._request(prompt, chat_history)
+        
+        chunks = []
+        with tracer.span('llm_call', stage='chat', model=ANALYSIS_MODEL, history=len(chat_history), stream=True) as span, \
+                ledger.track('chat', ANALYSIS_MODEL, stream=True) as call:
+            start = time.perf_counter()
+            stream, reserved_output_tokens = scheduler.open_stream(get_backend(), params, PRIORITY_INTERACTIVE)
+            final_message = None
+            try:
+                for chunk in stream.text_stream:
+                    if not chunks:
+                        span.set(time_to_first_token_ms=(time.perf_counter() - start) * 1000)
+                        call['time_to_first_token'] = time.perf_counter() - start
+                    chunks.append(chunk)
+                    yield chunk
+                final_message = stream.get_final_message()
+            finally:
+                stream.close()
+                # Also when the stream failed or the reader stopped iterating, so no reservation is left behind
+                scheduler.reconcile(reserved_output_tokens, final_message.usage if final_message is not None else None)
+            usage = usage_to_dict(final_message.usage)
+            span.set(stop_reason=final_message.stop_reason, **usage)
+            call.update(usage=usage, stop_reason=final_message.stop_reason)
+        
+        response_text = ''.join(chunks)
+        # Check if response contains a new analysis version
+        if REPORT_HEADER in response_text:
+            self.last_reply = {
+                'message': "Ik heb een nieuwe versie van de analyse gemaakt op basis van je verzoek.",
+                'new_analysis': response_text,
+                'usage': usage
+            }
+        else:
+            self.last_reply = {
+                'message': response_text,
+                'usage': usage
             }
+
+def chat_with_analysis(
+    prompt: str,
+    interviews: List[Interview],
+    research_questions: List[str],
+    chat_history: List[Dict],
+    session: Optional[ChatSession] = None
+) -> Dict:
+    """Chat with AI about the analysis, allowing for clarifications and reformatting.
     
+    ``chat_history`` holds the earlier messages (``role``, ``content`` and
+    optionally the ``analysis_version`` a reply created). Pass a ``session``
+    to reuse its context and memo between turns; use
+    ``ChatSession.stream_reply`` directly to show the reply while it is written.
+    """
+    session = session or ChatSession()
+    try:
+        for _ in session.stream_reply(prompt, interviews, research_questions, chat_history):
+            pass
+        return session.last_reply
     except Exception as e:
+        tracer.error('chat_failed', error=f"{type(e).__name__}: {e}")
         return {
             'message': f"Er is een fout opgetreden: {str(e)}"
-        } 
\ No newline at end of file
+        }
@@ -0,0 +1,209 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Dict, Tuple, Optional
+from ..models import Interview, Statement
+from ..config import BATCH_DIR, BATCH_POLL_INTERVAL
+from ..utils.storage import save_interview, generate_interview_filename, statement_to_dict, statement_from_dict
+from ..utils.usage import usage_to_dict, summarize_usage
+from ..utils.llm_backend import get_backend
+from ..utils.tracing import tracer
+from ..utils.ledger import ledger
+from .ai_processor import (
+    EXTRACTION_MODEL, _extraction_request, _segment_cache_key, parse_statements, deduplicate_statements, segment_cache
+)
+from .text_processor import plan_segments
+
+def _default_batches():
+    return get_backend().batches
+
+def _manifest_path(batch_id: str) -> str:
+    return os.path.join(BATCH_DIR, f"{batch_id}.json")
+
+def submit_batch(transcripts: List[Tuple[str, str]], batches=None, use_cache: bool = True) -> Dict:
+    """Build one Message Batches job from all segments of many interviews.
+
+    ``transcripts`` is a list of (interviewee, text) pairs. Segments already in
+    the segment cache are not sent again. A manifest mapping every request back
+    to its interview and segment is stored in BATCH_DIR and returned.
+    """
+    batches = batches or _default_batches()
+    manifest = {
+        'batch_id': None,
+        'created_at': datetime.now().isoformat(),
+        'interviews': [],
+        'cached': {}
+    }
+    requests = []
+
+    for interview_index, (interviewee, text) in enumerate(transcripts):
+        segments, segment_map = plan_segments(text)
+        manifest['interviews'].append({
+            'interviewee': interviewee,
+            'raw_text': text,
+            'segments': segments,
+            'segment_map': segment_map
+        })
+        for segment_index, segment in enumerate(segments):
+            custom_id = f"i{interview_index}-s{segment_index}"
+            if use_cache:
+                cached = segment_cache.get(_segment_cache_key(segment, interviewee))
+                if cached is not None:
+                    manifest['cached'][custom_id] = cached
+                    continue
+            requests.append({
+                'custom_id': custom_id,
+                'params': _extraction_request(segment, interviewee)
+            })
+
+    tracer.info('batch_submit', interviews=len(transcripts), requests=len(requests), cached_segments=len(manifest['cached']))
+
+    if requests:
+        batch = batches.create(requests=requests)
+        manifest['batch_id'] = batch.id
+    else:
+        manifest['batch_id'] = f"cached_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+
+    with open(_manifest_path(manifest['batch_id']), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
+
+def load_batch_manifest(batch_id: str) -> Dict:
+    """Load the manifest of a previously submitted batch."""
+    with open(_manifest_path(batch_id), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def wait_for_batch(batch_id: str, batches=None, poll_interval: float = BATCH_POLL_INTERVAL, timeout: Optional[float] = None):
+    """Poll a batch until it has ended and return its final status."""
+    batches = batches or _default_batches()
+    start = time.monotonic()
+    while True:
+        batch = batches.retrieve(batch_id)
+        counts = batch.request_counts
+        tracer.info(
+            'batch_status', batch_id=batch_id, status=batch.processing_status,
+            succeeded=counts.succeeded, errored=counts.errored, processing=counts.processing
+        )
+        if batch.processing_status == 'ended':
+            return batch
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+
+def collect_batch_results(manifest: Dict, batches=None, save: bool = True, use_cache: bool = True) -> List[Interview]:
+    """Map the results of an ended batch back to Interview objects.
+
+    Statements are added in segment order and de-duplicated across segment
+    overlaps. With ``use_cache`` successful segments are written to the
+    segment cache. Failed segments are listed in ``metadata['failed_segments']``
+    and not resubmitted; reprocess_interview_with_ai extracts them again.
+    With ``save`` the interviews are persisted via save_interview.
+    """
+    results: Dict[str, Dict] = {}
+    if not manifest['batch_id'].startswith('cached_'):
+        batches = batches or _default_batches()
+        for entry in batches.results(manifest['batch_id']):
+            results[entry.custom_id] = entry.result
+
+    interviews = []
+    for interview_index, item in enumerate(manifest['interviews']):
+        interviewee = item['interviewee']
+        filename = generate_interview_filename(interviewee)
+        segment_statements: List[List[Statement]] = [[] for _ in item['segments']]
+        failed_segments = []
+        usage = []
+
+        for segment_index, segment in enumerate(item['segments']):
+            custom_id = f"i{interview_index}-s{segment_index}"
+            tag = {'segment_hash': item['segment_map'][segment_index]['hash']}
+            if custom_id in manifest['cached']:
+                for data in manifest['cached'][custom_id]:
+                    statement = statement_from_dict(data)
+                    statement.metadata = {**statement.metadata, **tag}
+                    segment_statements[segment_index].append(statement)
+                continue
+
+            result = results.get(custom_id)
+            if result is None or result.type != 'succeeded':
+                tracer.error('segment_failed', interviewee=interviewee, segment=segment_index, error=result.type if result else 'missing')
+                ledger.record(
+                    'extraction', EXTRACTION_MODEL, {}, batch=True, interview=filename, interviewee=interviewee,
+                    batch_id=manifest['batch_id'], error=result.type if result else 'missing'
+                )
+                failed_segments.append(segment_index)
+                continue
+
+            parsed = parse_statements(result.message.content[0].text)
+            if use_cache:
+                segment_cache.set(_segment_cache_key(segment, interviewee), [statement_to_dict(s) for s in parsed])
+            for statement in parsed:
+                statement.metadata = {**statement.metadata, **tag}
+            segment_statements[segment_index] = parsed
+            usage.append(dict(segment=segment_index, **usage_to_dict(result.message.usage)))
+            ledger.record(
+                'extraction', EXTRACTION_MODEL, result.message.usage, stop_reason=result.message.stop_reason,
+                batch=True, interview=filename, interviewee=interviewee, batch_id=manifest['batch_id']
+            )
+
+        interview = Interview(
+            interviewee=interviewee,
+            date=None,
+            raw_text=item['raw_text'],
+            statements=deduplicate_statements(segment_statements, item['segment_map']),
+            metadata={
+                'filename': filename,
+                'ready_for_analysis': False,
+                'created_at': datetime.now().isoformat(),
+                'batch_id': manifest['batch_id'],
+                'segment_map': item['segment_map'],
+                'llm_usage': usage,
+                'llm_usage_summary': summarize_usage(usage)
+            }
+        )
+        if failed_segments:
+            interview.metadata['failed_segments'] = failed_segments
+
+        if save and not save_interview(interview):
+            tracer.error('batch_save_failed', interviewee=interviewee)
+        interviews.append(interview)
+
+    return interviews
+
+def ingest_transcripts(
+    transcripts: List[Tuple[str, str]],
+    batches=None,
+    poll_interval: float = BATCH_POLL_INTERVAL,
+    timeout: Optional[float] = None,
+    save: bool = True,
+    use_cache: bool = True
+) -> List[Interview]:
+    """Submit, poll and collect a batch for many transcripts in one go."""
+    manifest = submit_batch(transcripts, batches, use_cache)
+    if not manifest['batch_id'].startswith('cached_'):
+        wait_for_batch(manifest['batch_id'], batches, poll_interval, timeout)
+    return collect_batch_results(manifest, batches, save, use_cache)
+
+if __name__ == "__main__":
+    import argparse
+    from ..utils.file_handlers import read_file_content
+    from ..utils.local_batches import LocalBatches
+
+    parser = argparse.ArgumentParser(description="Bulk ingest interview transcripts via the Message Batches API")
+    parser.add_argument("paths", nargs="+", help="transcript files; the file name is used as interviewee name")
+    parser.add_argument("--local", action="store_true", help="use the local stand-in instead of the API")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the segment cache")
+    args = parser.parse_args()
+
+    transcripts = [
+        (os.path.splitext(os.path.basename(path))[0], read_file_content(path))
+        for path in args.paths
+    ]
+    batches = LocalBatches() if args.local else None
+    poll_interval = 0.1 if args.local else args.poll_interval
+    for interview in ingest_transcripts(transcripts, batches, poll_interval, use_cache=not args.no_cache):
+        print(f"✓ {interview.metadata['filename']}: {len(interview.statements)} statements")
+        if interview.metadata.get('failed_segments'):
+            print(f"  ✗ failed segments: {interview.metadata['failed_segments']}")
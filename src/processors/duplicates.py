@@ -0,0 +1,218 @@
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import replace
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from ..config import (
+    DUPLICATE_NUM_PERM, DUPLICATE_BANDS, DUPLICATE_STATEMENT_THRESHOLD, DUPLICATE_INTERVIEW_THRESHOLD
+)
+from ..models import Interview
+from .text_processor import normalize_dutch
+
+_NON_ALPHANUMERIC = re.compile(r'[^a-z0-9]+')
+_HASH_CHUNK = 1 << 15  # shingles hashed at once; bounds the (shingles x permutations) array
+
+# Multiply-shift hash functions, one per MinHash value, plus a mix to turn a band into one key
+_rng = np.random.default_rng(0)
+_MULTIPLIERS = _rng.integers(0, 2 ** 63, DUPLICATE_NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, DUPLICATE_NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(0, 2 ** 63, DUPLICATE_NUM_PERM // DUPLICATE_BANDS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def _normalize(text: str) -> str:
+    return _NON_ALPHANUMERIC.sub(' ', normalize_dutch(text)).strip()
+
+
+def char_shingles(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Character 4-grams of every text as integer codes, with the index of the text each came from.
+
+    Texts are lowercased, stripped of accents and punctuation, and the four
+    bytes of a 4-gram are its code, so no hashing is needed.
+    """
+    encoded = [_normalize(text).encode('ascii', 'ignore') for text in texts]
+    buffer = np.frombuffer(b'\n'.join(encoded) + b'\n', dtype=np.uint8).astype(np.uint64)
+    if len(buffer) < 4:
+        return np.empty(0, np.uint64), np.empty(0, np.int64)
+    breaks = buffer == ord('\n')
+    text_of = np.cumsum(breaks) - breaks
+    codes = buffer[:-3] << np.uint64(24) | buffer[1:-2] << np.uint64(16) | buffer[2:-1] << np.uint64(8) | buffer[3:]
+    keep = ~(breaks[:-3] | breaks[1:-2] | breaks[2:-1] | breaks[3:])
+    return codes[keep], text_of[:-3][keep]
+
+
+def word_shingles(text: str, size: int = 3) -> np.ndarray:
+    """CRC32 codes of the word ``size``-grams of a (long) text."""
+    words = _normalize(text).split()
+    grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)] or ([' '.join(words)] if words else [])
+    return np.array([zlib.crc32(gram.encode('ascii', 'ignore')) for gram in grams], dtype=np.uint64)
+
+
+def minhash_signatures(codes: np.ndarray, text_of: np.ndarray, texts: int) -> np.ndarray:
+    """(texts x DUPLICATE_NUM_PERM) MinHash signatures; ``text_of`` must be sorted.
+
+    The fraction of equal values in two signatures estimates the Jaccard
+    similarity of their shingle sets. Texts without shingles keep the maximum
+    value everywhere.
+    """
+    signatures = np.full((texts, DUPLICATE_NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(codes), _HASH_CHUNK):
+        owners = text_of[start:start + _HASH_CHUNK]
+        # One row per hash function keeps the reduction over each text's shingles contiguous
+        hashed = np.multiply(_MULTIPLIERS[:, None], codes[None, start:start + _HASH_CHUNK])
+        hashed += _OFFSETS[:, None]
+        hashed >>= np.uint64(32)
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        first = owners[starts]
+        signatures[first] = np.minimum(signatures[first], np.minimum.reduceat(hashed, starts, axis=1).T)
+    return signatures
+
+
+def near_duplicate_groups(signatures: np.ndarray, threshold: float, valid: Optional[np.ndarray] = None) -> np.ndarray:
+    """Group label per signature; signatures estimated at least ``threshold`` similar share a label.
+
+    Signatures that agree on all values of one of DUPLICATE_BANDS bands land in
+    the same bucket, and each is compared only with the first signature of its
+    bucket, so the work grows with the number of signatures instead of the
+    number of pairs. Groups are connected components of the confirmed pairs.
+    """
+    count = len(signatures)
+    candidates = np.flatnonzero(valid) if valid is not None else np.arange(count)
+    rows = DUPLICATE_NUM_PERM // DUPLICATE_BANDS
+    members, leaders = [], []
+    for band in range(DUPLICATE_BANDS):
+        keys = (signatures[candidates, band * rows:(band + 1) * rows] * _BAND_MIX).sum(axis=1)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        band_leaders = candidates[first[inverse]]
+        paired = band_leaders != candidates
+        members.append(candidates[paired])
+        leaders.append(band_leaders[paired])
+
+    # The same pair usually shares several bands; compare it once
+    pair_keys = np.unique(np.concatenate(members) * count + np.concatenate(leaders))
+    members, leaders = pair_keys // count, pair_keys % count
+    confirmed = (signatures[members] == signatures[leaders]).mean(axis=1) >= threshold
+    graph = coo_matrix(
+        (np.ones(int(confirmed.sum())), (members[confirmed], leaders[confirmed])), shape=(count, count)
+    )
+    return connected_components(graph, directed=False)[1]
+
+
+def collapse_near_duplicates(interviews: List[Interview], threshold: float = DUPLICATE_STATEMENT_THRESHOLD) -> Dict:
+    """Keep one statement of every group of near-duplicate statements across ``interviews``.
+
+    The most confident statement of a group is kept in its own interview,
+    with ``evidence_count`` (the group size) and ``evidence_interviewees``
+    added to its metadata; only the other copies are dropped. Returns the
+    ``interviews`` reduced to the kept statements (copies; the originals are
+    untouched), the index of every kept statement in its original interview
+    (``statement_indexes``, per reduced interview), ``statements_before``,
+    ``statements_after`` and the number of ``groups`` that had duplicates.
+    """
+    flat = [(interview, index, statement) for interview in interviews for index, statement in enumerate(interview.statements)]
+    if not flat:
+        return {
+            'interviews': interviews,
+            'statement_indexes': [[] for _ in interviews],
+            'statements_before': 0,
+            'statements_after': 0,
+            'groups': 0
+        }
+
+    codes, text_of = char_shingles([statement.text for _, _, statement in flat])
+    signatures = minhash_signatures(codes, text_of, len(flat))
+    valid = np.zeros(len(flat), dtype=bool)
+    valid[text_of] = True
+    labels = near_duplicate_groups(signatures, threshold, valid)
+
+    groups = defaultdict(list)
+    for position, label in enumerate(labels.tolist()):
+        groups[label].append(position)
+
+    kept = {}
+    for positions in groups.values():
+        best = max(positions, key=lambda p: (flat[p][2].confidence, -p))
+        statement = flat[best][2]
+        if len(positions) > 1:
+            statement = replace(statement, metadata={
+                **statement.metadata,
+                'evidence_count': len(positions),
+                'evidence_interviewees': sorted({flat[p][0].interviewee for p in positions})
+            })
+        kept[best] = statement
+
+    by_interview = defaultdict(list)
+    indexes = defaultdict(list)
+    for position in sorted(kept):
+        by_interview[id(flat[position][0])].append(kept[position])
+        indexes[id(flat[position][0])].append(flat[position][1])
+    reduced = [
+        Interview(interviewee=i.interviewee, date=i.date, raw_text=i.raw_text, statements=by_interview[id(i)], metadata=i.metadata)
+        for i in interviews if by_interview[id(i)]
+    ]
+    return {
+        'interviews': reduced,
+        'statement_indexes': [indexes[id(i)] for i in interviews if by_interview[id(i)]],
+        'statements_before': len(flat),
+        'statements_after': len(kept),
+        'groups': sum(1 for positions in groups.values() if len(positions) > 1)
+    }
+
+
+@lru_cache(maxsize=256)
+def transcript_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of the word 3-grams of a transcript; None when it has no words."""
+    codes = word_shingles(text)
+    if not len(codes):
+        return None
+    return minhash_signatures(codes, np.zeros(len(codes), dtype=np.int64), 1)[0]
+
+
+def find_duplicate_interviews(
+    text: str,
+    interviews: List[Interview],
+    threshold: float = DUPLICATE_INTERVIEW_THRESHOLD
+) -> List[Dict]:
+    """Stored interviews whose transcript is a near-duplicate of ``text``, most similar first."""
+    signature = transcript_signature(text)
+    if signature is None:
+        return []
+    matches = []
+    for interview in interviews:
+        other = transcript_signature(interview.raw_text) if interview.raw_text else None
+        if other is None:
+            continue
+        similarity = float((signature == other).mean())
+        if similarity >= threshold:
+            matches.append({
+                'filename': interview.metadata.get('filename'),
+                'interviewee': interview.interviewee,
+                'similarity': similarity
+            })
+    return sorted(matches, key=lambda match: -match['similarity'])
+
+
+def duplicate_interview_groups(
+    interviews: List[Interview],
+    threshold: float = DUPLICATE_INTERVIEW_THRESHOLD
+) -> Dict[str, List[str]]:
+    """Filenames of the other near-duplicate interviews, per interview that has any."""
+    signatures = [transcript_signature(i.raw_text) if i.raw_text else None for i in interviews]
+    valid = np.array([s is not None for s in signatures], dtype=bool)
+    if valid.sum() < 2:
+        return {}
+    stacked = np.stack([s if s is not None else np.zeros(DUPLICATE_NUM_PERM, np.uint64) for s in signatures])
+    labels = near_duplicate_groups(stacked, threshold, valid)
+
+    groups = defaultdict(list)
+    for interview, label, has_signature in zip(interviews, labels.tolist(), valid.tolist()):
+        if has_signature:
+            groups[label].append(interview.metadata.get('filename'))
+    return {
+        filename: [other for other in filenames if other != filename]
+        for filenames in groups.values() if len(filenames) > 1
+        for filename in filenames
+    }
@@ -0,0 +1,103 @@
+import os
+from typing import Dict, List
+import numpy as np
+import scipy.sparse as sp
+import networkx as nx
+from sklearn.feature_extraction.text import CountVectorizer
+from ..models import Interview
+from ..config import (
+    CACHE_DIR, SEGMENT_CACHE_MAX_ENTRIES, SEGMENT_CACHE_MAX_MB, SEGMENT_CACHE_MAX_AGE_DAYS,
+    NETWORK_GRAPH_MIN_EDGE_WEIGHT, NETWORK_GRAPH_MAX_TERMS, NETWORK_GRAPH_MAX_EDGES
+)
+from .text_processor import dutch_terms, statement_content, surface_forms
+from ..utils.cache import DiskCache, corpus_fingerprint
+from ..utils.tracing import tracer
+
+# Bump whenever the way the network is built changes so cached networks are not reused
+NETWORK_VERSION = "1"
+
+network_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'network'),
+    max_entries=SEGMENT_CACHE_MAX_ENTRIES,
+    max_mb=SEGMENT_CACHE_MAX_MB,
+    max_age_days=SEGMENT_CACHE_MAX_AGE_DAYS
+)
+
+
+def network_terms(text: str) -> List[str]:
+    """Stemmed content words without bare numbers, which link unrelated statements."""
+    return [term for term in dutch_terms(text) if not term.isdigit()]
+
+
+def cooccurrence_matrix(texts: List[str], min_weight: int, max_terms: int):
+    """Stemmed terms, the number of texts containing each, and how many texts contain both of two terms.
+
+    The counts come from one sparse product of the binary text x term matrix
+    with itself. Only the upper triangle of pairs with at least
+    ``min_weight`` shared texts is returned. A term in fewer than
+    ``min_weight`` texts cannot reach that weight, so it is dropped before
+    the product, as is everything beyond the ``max_terms`` most frequent.
+    """
+    vectorizer = CountVectorizer(analyzer=network_terms, binary=True, min_df=max(min_weight, 1), max_features=max_terms)
+    try:
+        occurrences = vectorizer.fit_transform(texts)
+    except ValueError:
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.int64), sp.coo_matrix((0, 0))
+    counts = np.asarray(occurrences.sum(axis=0)).ravel()
+    pairs = sp.triu(occurrences.T @ occurrences, k=1).tocoo()
+    keep = pairs.data >= min_weight
+    pruned = sp.coo_matrix((pairs.data[keep], (pairs.row[keep], pairs.col[keep])), shape=pairs.shape)
+    return vectorizer.get_feature_names_out(), counts, pruned
+
+
+def cooccurrence_network(
+    interviews: List[Interview],
+    min_weight: int = NETWORK_GRAPH_MIN_EDGE_WEIGHT,
+    max_terms: int = NETWORK_GRAPH_MAX_TERMS,
+    max_edges: int = NETWORK_GRAPH_MAX_EDGES,
+    use_cache: bool = True
+) -> Dict:
+    """Network of terms that occur in the same statements, laid out for drawing.
+
+    Returns ``nodes`` (``term``, ``count`` of statements, ``community`` and
+    ``x``/``y`` position), ``edges`` as ``[source, target, weight]`` node
+    positions, the number of ``statements`` and the number of edges
+    ``pruned`` beyond ``max_edges``. Networks are cached by the corpus hash
+    and the parameters, so only a changed corpus is recomputed.
+    """
+    cache_key = DiskCache.make_key(NETWORK_VERSION, corpus_fingerprint(interviews, []), min_weight, max_terms, max_edges)
+    if use_cache:
+        cached = network_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    texts = [statement_content(statement.text, interview.interviewee) for interview in interviews for statement in interview.statements]
+    with tracer.span('cooccurrence_network', statements=len(texts)) as span:
+        stems, counts, pairs = cooccurrence_matrix(texts, min_weight, max_terms)
+        strongest = np.argsort(-pairs.data, kind='stable')[:max_edges]
+        graph = nx.Graph()
+        graph.add_weighted_edges_from(zip(pairs.row[strongest].tolist(), pairs.col[strongest].tolist(), pairs.data[strongest].tolist()))
+
+        nodes = sorted(graph.nodes)
+        position_of = {node: i for i, node in enumerate(nodes)}
+        layout = nx.spring_layout(graph, weight='weight', seed=0) if nodes else {}
+        communities = nx.community.louvain_communities(graph, weight='weight', seed=0) if nodes else []
+        community_of = {node: c for c, members in enumerate(sorted(communities, key=len, reverse=True)) for node in members}
+        forms = surface_forms(texts, {stems[node] for node in nodes})
+
+        network = {
+            'nodes': [{
+                'term': forms.get(stems[node], stems[node]),
+                'count': int(counts[node]),
+                'community': community_of[node],
+                'x': float(layout[node][0]),
+                'y': float(layout[node][1])
+            } for node in nodes],
+            'edges': [[position_of[a], position_of[b], int(data['weight'])] for a, b, data in graph.edges(data=True)],
+            'statements': len(texts),
+            'pruned': max(int(pairs.nnz) - max_edges, 0)
+        }
+        span.set(nodes=len(network['nodes']), edges=len(network['edges']), pruned=network['pruned'])
+
+    network_cache.set(cache_key, network)
+    return network
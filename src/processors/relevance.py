@@ -0,0 +1,149 @@
+import random
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from ..models import Interview, Statement
+from .text_processor import dutch_terms
+
+BM25_K1 = 1.5  # term frequency saturation
+BM25_B = 0.75  # document length normalisation
+
+
+def _flatten(
+    interviews: List[Interview], statement_indexes: Optional[List[Sequence[int]]] = None
+) -> List[Tuple[Interview, int, Statement]]:
+    if statement_indexes is None:
+        statement_indexes = [range(len(interview.statements)) for interview in interviews]
+    return [
+        (interview, index, statement)
+        for interview, indexes in zip(interviews, statement_indexes)
+        for index, statement in zip(indexes, interview.statements)
+    ]
+
+
+def bm25_weight(tf, document_frequency, documents: int, lengths, average_length: float, k1: float = BM25_K1, b: float = BM25_B):
+    """BM25 weight of terms occurring ``tf`` times in documents of ``lengths`` words.
+
+    ``document_frequency`` is the number of the ``documents`` that contain
+    each term. Works elementwise on NumPy arrays and scalars.
+    """
+    idf = np.log1p((documents - document_frequency + 0.5) / (document_frequency + 0.5))
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / (average_length or 1.0)))
+
+
+def bm25_scores(documents: List[str], queries: List[str], k1: float = BM25_K1, b: float = BM25_B) -> np.ndarray:
+    """BM25 score of every document for every query, as a (documents x queries) array.
+
+    Documents and queries are reduced to stemmed Dutch content words; the
+    document weights are computed once on the sparse term matrix and all
+    queries are scored with a single sparse matrix product.
+    """
+    vectorizer = CountVectorizer(analyzer=dutch_terms)
+    try:
+        counts = vectorizer.fit_transform(documents).tocsr().astype(np.float64)
+    except ValueError:
+        # No document has a single content word
+        return np.zeros((len(documents), len(queries)))
+
+    lengths = np.asarray(counts.sum(axis=1)).ravel()
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+
+    # Saturated, length-normalised term frequencies, weighted by idf
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    counts.data = bm25_weight(
+        counts.data, document_frequency[counts.indices], len(documents), lengths[rows], lengths.mean(), k1, b
+    )
+
+    query_terms = vectorizer.transform(queries)
+    query_terms.data[:] = 1.0
+    return np.asarray((counts @ query_terms.T).todense())
+
+
+def stratified_sample(candidates: List[Tuple[Interview, int, Statement]], size: int, seed: int = 0) -> List[int]:
+    """Pick ``size`` positions from ``candidates``, spread evenly over interviewees and statement types."""
+    strata: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for position, (interview, _, statement) in enumerate(candidates):
+        strata[(interview.interviewee, statement.type.value)].append(position)
+
+    rng = random.Random(seed)
+    queues = []
+    for key in sorted(strata):
+        positions = strata[key]
+        rng.shuffle(positions)
+        queues.append(positions)
+
+    # Round robin over the strata so small groups are represented as well
+    sample = []
+    while len(sample) < size and queues:
+        for positions in queues:
+            if positions and len(sample) < size:
+                sample.append(positions.pop())
+        queues = [positions for positions in queues if positions]
+    return sample
+
+
+def _reference(interview: Interview, index: int, statement: Statement, score: float = None) -> Dict:
+    reference = {
+        'interview': interview.metadata.get('filename') or interview.interviewee,
+        'statement': index,
+        'text': statement.text
+    }
+    if score is not None:
+        reference['score'] = round(float(score), 3)
+    return reference
+
+
+def select_relevant_statements(
+    interviews: List[Interview],
+    research_questions: List[str],
+    top_k: int,
+    sample_size: int,
+    seed: int = 0,
+    statement_indexes: Optional[List[Sequence[int]]] = None
+) -> Dict:
+    """Rank the statements per research question and keep the top ``top_k`` of each.
+
+    A stratified sample of ``sample_size`` statements that no question selected
+    is added, so the analysis still sees the breadth of the corpus. Returns
+    the selected statements per question (``per_question``), the ``sample``,
+    the ``interviews`` reduced to the selected statements, and a
+    JSON-serialisable ``record`` of the selection for the version metadata.
+
+    When ``interviews`` are reduced copies, ``statement_indexes`` holds the
+    index of each of their statements in the saved interview, so the record
+    points at the saved statements.
+    """
+    candidates = _flatten(interviews, statement_indexes)
+    scores = bm25_scores([statement.text for _, _, statement in candidates], research_questions)
+
+    selected = set()
+    per_question = {}
+    record = {'top_k': top_k, 'sample_size': sample_size, 'candidates': len(candidates), 'questions': {}}
+    for q, question in enumerate(research_questions):
+        column = scores[:, q]
+        ranked = [int(i) for i in np.argsort(-column, kind='stable')[:top_k] if column[i] > 0]
+        per_question[question] = [candidates[i][2] for i in ranked]
+        record['questions'][question] = [_reference(*candidates[i], column[i]) for i in ranked]
+        selected.update(ranked)
+
+    remaining = [i for i in range(len(candidates)) if i not in selected]
+    sample = [remaining[p] for p in stratified_sample([candidates[i] for i in remaining], sample_size, seed)]
+    record['sample'] = [_reference(*candidates[i]) for i in sample]
+    selected.update(sample)
+    record['selected'] = len(selected)
+
+    kept = defaultdict(list)
+    for i in sorted(selected):
+        kept[id(candidates[i][0])].append(candidates[i][2])
+    reduced = [
+        Interview(interviewee=i.interviewee, date=i.date, raw_text=i.raw_text, statements=kept[id(i)], metadata=i.metadata)
+        for i in interviews if kept[id(i)]
+    ]
+
+    return {
+        'per_question': per_question,
+        'sample': [candidates[i][2] for i in sample],
+        'interviews': reduced,
+        'record': record
+    }
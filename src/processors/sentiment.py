@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, List
+import numpy as np
+from ..models import Interview, StatementType
+from ..config import SENTIMENT_NEUTRAL_BAND, SENTIMENT_NEGATION_WINDOW, SENTIMENT_CACHE_MAX_ENTRIES
+from .text_processor import dutch_words, stem_dutch
+from ..utils.tracing import DEBUG, tracer
+
+# Valence of Dutch words from -1 to 1, aimed at how customers talk about products and services.
+# Words are matched on their stem, so inflections only need listing when they stem differently.
+# Words with a common neutral meaning are left out: 'zorgen' ('zorgen voor'), 'bezorgd' (delivered),
+# 'mist'/'gemist' (fog, a missed call).
+SENTIMENT_LEXICON = {
+    # positive
+    'goed': 0.6, 'prima': 0.5, 'fijn': 0.6, 'leuk': 0.6, 'mooi': 0.5, 'tevreden': 0.7, 'tevredenheid': 0.6,
+    'blij': 0.7, 'positief': 0.6, 'positieve': 0.6, 'handig': 0.5, 'makkelijk': 0.5, 'gemakkelijk': 0.5,
+    'eenvoudig': 0.4, 'duidelijk': 0.4, 'overzichtelijk': 0.5, 'snel': 0.3, 'betrouwbaar': 0.6,
+    'voordelig': 0.5, 'goedkoop': 0.4, 'gratis': 0.3, 'aantrekkelijk': 0.5, 'prettig': 0.6, 'vriendelijk': 0.5,
+    'behulpzaam': 0.6, 'geweldig': 0.9, 'fantastisch': 0.9, 'uitstekend': 0.9, 'perfect': 0.9, 'top': 0.7,
+    'waardevol': 0.6, 'interessant': 0.4, 'enthousiast': 0.7, 'vertrouwen': 0.5, 'gerust': 0.4,
+    'transparant': 0.5, 'eerlijk': 0.5, 'aanbevelen': 0.6, 'aanbeveling': 0.5, 'aanrader': 0.7,
+    'voordeel': 0.4, 'voordelen': 0.4, 'besparen': 0.4, 'besparing': 0.4, 'succes': 0.6, 'plezier': 0.7,
+    'genieten': 0.6, 'waarderen': 0.5, 'waardering': 0.5, 'loyaal': 0.5, 'trots': 0.6, 'gelukkig': 0.7,
+    'aangesproken': 0.3, 'aantrekt': 0.4, 'fan': 0.6, 'bevalt': 0.6, 'tevredener': 0.6, 'beter': 0.4,
+    'prettige': 0.6, 'snelle': 0.3, 'duidelijke': 0.4, 'waardeert': 0.5, 'ontzorgd': 0.5,
+    # negative
+    'slecht': -0.7, 'slechte': -0.7, 'duur': -0.5, 'dure': -0.5, 'traag': -0.5, 'langzaam': -0.4,
+    'lastig': -0.4, 'moeilijk': -0.4, 'ingewikkeld': -0.5, 'onduidelijk': -0.5, 'vervelend': -0.6,
+    'irritant': -0.7, 'ergert': -0.7, 'ergeren': -0.7, 'ergernis': -0.7, 'frustrerend': -0.8,
+    'frustratie': -0.7, 'teleurgesteld': -0.8, 'teleurstellend': -0.8, 'teleurstelling': -0.8,
+    'ontevreden': -0.7, 'boos': -0.8, 'negatief': -0.6, 'negatieve': -0.6, 'probleem': -0.5,
+    'klacht': -0.6, 'klagen': -0.5, 'storing': -0.5, 'fout': -0.5, 'fouten': -0.5, 'onzeker': -0.4,
+    'twijfel': -0.3, 'twijfelt': -0.3, 'bang': -0.5, 'angst': -0.6,
+    'wantrouwen': -0.6, 'onbetrouwbaar': -0.7, 'oneerlijk': -0.6, 'verwarrend': -0.5, 'tegenvalt': -0.5,
+    'tegenvallen': -0.5, 'tegenvallend': -0.5, 'jammer': -0.4, 'helaas': -0.4, 'waardeloos': -0.9,
+    'verschrikkelijk': -0.9, 'vreselijk': -0.9, 'stress': -0.6, 'gedoe': -0.5, 'rommelig': -0.4,
+    'opdringerig': -0.6, 'spam': -0.5, 'nadeel': -0.4, 'nadelen': -0.4, 'risico': -0.3, 'wachttijd': -0.3,
+    'onvoldoende': -0.5, 'slechter': -0.5, 'opzeggen': -0.3, 'overlast': -0.6,
+}
+
+# Words that flip the sentiment of the next SENTIMENT_NEGATION_WINDOW words
+NEGATORS = {'niet', 'geen', 'nooit', 'niets', 'nergens', 'nauwelijks', 'zonder'}
+# Factor applied to the sentiment of the next word
+BOOSTERS = {
+    'erg': 1.5, 'heel': 1.5, 'zeer': 1.5, 'echt': 1.3, 'super': 1.5, 'enorm': 1.6, 'ontzettend': 1.6,
+    'behoorlijk': 1.3, 'extra': 1.2, 'totaal': 1.4, 'beetje': 0.6, 'redelijk': 0.7, 'enigszins': 0.6,
+}
+NEGATION_FACTOR = -0.75  # a negated word is weaker than its opposite: 'niet goed' is not 'slecht'
+NORMALIZATION = 2.0  # raw sums are squashed to (-1, 1) by sum / sqrt(sum^2 + NORMALIZATION)
+
+# Token id -> valence, booster factor and negator flag; id 0 is every word not listed above
+_stems = sorted({stem_dutch(w) for w in chain(SENTIMENT_LEXICON, NEGATORS, BOOSTERS)})
+_STEM_IDS = {stem: i + 1 for i, stem in enumerate(_stems)}
+_VALENCE = np.zeros(len(_stems) + 1)
+_BOOST = np.ones(len(_stems) + 1)
+_NEGATES = np.zeros(len(_stems) + 1, dtype=bool)
+for _word, _value in SENTIMENT_LEXICON.items():
+    _VALENCE[_STEM_IDS[stem_dutch(_word)]] = _value
+for _word, _value in BOOSTERS.items():
+    _BOOST[_STEM_IDS[stem_dutch(_word)]] = _value
+for _word in NEGATORS:
+    _NEGATES[_STEM_IDS[stem_dutch(_word)]] = True
+
+_score_cache: Dict[str, float] = {}
+_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=100000)
+def _token_id(word: str) -> int:
+    # Numbers and codes are never in the lexicon; skip stemming them
+    if not word.replace('-', '').replace("'", '').isalpha():
+        return 0
+    return _STEM_IDS.get(stem_dutch(word), 0)
+
+
+def statement_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _score_uncached(texts: List[str]) -> np.ndarray:
+    """Scores of ``texts`` computed together over one flat array of all their words."""
+    words = [dutch_words(text) for text in texts]
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(texts))
+    ids = np.fromiter(map(_token_id, chain.from_iterable(words)), dtype=np.int64, count=int(lengths.sum()))
+    owner = np.repeat(np.arange(len(texts)), lengths)
+
+    negates = _NEGATES[ids]
+    negated = np.zeros(len(ids), dtype=bool)
+    for distance in range(1, SENTIMENT_NEGATION_WINDOW + 1):
+        # A negator only reaches words of its own statement
+        negated[distance:] |= negates[:-distance] & (owner[:-distance] == owner[distance:])
+    boost = np.ones(len(ids))
+    same = owner[1:] == owner[:-1]
+    boost[1:][same] = _BOOST[ids[:-1][same]]
+
+    values = _VALENCE[ids] * boost * np.where(negated, NEGATION_FACTOR, 1.0)
+    raw = np.bincount(owner, weights=values, minlength=len(texts))
+    return raw / np.sqrt(raw * raw + NORMALIZATION)
+
+
+def score_texts(texts: List[str]) -> np.ndarray:
+    """Sentiment from -1 (negative) to 1 (positive) of every text.
+
+    Scores are cached by the hash of the text, so only new or changed
+    statements are scored.
+    """
+    keys = [statement_hash(text) for text in texts]
+    scores = np.empty(len(texts))
+    with _cache_lock:
+        missing = []
+        for i, key in enumerate(keys):
+            cached = _score_cache.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                scores[i] = cached
+    with tracer.span('sentiment', level=DEBUG, statements=len(texts), scored=len(missing)):
+        if missing:
+            computed = _score_uncached([texts[i] for i in missing])
+            scores[missing] = computed
+            with _cache_lock:
+                if len(_score_cache) + len(missing) > SENTIMENT_CACHE_MAX_ENTRIES:
+                    _score_cache.clear()
+                _score_cache.update(zip((keys[i] for i in missing), computed.tolist()))
+    return scores
+
+
+def _aggregate(scores: np.ndarray, groups: np.ndarray, count: int) -> List[Dict]:
+    """Number of statements, mean score and positive/neutral/negative counts per group."""
+    sizes = np.bincount(groups, minlength=count)
+    means = np.bincount(groups, weights=scores, minlength=count) / np.maximum(sizes, 1)
+    positive = np.bincount(groups, weights=scores > SENTIMENT_NEUTRAL_BAND, minlength=count)
+    negative = np.bincount(groups, weights=scores < -SENTIMENT_NEUTRAL_BAND, minlength=count)
+    return [
+        {'statements': int(n), 'mean': float(m), 'positive': int(p), 'neutral': int(n - p - q), 'negative': int(q)}
+        for n, m, p, q in zip(sizes, means, positive, negative)
+    ]
+
+
+def sentiment_scores(interviews: List[Interview]) -> Dict:
+    """Sentiment of every statement and the aggregates shown in the analysis view.
+
+    Returns the scores per interview file (``statements``), an aggregate per
+    interview (``interviews``), per statement type value (``types``) and over
+    all statements (``overall``). Everything is computed locally.
+    """
+    flat = [(position, statement) for position, interview in enumerate(interviews) for statement in interview.statements]
+    scores = score_texts([statement.text for _, statement in flat])
+    interview_of = np.fromiter((position for position, _ in flat), dtype=np.int64, count=len(flat))
+    types = list(StatementType)
+    type_of = np.fromiter((types.index(statement.type) for _, statement in flat), dtype=np.int64, count=len(flat))
+
+    per_statement, position = {}, 0
+    for interview in interviews:
+        key = interview.metadata.get('filename') or interview.interviewee
+        per_statement[key] = scores[position:position + len(interview.statements)].round(3).tolist()
+        position += len(interview.statements)
+
+    return {
+        'statements': per_statement,
+        'interviews': [
+            {'filename': interview.metadata.get('filename'), 'interviewee': interview.interviewee, **aggregate}
+            for interview, aggregate in zip(interviews, _aggregate(scores, interview_of, len(interviews)))
+        ],
+        'types': {t.value: aggregate for t, aggregate in zip(types, _aggregate(scores, type_of, len(types)))},
+        'overall': _aggregate(scores, np.zeros(len(flat), dtype=np.int64), 1)[0]
+    }
@@ -1,37 +1,31 @@
+import hashlib
 import re
-from typing import List, Tuple
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from nltk.stem.snowball import DutchStemmer
 from ..models import Statement, StatementType, Interview
-from ..config import MINIMUM_STATEMENT_LENGTH, MAXIMUM_STATEMENT_LENGTH
+from ..config import (
+    MINIMUM_STATEMENT_LENGTH, MAXIMUM_STATEMENT_LENGTH, CHUNK_SIZE,
+    CHARS_PER_TOKEN, SEGMENT_TOKEN_BUDGET, SEGMENT_OVERLAP_SENTENCES
+)
+from ..utils.tracing import tracer
+
+# Common Dutch abbreviations whose periods do not end a sentence
+ABBREVIATION_PATTERN = r'(Mr\.|Dr\.|Prof\.|etc\.|bijv\.|bv\.|nl\.|d.w.z\.|m.b.t\.|t.o.v\.|m.i\.|z.s.m\.|a.u.b\.|i.v.m\.|o.a\.|e.d\.|c.q\.|m.a.w\.|n.a.v\.|t.a.v\.)'
 
 def dutch_sentence_split(text: str) -> List[str]:
-    """Split Dutch text into sentences using common Dutch sentence endings."""
-    # Replace common abbreviations to prevent false splits
-    text = re.sub(r'(Mr\.|Dr\.|Prof\.|etc\.|bijv\.|bv\.|nl\.|d.w.z\.|m.b.t\.|t.o.v\.|m.i\.|z.s.m\.|a.u.b\.|i.v.m\.|o.a\.|e.d\.|c.q\.|m.a.w\.|n.a.v\.|t.a.v\.)', lambda m: m.group().replace('.', '@'), text)
-    
-    # Split on sentence endings (.!?) followed by capital letters or whitespace + capital letters
-    sentences = re.split(r'([.!?])\s+(?=[A-Z])|([.!?])(?=[A-Z])', text)
-    
-    # Clean and combine the split parts
-    result = []
-    current = ""
-    for part in sentences:
-        if part in ['.', '!', '?', None]:
-            if current:
-                # Restore abbreviation periods and append sentence
-                current = current.replace('@', '.').strip()
-                if current:
-                    result.append(current)
-            current = ""
-        else:
-            current += (part or "")
-    
-    # Add the last sentence if it exists
-    if current:
-        current = current.replace('@', '.').strip()
-        if current:
-            result.append(current)
-    
-    return [s for s in result if s]
+    """Split Dutch text into sentences, keeping their punctuation.
+
+    A sentence ends at a line break or at . ! ? followed by whitespace and a
+    capital letter, quote or opening parenthesis; the periods of common
+    abbreviations do not end a sentence.
+    """
+    # Mask abbreviation periods with a character that cannot occur in the text
+    masked = re.sub(ABBREVIATION_PATTERN, lambda m: m.group().replace('.', '\x00'), text)
+    parts = re.split(r'(?<=[.!?])\s+(?=[A-Z"\'(])|\s*\n\s*', masked)
+    return [p.replace('\x00', '.').strip() for p in parts if p and p.strip()]
 
 def clean_text(text: str) -> str:
     """Clean and normalize text."""
@@ -42,7 +36,7 @@ def clean_text(text: str) -> str:
     text = re.sub(r'[^\w\s.,!?;:\'\"()-]', '', text)
     return text.strip()
 
-def split_into_segments(text: str, max_length: int = 2000) -> List[str]:
+def split_into_segments(text: str, max_length: int = CHUNK_SIZE) -> List[str]:
     """Split text into manageable segments while preserving sentence boundaries."""
     sentences = dutch_sentence_split(text)
     segments = []
@@ -64,6 +58,232 @@ def split_into_segments(text: str, max_length: int = 2000) -> List[str]:
     
     return segments
 
+# Dutch function words that carry no meaning for search, retrieval or word counts
+# (kept here because the nltk stopword corpus is a separate download)
+DUTCH_STOPWORDS = frozenset("""
+aan al alle alles als altijd andere ben bij daar dan dat de der deze die dit doch doen door dus een eens en er
+ge geen geweest haar had heb hebben heeft hem het hier hij hoe hun iemand iets ik in is ja je jij jou jouw kan
+kon kunnen maar me meer men met mij mijn moet na naar niet niets nog nu of om omdat ook op over reeds te tegen
+toch toen tot u uit uw van veel voor want waren was wat we wel werd wezen wie wij wil worden wordt zal ze zei
+zelf zich zij zijn zo zonder zou echt gewoon eigenlijk best heel erg even nou he oke ok nee
+""".split())
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+_stemmer = DutchStemmer()
+
+def normalize_dutch(text: str) -> str:
+    """Lowercase and strip accents, so 'geïnterviewde' and 'geinterviewde' match."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+@lru_cache(maxsize=100000)
+def stem_dutch(word: str) -> str:
+    """Snowball stem of a normalized Dutch word."""
+    return _stemmer.stem(word)
+
+def dutch_words(text: str) -> List[str]:
+    """Normalized words of a text, stopwords included, in order."""
+    return _WORD_PATTERN.findall(normalize_dutch(text))
+
+def dutch_terms(text: str) -> List[str]:
+    """Stemmed content words of a text, for search and retrieval."""
+    return [stem_dutch(w) for w in dutch_words(text) if w not in DUTCH_STOPWORDS and len(w) > 1]
+
+# Statements read "[naam] [werkwoord] ..."; the name and verb say nothing about their content.
+# These are the verbs EXTRACTION_SYSTEM_PROMPT lets the model start a statement with.
+STATEMENT_VERBS = {
+    'denkt', 'vindt', 'gelooft', 'voelt', 'is', 'wordt', 'doet', 'gaat', 'maakt', 'gebruikt',
+    'zegt', 'vertelt', 'geeft',
+}
+
+def statement_content(text: str, interviewee: str) -> str:
+    """Statement text without the leading interviewee name and statement verb."""
+    words = text.split()
+    name = interviewee.lower().split()
+    if [w.lower() for w in words[:len(name)]] == name:
+        words = words[len(name):]
+    if words and words[0].lower() in STATEMENT_VERBS:
+        words = words[1:]
+    return ' '.join(words)
+
+def surface_forms(texts: List[str], stems: set) -> Dict[str, str]:
+    """The most frequent written form of each stem, so stems can be shown as words."""
+    forms = defaultdict(Counter)
+    for text in texts:
+        for word in dutch_words(text):
+            stem = stem_dutch(word)
+            if stem in stems:
+                forms[stem][word] += 1
+    return {stem: counts.most_common(1)[0][0] for stem, counts in forms.items()}
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens in a piece of text."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    """Break a sentence that exceeds the token budget on word boundaries."""
+    max_chars = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    pieces = []
+    current = ""
+    for word in sentence.split(' '):
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > max_chars and current:
+            pieces.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def packing_sentences(text: str, max_tokens: int = SEGMENT_TOKEN_BUDGET) -> List[str]:
+    """Sentences of ``text`` as used for packing, with over-long sentences broken up."""
+    sentences = []
+    for sentence in dutch_sentence_split(text):
+        if estimate_tokens(sentence) > max_tokens:
+            sentences.extend(_split_long_sentence(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+    return sentences
+
+def pack_sentence_ranges(
+    sentences: List[str],
+    max_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES,
+    start: int = 0,
+    end: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """Pack ``sentences[start:end]`` into (start, end) ranges of at most max_tokens estimated tokens.
+
+    The last ``overlap_sentences`` sentences of a range are repeated at the
+    start of the next one, so statements spanning a boundary keep their context.
+    """
+    end = len(sentences) if end is None else end
+    ranges = []
+    segment_start = start
+    current_tokens = 0
+    new_sentences = 0  # sentences in the current range that are not overlap
+    
+    for i in range(start, end):
+        sentence_tokens = estimate_tokens(sentences[i])
+        if current_tokens + sentence_tokens > max_tokens and new_sentences:
+            ranges.append((segment_start, i))
+            overlap = min(overlap_sentences, i - segment_start) if overlap_sentences > 0 else 0
+            # Never let the overlap push the next segment over budget
+            while overlap and sum(estimate_tokens(s) for s in sentences[i - overlap:i]) + sentence_tokens > max_tokens:
+                overlap -= 1
+            segment_start = i - overlap
+            current_tokens = sum(estimate_tokens(s) for s in sentences[segment_start:i])
+            new_sentences = 0
+        current_tokens += sentence_tokens
+        new_sentences += 1
+    
+    if new_sentences:
+        ranges.append((segment_start, end))
+    
+    return ranges
+
+def pack_segments(
+    text: str,
+    max_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES
+) -> List[str]:
+    """Pack whole sentences into segments of at most max_tokens estimated tokens.
+
+    The last ``overlap_sentences`` sentences of a segment are repeated at the
+    start of the next one, so statements spanning a boundary keep their context.
+    """
+    sentences = packing_sentences(text, max_tokens)
+    return [' '.join(sentences[a:b]) for a, b in pack_sentence_ranges(sentences, max_tokens, overlap_sentences)]
+
+def segment_hash(segment: str) -> str:
+    """Content hash identifying a segment across re-processing runs."""
+    return hashlib.sha256(segment.encode('utf-8')).hexdigest()[:16]
+
+def align_sentence_ranges(
+    sentences: List[str],
+    previous: List[List[str]],
+    max_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES
+) -> List[Tuple[int, int]]:
+    """Pack ``sentences`` while reusing previous segments that are still present unchanged.
+
+    ``previous`` holds the sentences of each earlier segment, in order. Earlier
+    segments found verbatim (and in order) in ``sentences`` keep their exact
+    boundaries; only the text between them is packed anew. Without this, a
+    single edit near the start would shift every later segment boundary.
+    """
+    positions = defaultdict(list)
+    for i, sentence in enumerate(sentences):
+        positions[sentence].append(i)
+    
+    kept = []
+    covered = 0
+    for old in previous:
+        if not old:
+            continue
+        for a in positions.get(old[0], []):
+            b = a + len(old)
+            if a >= covered - overlap_sentences and a >= (kept[-1][0] + 1 if kept else 0) and sentences[a:b] == old:
+                kept.append((a, b))
+                covered = b
+                break
+    
+    ranges = []
+    covered = 0
+    for a, b in kept + [(len(sentences), len(sentences))]:
+        if a > covered:
+            # Pack the new or changed text, starting with the overlap of the previous segment
+            gap_start = max(0, covered - overlap_sentences) if covered else 0
+            ranges.extend(pack_sentence_ranges(sentences, max_tokens, overlap_sentences, gap_start, a))
+        if b > a:
+            ranges.append((a, b))
+            covered = max(covered, b)
+    return ranges
+
+def plan_segments(
+    text: str,
+    max_tokens: int = SEGMENT_TOKEN_BUDGET,
+    overlap_sentences: int = SEGMENT_OVERLAP_SENTENCES,
+    previous: Optional[List[List[str]]] = None
+) -> Tuple[List[str], List[Dict]]:
+    """Segments of ``text`` plus a segment map of {'hash', 'start', 'end'} sentence ranges.
+
+    With ``previous`` (see align_sentence_ranges) unchanged earlier segments are
+    reproduced exactly, so their hashes match the stored ones.
+    """
+    with tracer.span('segment', chars=len(text), incremental=bool(previous)) as span:
+        sentences = packing_sentences(text, max_tokens)
+        if previous:
+            ranges = align_sentence_ranges(sentences, previous, max_tokens, overlap_sentences)
+        else:
+            ranges = pack_sentence_ranges(sentences, max_tokens, overlap_sentences)
+        segments = [' '.join(sentences[a:b]) for a, b in ranges]
+        segment_map = [
+            {'hash': segment_hash(segment), 'start': a, 'end': b}
+            for segment, (a, b) in zip(segments, ranges)
+        ]
+        span.set(sentences=len(sentences), segments=len(segments))
+    return segments, segment_map
+
+def segment_sentences(text: str, segment_map: List[Dict], max_tokens: int = SEGMENT_TOKEN_BUDGET) -> List[List[str]]:
+    """Rebuild the sentences of each stored segment of ``text``, skipping entries that no longer match."""
+    sentences = packing_sentences(text, max_tokens)
+    previous = []
+    for entry in segment_map:
+        segment = sentences[entry['start']:entry['end']]
+        if segment and segment_hash(' '.join(segment)) == entry['hash']:
+            previous.append(segment)
+    return previous
+
 def extract_statement_type(text: str) -> Tuple[StatementType, float]:
     """Determine the type of statement and confidence level."""
     text_lower = text.lower()
@@ -0,0 +1,233 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from ..models import Analysis, Interview
+from ..config import (
+    AI_MODEL, CACHE_DIR, SEGMENT_CACHE_MAX_ENTRIES, SEGMENT_CACHE_MAX_MB, SEGMENT_CACHE_MAX_AGE_DAYS,
+    THEME_COUNT, THEME_MAX_COUNT, THEME_TOP_TERMS, THEME_REPRESENTATIVES, THEME_NAMING_MAX_TOKENS,
+    SENTIMENT_ANALYSIS, PATTERN_RECOGNITION
+)
+from .text_processor import dutch_terms, statement_content, surface_forms
+from .sentiment import sentiment_scores
+from ..utils.cache import DiskCache
+from ..utils.usage import usage_to_dict
+from ..utils.rate_limiter import scheduler, PRIORITY_ANALYSIS
+from ..utils.llm_backend import get_backend
+from ..utils.tracing import tracer
+from ..utils.ledger import ledger
+
+# Bump whenever the naming prompt changes so cached names are not reused
+THEME_PROMPT_VERSION = "1"
+
+theme_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'themes'),
+    max_entries=SEGMENT_CACHE_MAX_ENTRIES,
+    max_mb=SEGMENT_CACHE_MAX_MB,
+    max_age_days=SEGMENT_CACHE_MAX_AGE_DAYS
+)
+
+THEME_NAMING_SYSTEM_PROMPT = """Je bent een expert in kwalitatief onderzoek.
+Je krijgt groepen van uitspraken uit interviews die lokaal zijn geclusterd, elk met kenmerkende woorden en voorbeelduitspraken.
+Geef elke groep een korte, inhoudelijke naam van hooguit vijf woorden en een interpretatie van één of twee zinnen.
+Houd rekening met de onderzoeksvragen als die zijn gegeven. Schrijf in het Nederlands.
+Antwoord per groep exact in dit format, met een lege regel tussen de groepen:
+THEMA: <nummer>
+NAAM: <naam>
+UITLEG: <interpretatie>"""
+
+def cluster_themes(interviews: List[Interview], n_themes: Optional[int] = THEME_COUNT, seed: int = 0) -> Dict:
+    """Cluster all statements into themes with TF-IDF vectors and mini-batch k-means.
+
+    Returns the ``themes``, largest first, each with its ``terms``, a
+    ``label`` made of the top terms, its ``size`` and ``share`` of all
+    statements, the number of ``interviewees`` and the ``representatives``
+    closest to its centre; the ``distribution`` of every interview over the
+    themes; and the theme of every statement per interview file
+    (``assignments``, -1 for statements without content words).
+    """
+    flat = [(interview, index, statement) for interview in interviews for index, statement in enumerate(interview.statements)]
+    texts = [statement_content(statement.text, interview.interviewee) for interview, _, statement in flat]
+    result = {'themes': [], 'distribution': [], 'assignments': {}, 'statements': len(flat), 'unassigned': len(flat)}
+
+    with tracer.span('themes', statements=len(flat)) as span:
+        # Terms in one statement only or in most of them do not separate themes
+        large = len(flat) >= 50
+        vectorizer = TfidfVectorizer(analyzer=dutch_terms, sublinear_tf=True, min_df=2 if large else 1, max_df=0.5 if large else 1.0)
+        try:
+            vectors = vectorizer.fit_transform(texts)
+        except ValueError:
+            return result
+        rows = np.flatnonzero(vectors.getnnz(axis=1) > 0)
+        if not len(rows):
+            return result
+
+        count = n_themes or int(round(np.sqrt(len(rows) / 2)))
+        count = max(1, min(count, THEME_MAX_COUNT, len(rows)))
+        model = MiniBatchKMeans(n_clusters=count, random_state=seed, n_init=3, batch_size=1024).fit(vectors[rows])
+        labels = np.full(len(flat), -1)
+        labels[rows] = model.labels_
+        centres = model.cluster_centers_ / np.maximum(np.linalg.norm(model.cluster_centers_, axis=1, keepdims=True), 1e-12)
+        closeness = np.asarray(vectors[rows] @ centres.T)[np.arange(len(rows)), model.labels_]
+
+        stems = vectorizer.get_feature_names_out()
+        top_terms = [[stems[t] for t in np.argsort(-centre)[:THEME_TOP_TERMS] if centre[t] > 0] for centre in centres]
+        forms = surface_forms(texts, {stem for terms in top_terms for stem in terms})
+
+        # Largest theme first
+        order = np.argsort(-np.bincount(model.labels_, minlength=count), kind='stable')
+        theme_id = np.empty(count, dtype=int)
+        theme_id[order] = np.arange(count)
+        labels[rows] = theme_id[model.labels_]
+
+        for cluster in order:
+            members = np.flatnonzero(model.labels_ == cluster)
+            closest = members[np.argsort(-closeness[members], kind='stable')[:THEME_REPRESENTATIVES]]
+            terms = [forms.get(stem, stem) for stem in top_terms[cluster]]
+            result['themes'].append({
+                'id': int(theme_id[cluster]),
+                'label': ", ".join(terms[:3]),
+                'terms': terms,
+                'size': int(len(members)),
+                'share': len(members) / len(flat),
+                'interviewees': len({flat[rows[m]][0].interviewee for m in members}),
+                'representatives': [{
+                    'interviewee': flat[rows[m]][0].interviewee,
+                    'filename': flat[rows[m]][0].metadata.get('filename'),
+                    'statement': flat[rows[m]][1],
+                    'text': flat[rows[m]][2].text
+                } for m in closest]
+            })
+
+        position = 0
+        for interview in interviews:
+            interview_labels = labels[position:position + len(interview.statements)]
+            position += len(interview.statements)
+            key = interview.metadata.get('filename') or interview.interviewee
+            result['assignments'][key] = interview_labels.tolist()
+            assigned = interview_labels[interview_labels >= 0]
+            counts = np.bincount(assigned, minlength=count)
+            result['distribution'].append({
+                'filename': interview.metadata.get('filename'),
+                'interviewee': interview.interviewee,
+                'statements': len(interview.statements),
+                'themes': (counts / max(len(assigned), 1)).tolist()
+            })
+
+        result['unassigned'] = int((labels < 0).sum())
+        span.set(themes=count, unassigned=result['unassigned'])
+    return result
+
+
+def _naming_request(themes: List[Dict], research_questions: List[str]) -> Dict:
+    blocks = []
+    for theme in themes:
+        examples = "\n".join(f"- {r['text']}" for r in theme['representatives'])
+        blocks.append(
+            f"THEMA {theme['id'] + 1} ({theme['size']} uitspraken)\n"
+            f"Kenmerkende woorden: {', '.join(theme['terms'])}\n"
+            f"Voorbeelden:\n{examples}"
+        )
+    questions = "\n".join(f"- {q}" for q in research_questions)
+    content = (f"ONDERZOEKSVRAGEN:\n{questions}\n\n" if research_questions else "") + "GROEPEN:\n\n" + "\n\n".join(blocks)
+    return dict(
+        model=AI_MODEL,
+        max_tokens=THEME_NAMING_MAX_TOKENS,
+        temperature=0.0,
+        system=THEME_NAMING_SYSTEM_PROMPT,
+        messages=[{"role": "user", "content": content}]
+    )
+
+
+def parse_theme_names(response_text: str) -> Dict[int, Dict]:
+    """THEMA:/NAAM:/UITLEG: blocks by zero-based theme id."""
+    names, current = {}, None
+    for line in response_text.splitlines():
+        line = line.strip()
+        if line.startswith('THEMA:'):
+            try:
+                current = int(line.replace('THEMA:', '').strip().rstrip('.')) - 1
+            except ValueError:
+                current = None
+                continue
+            names[current] = {}
+        elif current is not None and line.startswith('NAAM:'):
+            names[current]['name'] = line.replace('NAAM:', '').strip()
+        elif current is not None and line.startswith('UITLEG:'):
+            names[current]['interpretation'] = line.replace('UITLEG:', '').strip()
+    return names
+
+
+def name_themes(themes: List[Dict], research_questions: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict]:
+    """Have the model name and interpret the clusters; returns copies with ``name`` and ``interpretation``.
+
+    Names are cached by the cluster descriptions. Themes the model did not
+    name, or all of them if the call fails, keep their term ``label``.
+    """
+    research_questions = research_questions or []
+    named = [dict(theme, name=theme['label'], interpretation=None) for theme in themes]
+    if not themes:
+        return named
+
+    params = _naming_request(themes, research_questions)
+    cache_key = DiskCache.make_key(AI_MODEL, THEME_PROMPT_VERSION, params['messages'])
+    names = theme_cache.get(cache_key) if use_cache else None
+    if names is None:
+        try:
+            with tracer.span('llm_call', stage='theme_naming', model=AI_MODEL, themes=len(themes)) as span, \
+                    ledger.track('theme_naming', AI_MODEL, themes=len(themes)) as call:
+                response = scheduler.create_message(get_backend(), params, PRIORITY_ANALYSIS)
+                span.set(stop_reason=response.stop_reason, **usage_to_dict(response.usage))
+                call.update(usage=usage_to_dict(response.usage), stop_reason=response.stop_reason)
+        except Exception as e:
+            tracer.warning('theme_naming_failed', error=f"{type(e).__name__}: {e}")
+            return named
+        # JSON object keys are strings, so store the parsed names that way
+        names = {str(i): value for i, value in parse_theme_names(response.content[0].text).items()}
+        if use_cache:
+            theme_cache.set(cache_key, names)
+
+    for theme in named:
+        parsed = names.get(str(theme['id']), {})
+        theme['name'] = parsed.get('name') or theme['label']
+        theme['interpretation'] = parsed.get('interpretation')
+    return named
+
+
+def theme_analysis(
+    interviews: List[Interview],
+    research_questions: Optional[List[str]] = None,
+    name: bool = True,
+    n_themes: Optional[int] = THEME_COUNT,
+    use_cache: bool = True
+) -> Analysis:
+    """Themes of the statements as an ``Analysis``: theme names in ``themes``, the details in ``patterns``.
+
+    Themes are only clustered with PATTERN_RECOGNITION on. With
+    SENTIMENT_ANALYSIS on, ``sentiment_scores`` holds the local sentiment of
+    every statement and its aggregates.
+    """
+    clusters = cluster_themes(interviews if PATTERN_RECOGNITION else [], n_themes)
+    if name:
+        themes = name_themes(clusters['themes'], research_questions, use_cache)
+    else:
+        themes = [dict(theme, name=theme['label'], interpretation=None) for theme in clusters['themes']]
+    return Analysis(
+        interviews=interviews,
+        themes=[theme['name'] for theme in themes],
+        patterns={
+            'themes': themes,
+            'distribution': clusters['distribution'],
+            'assignments': clusters['assignments'],
+            'statements': clusters['statements'],
+            'unassigned': clusters['unassigned']
+        },
+        sentiment_scores=sentiment_scores(interviews) if SENTIMENT_ANALYSIS else {},
+        metadata={
+            'method': 'tfidf_minibatch_kmeans',
+            'named_by': AI_MODEL if name else None,
+            'timestamp': datetime.now().isoformat()
+        }
+    )
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import io
+import os
+from typing import Dict, List, Optional
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from ..config import (
+    CACHE_DIR, SEGMENT_CACHE_MAX_ENTRIES, SEGMENT_CACHE_MAX_MB, SEGMENT_CACHE_MAX_AGE_DAYS,
+    MAX_WORDCLOUD_WORDS, WORDCLOUD_WIDTH, WORDCLOUD_HEIGHT
+)
+from .text_processor import DUTCH_STOPWORDS, dutch_words
+from ..utils.cache import DiskCache
+from ..utils.tracing import DEBUG, tracer
+
+# Rendering is optional: without the wordcloud package only the frequency tables are available
+try:
+    from wordcloud import WordCloud
+except ImportError:
+    WordCloud = None
+
+# Bump whenever counting or rendering changes so cached tables and images are not reused
+WORDCLOUD_VERSION = "1"
+
+# Words that fill every cloud of statements without saying anything about their content
+WORDCLOUD_STOPWORDS = DUTCH_STOPWORDS | {
+    'vindt', 'vind', 'zich', 'mee', 'waar', 'welke', 'wanneer', 'daarom', 'daarbij', 'gaat', 'gaan',
+    'komt', 'komen', 'maakt', 'maken', 'krijgt', 'krijgen', 'zien', 'ziet', 'willen', 'wilt', 'moeten', 'kunnen',
+}
+
+wordcloud_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'wordclouds'),
+    max_entries=SEGMENT_CACHE_MAX_ENTRIES,
+    max_mb=SEGMENT_CACHE_MAX_MB,
+    max_age_days=SEGMENT_CACHE_MAX_AGE_DAYS
+)
+
+
+def wordcloud_available() -> bool:
+    return WordCloud is not None
+
+
+def cloud_words(text: str) -> List[str]:
+    """Normalized words of a text that belong in a word cloud: no stopwords, numbers or words under three letters."""
+    return [w for w in dutch_words(text) if w not in WORDCLOUD_STOPWORDS and len(w) > 2 and not w.isdigit()]
+
+
+def content_hash(texts: List[str]) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode('utf-8') + b'\x00')
+    return digest.hexdigest()
+
+
+def word_frequencies(texts: List[str], max_words: int = MAX_WORDCLOUD_WORDS) -> List[List]:
+    """The ``max_words`` most frequent words of ``texts`` as ``[word, count]``, most frequent first.
+
+    Counts are column sums of one sparse text x word matrix and are cached by
+    the hash of the texts.
+    """
+    cache_key = DiskCache.make_key(WORDCLOUD_VERSION, 'frequencies', content_hash(texts), max_words)
+    cached = wordcloud_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    with tracer.span('word_frequencies', level=DEBUG, texts=len(texts)):
+        vectorizer = CountVectorizer(analyzer=cloud_words)
+        try:
+            counts = np.asarray(vectorizer.fit_transform(texts).sum(axis=0)).ravel()
+        except ValueError:
+            frequencies = []
+        else:
+            words = vectorizer.get_feature_names_out()
+            # Ties are broken alphabetically, so the same texts always give the same table
+            top = np.lexsort((words, -counts))[:max_words]
+            frequencies = [[str(words[i]), int(counts[i])] for i in top]
+    wordcloud_cache.set(cache_key, frequencies)
+    return frequencies
+
+
+def render_wordcloud(frequencies: List[List], width: int = WORDCLOUD_WIDTH, height: int = WORDCLOUD_HEIGHT) -> Optional[bytes]:
+    """PNG of a word cloud of the frequency table, cached by its content; None without the wordcloud package."""
+    if WordCloud is None or not frequencies:
+        return None
+    cache_key = DiskCache.make_key(WORDCLOUD_VERSION, 'png', frequencies, width, height)
+    cached = wordcloud_cache.get(cache_key)
+    if cached is not None:
+        return base64.b64decode(cached)
+
+    with tracer.span('render_wordcloud', level=DEBUG, words=len(frequencies)):
+        cloud = WordCloud(
+            width=width, height=height, background_color='white', max_words=len(frequencies), random_state=0
+        ).generate_from_frequencies(dict(frequencies))
+        buffer = io.BytesIO()
+        cloud.to_image().save(buffer, format='PNG')
+    image = buffer.getvalue()
+    wordcloud_cache.set(cache_key, base64.b64encode(image).decode('ascii'))
+    return image
+
+
+def wordcloud(texts: List[str], max_words: int = MAX_WORDCLOUD_WORDS) -> Dict:
+    """Frequency table of ``texts`` and, when the wordcloud package is installed, its rendered ``image``."""
+    frequencies = word_frequencies(texts, max_words)
+    return {'frequencies': frequencies, 'image': render_wordcloud(frequencies)}
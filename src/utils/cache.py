@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from ..models import Interview
+from .tracing import tracer
+
+
+# Writes between full eviction scans, so expired entries are still dropped when the limits are not reached
+EVICT_EVERY_WRITES = 200
+# Eviction trims a cache over its limits to this fraction of them, so the next writes do not scan again
+EVICT_TARGET = 0.9
+
+
+class DiskCache:
+    """Content-addressed JSON cache on disk with size and age based eviction.
+
+    The directory is only scanned for eviction when a running estimate of
+    its entries and bytes passes a limit, or every EVICT_EVERY_WRITES
+    writes, so a write does not cost a scan of the whole cache.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 5000, max_mb: float = 50, max_age_days: float = 30):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Upper bounds on the directory contents since the last scan; None until the first scan
+        self._estimated_entries: Optional[int] = None
+        self._estimated_bytes = 0
+        self._writes_since_scan = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a stable cache key from the given parts."""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            # Refresh mtime so eviction drops the least recently used entries first
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serialisable value under key."""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            # The directory may have gone since construction, e.g. after a change of working directory
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            tracer.warning('cache_write_failed', directory=self.directory, key=key, error=f"{type(e).__name__}: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self.writes += 1
+            self._writes_since_scan += 1
+            if self._estimated_entries is not None:
+                # Overwrites count as new entries, which only makes the next scan come early
+                self._estimated_entries += 1
+                self._estimated_bytes += size
+            due = (
+                self._estimated_entries is None
+                or self._estimated_entries > self.max_entries
+                or self._estimated_bytes > self.max_bytes
+                or self._writes_since_scan >= EVICT_EVERY_WRITES
+            )
+        if due:
+            self.evict()
+
+    def _scan(self) -> List[os.DirEntry]:
+        """The entry files in the directory; none, with a warning, when it cannot be listed."""
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.name.endswith('.json')]
+        except OSError as e:
+            tracer.warning('cache_scan_failed', directory=self.directory, error=f"{type(e).__name__}: {e}")
+            return []
+
+    def evict(self) -> int:
+        """Drop expired entries, then the oldest ones until within limits (or EVICT_TARGET of them when over)."""
+        now = time.time()
+        entries = []
+        removed = 0
+
+        with self._lock:
+            # A directory that cannot be listed counts as empty, so the next scan waits EVICT_EVERY_WRITES
+            for entry in self._scan():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    removed += self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            max_entries, max_bytes = self.max_entries, self.max_bytes
+            if len(entries) > max_entries or total_bytes > max_bytes:
+                max_entries, max_bytes = int(max_entries * EVICT_TARGET), int(max_bytes * EVICT_TARGET)
+            while entries and (len(entries) > max_entries or total_bytes > max_bytes):
+                _, size, path = entries.pop(0)
+                total_bytes -= size
+                removed += self._remove(path)
+
+            self.evictions += removed
+            self._estimated_entries = len(entries)
+            self._estimated_bytes = total_bytes
+            self._writes_since_scan = 0
+        return removed
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        with self._lock:
+            for entry in self._scan():
+                self._remove(entry.path)
+            self._estimated_entries = 0
+            self._estimated_bytes = 0
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the current size of the cache."""
+        entries = 0
+        total_bytes = 0
+        for entry in self._scan():
+            entries += 1
+            try:
+                total_bytes += entry.stat().st_size
+            except OSError:
+                pass
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total_bytes
+        }
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+
+def corpus_fingerprint(interviews: List[Interview], research_questions: List[str]) -> str:
+    """Hash of the research questions and the statements of ``interviews``, to notice when derived results are stale."""
+    digest = hashlib.sha256()
+    for question in research_questions:
+        digest.update(question.encode('utf-8') + b'\x00')
+    for interview in interviews:
+        digest.update(f"{interview.metadata.get('filename') or interview.interviewee}\x01".encode('utf-8'))
+        for s in interview.statements:
+            digest.update(f"{s.text}\x00{s.type.value}\x00{s.confidence:.2f}\x02".encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+from .llm_backend import make_message
+from .local_batches import LocalBatches
+from .tracing import tracer
+from .usage import usage_to_dict
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def request_key(params: Dict) -> str:
+    """Stable hash of the request parameters that determine the response."""
+    payload = json.dumps(params, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CassetteBackend:
+    """Backend wrapper that records LLM traffic to, or replays it from, a cassette file.
+
+    The cassette is a JSON-lines file with one interaction per line: the
+    request, the response text, usage, stop reason and timing (time to first
+    chunk, chunk offsets and total duration). In ``record`` mode every call is
+    forwarded to ``inner`` and appended to the file. In ``replay`` mode
+    responses are served from the file, matched by request; identical requests
+    are replayed in recorded order. Recorded timing is reproduced multiplied by
+    ``time_scale`` (1.0 original, 0.1 ten times faster, 0 without delays).
+    """
+
+    def __init__(self, path: str, mode: str = 'replay', inner=None, time_scale: float = 1.0):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == 'record' and inner is None:
+            raise ValueError("Recording needs an inner backend")
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, deque] = defaultdict(deque)
+        self.hits = 0
+        self.recorded = 0
+        self._batches = None
+
+        if mode == 'replay':
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions[interaction['key']].append(interaction)
+
+    def _next(self, params: Dict) -> Dict:
+        key = request_key(params)
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.path}")
+            # Keep the last recording available for any further identical requests
+            interaction = recorded.popleft() if len(recorded) > 1 else recorded[0]
+            self.hits += 1
+        return interaction
+
+    def _write(self, params: Dict, message, started: float, chunk_offsets: Optional[List[float]] = None, chunks: Optional[List[str]] = None):
+        duration = time.perf_counter() - started
+        interaction = {
+            'key': request_key(params),
+            'recorded_at': time.time(),
+            'request': params,
+            'response': {
+                'text': message.content[0].text,
+                'model': getattr(message, 'model', None),
+                'stop_reason': getattr(message, 'stop_reason', None),
+                'usage': usage_to_dict(message.usage)
+            },
+            'timing': {
+                'duration': duration,
+                'first_chunk': chunk_offsets[0] if chunk_offsets else duration,
+                'chunk_offsets': chunk_offsets or [],
+                'chunks': chunks or []
+            }
+        }
+        line = json.dumps(interaction, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.recorded += 1
+
+    @staticmethod
+    def _message(interaction: Dict):
+        response = interaction['response']
+        return make_message(response['text'], response['model'], response['usage'], response['stop_reason'])
+
+    @staticmethod
+    def _chunks(interaction: Dict) -> List[str]:
+        chunks = interaction['timing'].get('chunks')
+        return chunks if chunks else [interaction['response']['text']]
+
+    def _chunk_delays(self, interaction: Dict) -> List[float]:
+        """Delay before each chunk, scaled, so replay follows the recorded pace."""
+        timing = interaction['timing']
+        offsets = timing.get('chunk_offsets') or [timing['duration']]
+        delays = [offsets[0]] + [b - a for a, b in zip(offsets, offsets[1:])]
+        return [max(0.0, d * self.time_scale) for d in delays]
+
+    # Synchronous API
+
+    def create(self, **params):
+        if self.mode == 'record':
+            started = time.perf_counter()
+            message = self.inner.create(**params)
+            self._write(params, message, started)
+            return message
+
+        interaction = self._next(params)
+        time.sleep(interaction['timing']['duration'] * self.time_scale)
+        return self._message(interaction)
+
+    def stream(self, **params):
+        return _CassetteStream(self, params)
+
+    # Asynchronous API
+
+    async def acreate(self, **params):
+        if self.mode == 'record':
+            started = time.perf_counter()
+            message = await self.inner.acreate(**params)
+            self._write(params, message, started)
+            return message
+
+        interaction = self._next(params)
+        await asyncio.sleep(interaction['timing']['duration'] * self.time_scale)
+        return self._message(interaction)
+
+    def astream(self, **params):
+        return _CassetteAsyncStream(self, params)
+
+    @property
+    def batches(self):
+        with self._lock:
+            if self._batches is None:
+                self._batches = _RecordingBatches(self) if self.mode == 'record' else _ReplayBatches(self)
+            return self._batches
+
+
+class _RecordingBatches:
+    """``inner.batches`` that records every succeeded request to the cassette when its results are read."""
+
+    def __init__(self, cassette: CassetteBackend):
+        self._cassette = cassette
+        self._inner = cassette.inner.batches
+        self._params: Dict[str, Dict[str, Dict]] = {}  # batch id -> custom id -> request params
+
+    def create(self, requests: List[Dict]):
+        batch = self._inner.create(requests=requests)
+        self._params[batch.id] = {request['custom_id']: request['params'] for request in requests}
+        return batch
+
+    def retrieve(self, batch_id: str):
+        return self._inner.retrieve(batch_id)
+
+    def cancel(self, batch_id: str):
+        return self._inner.cancel(batch_id)
+
+    def results(self, batch_id: str):
+        params = self._params.get(batch_id)
+        if params is None:
+            tracer.warning('cassette_batch_not_recorded', batch_id=batch_id, reason='created outside this cassette')
+        for entry in self._inner.results(batch_id):
+            if params is not None and entry.result.type == 'succeeded' and entry.custom_id in params:
+                # Batches have no per-request timing; replay serves them without delay
+                self._cassette._write(params[entry.custom_id], entry.result.message, time.perf_counter())
+            yield entry
+
+
+class _ReplayBatches(LocalBatches):
+    """Local batches answered from the cassette; unrecorded requests come back as errored."""
+
+    def __init__(self, cassette: CassetteBackend):
+        super().__init__()
+        self._cassette = cassette
+
+    def _message(self, params: Dict):
+        return self._cassette._message(self._cassette._next(params))
+
+
+class _CassetteStream:
+    def __init__(self, cassette: CassetteBackend, params: Dict):
+        self._cassette = cassette
+        self._params = params
+        self._stream = None
+        self._manager = None
+        self._interaction = None
+        self._final = None
+
+    def __enter__(self):
+        if self._cassette.mode == 'record':
+            self._started = time.perf_counter()
+            self._manager = self._cassette.inner.stream(**self._params)
+            self._stream = self._manager.__enter__()
+        else:
+            self._interaction = self._cassette._next(self._params)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def text_stream(self):
+        if self._cassette.mode == 'record':
+            offsets, chunks = [], []
+            for chunk in self._stream.text_stream:
+                offsets.append(time.perf_counter() - self._started)
+                chunks.append(chunk)
+                yield chunk
+            self._final = self._stream.get_final_message()
+            self._cassette._write(self._params, self._final, self._started, offsets, chunks)
+        else:
+            for delay, chunk in zip(self._cassette._chunk_delays(self._interaction), self._cassette._chunks(self._interaction)):
+                time.sleep(delay)
+                yield chunk
+
+    def get_final_message(self):
+        if self._cassette.mode == 'record':
+            if self._final is None:
+                # The text was not streamed, record the response without chunk timing
+                self._final = self._stream.get_final_message()
+                self._cassette._write(self._params, self._final, self._started)
+            return self._final
+        return self._cassette._message(self._interaction)
+
+    def close(self):
+        if self._manager is not None:
+            self._manager.__exit__(None, None, None)
+            self._manager = None
+
+
+class _CassetteAsyncStream:
+    def __init__(self, cassette: CassetteBackend, params: Dict):
+        self._cassette = cassette
+        self._params = params
+        self._stream = None
+        self._manager = None
+        self._interaction = None
+        self._final = None
+
+    async def __aenter__(self):
+        if self._cassette.mode == 'record':
+            self._started = time.perf_counter()
+            self._manager = self._cassette.inner.astream(**self._params)
+            self._stream = await self._manager.__aenter__()
+        else:
+            self._interaction = self._cassette._next(self._params)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    @property
+    async def text_stream(self):
+        if self._cassette.mode == 'record':
+            offsets, chunks = [], []
+            async for chunk in self._stream.text_stream:
+                offsets.append(time.perf_counter() - self._started)
+                chunks.append(chunk)
+                yield chunk
+            self._final = await self._stream.get_final_message()
+            self._cassette._write(self._params, self._final, self._started, offsets, chunks)
+        else:
+            for delay, chunk in zip(self._cassette._chunk_delays(self._interaction), self._cassette._chunks(self._interaction)):
+                await asyncio.sleep(delay)
+                yield chunk
+
+    async def get_final_message(self):
+        if self._cassette.mode == 'record':
+            if self._final is None:
+                self._final = await self._stream.get_final_message()
+                self._cassette._write(self._params, self._final, self._started)
+            return self._final
+        return self._cassette._message(self._interaction)
+
+    async def close(self):
+        if self._manager is not None:
+            await self._manager.__aexit__(None, None, None)
+            self._manager = None
@@ -3,6 +3,7 @@ from typing import Union, BinaryIO
 import docx
 import pdfplumber
 from ..config import ALLOWED_EXTENSIONS, MAX_FILE_SIZE_MB
+from .tracing import tracer
 
 def validate_file(file: Union[str, BinaryIO]) -> bool:
     """Validate if the file is allowed and within size limits."""
@@ -63,14 +64,16 @@ def read_file_content(file: Union[str, BinaryIO]) -> str:
     file_ext = os.path.splitext(file_path)[1].lower()
     
     try:
-        if file_ext == '.txt':
-            content = read_text_file(file_path)
-        elif file_ext in ['.doc', '.docx']:
-            content = read_docx_file(file_path)
-        elif file_ext == '.pdf':
-            content = read_pdf_file(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_ext}")
+        with tracer.span('read', extension=file_ext) as span:
+            if file_ext == '.txt':
+                content = read_text_file(file_path)
+            elif file_ext in ['.doc', '.docx']:
+                content = read_docx_file(file_path)
+            elif file_ext == '.pdf':
+                content = read_pdf_file(file_path)
+            else:
+                raise ValueError(f"Unsupported file type: {file_ext}")
+            span.set(chars=len(content))
         
         # Clean up temp file if needed
         if not isinstance(file, str):
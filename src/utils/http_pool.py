@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+import anthropic
+# The SDK is built on httpx2 and rejects clients and transports from plain httpx
+import httpx2 as httpx
+from ..config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT
+)
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def pool_timeout() -> httpx.Timeout:
+    # Streaming responses can pause between tokens, so the read timeout is per chunk, not per response
+    return httpx.Timeout(
+        connect=HTTP_CONNECT_TIMEOUT,
+        read=HTTP_READ_TIMEOUT,
+        write=HTTP_WRITE_TIMEOUT,
+        pool=HTTP_POOL_TIMEOUT
+    )
+
+
+class PoolStats:
+    """Counters shared by the pooled clients.
+
+    ``requests`` against ``connections_opened`` shows how well keep-alive
+    connections are reused; ``in_flight`` counts requests waiting for their
+    response headers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.clients_created = 0
+            self.requests = 0
+            self.in_flight = 0
+            self.peak_in_flight = 0
+            self.errors = 0
+            self.connections_opened = 0
+            self.tls_handshakes = 0
+            self.status_codes: Dict[int, int] = {}
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self, status_code: Optional[int]):
+        with self._lock:
+            self.in_flight -= 1
+            if status_code is None:
+                self.errors += 1
+            else:
+                self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def connection_event(self, event: str):
+        # httpcore trace events, e.g. 'connection.connect_tcp.complete'
+        if event == 'connection.connect_tcp.complete':
+            self.add('connections_opened')
+        elif event == 'connection.start_tls.complete':
+            self.add('tls_handshakes')
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'clients_created': self.clients_created,
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'errors': self.errors,
+                'connections_opened': self.connections_opened,
+                'tls_handshakes': self.tls_handshakes,
+                'reused_requests': max(0, self.requests - self.connections_opened),
+                'status_codes': dict(self.status_codes)
+            }
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def _trace(self, event: str, info: Dict):
+        self._stats.connection_event(event)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions.setdefault('trace', self._trace)
+        self._stats.request_started()
+        status_code = None
+        try:
+            response = super().handle_request(request)
+            status_code = response.status_code
+            return response
+        finally:
+            self._stats.request_finished(status_code)
+
+    def connections(self) -> Dict:
+        pool_connections = getattr(self._pool, 'connections', [])
+        return {
+            'open': len(pool_connections),
+            'idle': sum(1 for c in pool_connections if c.is_idle())
+        }
+
+
+class _CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def _trace(self, event: str, info: Dict):
+        self._stats.connection_event(event)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions.setdefault('trace', self._trace)
+        self._stats.request_started()
+        status_code = None
+        try:
+            response = await super().handle_async_request(request)
+            status_code = response.status_code
+            return response
+        finally:
+            self._stats.request_finished(status_code)
+
+    def connections(self) -> Dict:
+        pool_connections = getattr(self._pool, 'connections', [])
+        return {
+            'open': len(pool_connections),
+            'idle': sum(1 for c in pool_connections if c.is_idle())
+        }
+
+
+class HttpClientPool:
+    """Lazily created, connection-pooled httpx clients shared by every API client.
+
+    One synchronous client is created on first use with the limits and
+    timeouts from the config, so all processors and Streamlit sessions reuse
+    the same keep-alive connections instead of opening new TLS connections
+    per client. An async client is bound to the event loop it first runs on,
+    so there is one per loop; it goes away with its loop.
+    """
+
+    def __init__(self, limits: Optional[httpx.Limits] = None, timeout: Optional[httpx.Timeout] = None):
+        self.limits = limits or pool_limits()
+        self.timeout = timeout or pool_timeout()
+        self.stats = PoolStats()
+        self._client: Optional[httpx.Client] = None
+        self._transport = None
+        # event loop -> (async client, its transport)
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._transport = _CountingTransport(self.stats, limits=self.limits)
+                self._client = anthropic.DefaultHttpxClient(transport=self._transport, timeout=self.timeout)
+                self.stats.add('clients_created')
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The async client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_clients:
+                transport = _CountingAsyncTransport(self.stats, limits=self.limits)
+                client = anthropic.DefaultAsyncHttpxClient(transport=transport, timeout=self.timeout)
+                self._async_clients[loop] = (client, transport)
+                self.stats.add('clients_created')
+            return self._async_clients[loop][0]
+
+    def statistics(self) -> Dict:
+        """Request counters plus the open and idle connections of each client."""
+        snapshot = self.stats.snapshot()
+        with self._lock:
+            snapshot['sync_connections'] = self._transport.connections() if self._transport else None
+            async_connections = [transport.connections() for _, transport in self._async_clients.values()]
+            snapshot['async_connections'] = {
+                'open': sum(c['open'] for c in async_connections),
+                'idle': sum(c['idle'] for c in async_connections)
+            } if async_connections else None
+        snapshot['max_connections'] = self.limits.max_connections
+        snapshot['max_keepalive_connections'] = self.limits.max_keepalive_connections
+        return snapshot
+
+    def close(self):
+        """Close the synchronous client; the next use creates a new one."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._transport = None
+
+
+# Shared by every AnthropicBackend
+http_pool = HttpClientPool()
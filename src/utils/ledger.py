@@ -0,0 +1,196 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from ..config import (
+    LEDGER_DIR, MODEL_PRICES, CACHE_WRITE_PRICE_FACTOR, CACHE_READ_PRICE_FACTOR, BATCH_PRICE_FACTOR
+)
+from .usage import USAGE_FIELDS, usage_to_dict
+from .tracing import tracer
+
+# Interview filename, analysis version, ... that calls made in this context belong to
+_links: contextvars.ContextVar = contextvars.ContextVar('ledger_links', default={})
+# Parameters of UsageLedger.record that track fills itself
+_RESERVED_DETAILS = ('self', 'stage', 'model', 'latency')
+
+
+@contextmanager
+def link(**links):
+    """Attach links (e.g. ``interview=filename`` or ``analysis_version=filename``) to calls made inside the block.
+
+    Links are context variables, so they follow work into thread pools that
+    copy the context (see ``tracer.wrap``).
+    """
+    token = _links.set({**_links.get(), **{k: v for k, v in links.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _links.reset(token)
+
+
+def call_cost(model: str, usage: Dict[str, int], batch: bool = False) -> Optional[float]:
+    """Estimated cost in USD of one call, or None for a model without known prices."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, output_price = (price / 1_000_000 for price in prices)
+    cost = (
+        usage.get('input_tokens', 0) * input_price
+        + usage.get('cache_creation_input_tokens', 0) * input_price * CACHE_WRITE_PRICE_FACTOR
+        + usage.get('cache_read_input_tokens', 0) * input_price * CACHE_READ_PRICE_FACTOR
+        + usage.get('output_tokens', 0) * output_price
+    )
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+
+class UsageLedger:
+    """Append-only record of every LLM call, one JSON-lines file per day.
+
+    Each entry holds the stage, model, token counts, latency, stop reason and
+    estimated cost of a call, plus the links active when it was made.
+    """
+
+    def __init__(self, directory: str = LEDGER_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory, f"usage_{day}.jsonl")
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        usage,
+        latency: Optional[float] = None,
+        stop_reason: Optional[str] = None,
+        batch: bool = False,
+        **details
+    ) -> Dict:
+        """Append one call. ``usage`` may be an API usage object or a dict of token counts."""
+        tokens = usage if isinstance(usage, dict) else usage_to_dict(usage)
+        now = datetime.now()
+        entry = {
+            'timestamp': now.isoformat(),
+            'stage': stage,
+            'model': model,
+            **{field: tokens.get(field, 0) for field in USAGE_FIELDS},
+            'latency': latency,
+            'stop_reason': stop_reason,
+            'batch': batch,
+            'cost': call_cost(model, tokens, batch),
+            **_links.get(),
+            **{k: v for k, v in details.items() if v is not None}
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(now.strftime('%Y%m%d')), 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+        except OSError:
+            # Losing a ledger line must never fail the call it describes
+            tracer.warning('ledger_write_failed', stage=stage, model=model)
+        return entry
+
+    @contextmanager
+    def track(self, stage: str, model: str, **details):
+        """Time the call made inside the block and record it, also when it fails.
+
+        The block sets the outcome on the yielded dict: ``usage`` and
+        optionally ``stop_reason`` or extra details.
+        """
+        call = {}
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            # Also covers streams abandoned by their consumer (GeneratorExit)
+            self._record_call(stage, model, start, {**details, **call, 'error': f"{type(e).__name__}: {e}"})
+            raise
+        self._record_call(stage, model, start, {**details, **call})
+
+    def _record_call(self, stage: str, model: str, start: float, details: Dict) -> None:
+        usage = details.pop('usage', None) or {}
+        # Keys the block set that clash with the positional parameters of record are dropped
+        for key in _RESERVED_DETAILS:
+            details.pop(key, None)
+        self.record(stage, model, usage, time.perf_counter() - start, **details)
+
+    def entries(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Load entries, optionally limited to days ``since``/``until`` (YYYY-MM-DD, inclusive)."""
+        if not os.path.isdir(self.directory):
+            return []
+        since = since.replace('-', '') if since else None
+        until = until.replace('-', '') if until else None
+        entries = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not (filename.startswith('usage_') and filename.endswith('.jsonl')):
+                continue
+            day = filename[len('usage_'):-len('.jsonl')]
+            if (since and day < since) or (until and day > until):
+                continue
+            with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+        return entries
+
+
+def _group_key(entry: Dict, by: str) -> str:
+    if by == 'day':
+        return entry['timestamp'][:10]
+    if by == 'interview':
+        return entry.get('interview') or entry.get('interviewee') or '(geen interview)'
+    if by == 'analysis_version':
+        return entry.get('analysis_version') or '(geen versie)'
+    return str(entry.get(by) or '(onbekend)')
+
+
+def summarize_ledger(entries: Iterable[Dict], by: str = 'stage') -> Dict[str, Dict]:
+    """Totals per group (``stage``, ``day``, ``interview``, ``model``, ``analysis_version``).
+
+    Every group gets the call count, token sums, estimated cost, total and
+    p95 latency and the output throughput in tokens per second of call time.
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for entry in entries:
+        groups.setdefault(_group_key(entry, by), []).append(entry)
+
+    summary = {}
+    for key, group in sorted(groups.items()):
+        latencies = sorted(e['latency'] for e in group if e.get('latency') is not None)
+        total_latency = sum(latencies)
+        output_timed = sum(e['output_tokens'] for e in group if e.get('latency') is not None)
+        summary[key] = {
+            'calls': len(group),
+            **{field: sum(e.get(field, 0) for e in group) for field in USAGE_FIELDS},
+            'cost': sum(e.get('cost') or 0 for e in group),
+            'latency_total': total_latency,
+            'latency_p95': latencies[max(1, math.ceil(0.95 * len(latencies))) - 1] if latencies else None,
+            'output_tokens_per_second': output_timed / total_latency if total_latency else None,
+            'errors': sum(1 for e in group if e.get('error'))
+        }
+    return summary
+
+
+# Shared by every processor
+ledger = UsageLedger()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise the LLM usage ledger")
+    parser.add_argument("--by", default="stage", choices=["stage", "day", "interview", "model", "analysis_version"])
+    parser.add_argument("--since", help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD")
+    args = parser.parse_args()
+
+    print(f"{args.by:<40} {'calls':>6} {'input':>10} {'output':>9} {'cache rd':>10} {'cost $':>9} {'latency s':>10}")
+    for key, row in summarize_ledger(ledger.entries(args.since, args.until), args.by).items():
+        print(f"{key[:40]:<40} {row['calls']:>6} {row['input_tokens']:>10} {row['output_tokens']:>9} "
+              f"{row['cache_read_input_tokens']:>10} {row['cost']:>9.4f} {row['latency_total']:>10.1f}")
@@ -0,0 +1,332 @@
+import asyncio
+import random
+import re
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Protocol
+import anthropic
+import httpx2 as httpx
+from ..config import (
+    ANTHROPIC_API_KEY, LLM_BACKEND, LLM_CASSETTE, LLM_CASSETTE_MODE, LLM_CASSETTE_TIME_SCALE, CHARS_PER_TOKEN
+)
+from .http_pool import HttpClientPool, http_pool
+
+
+class LLMBackend(Protocol):
+    """What the processors need from a language model provider.
+
+    Parameters are those of the Anthropic messages API; responses expose
+    ``content[0].text``, ``usage`` and ``stop_reason``. ``stream`` returns a
+    context manager whose value has ``text_stream``, ``get_final_message()``
+    and ``close()``; ``astream`` is its async counterpart.
+    """
+
+    def create(self, **params): ...
+
+    def stream(self, **params): ...
+
+    async def acreate(self, **params): ...
+
+    def astream(self, **params): ...
+
+    @property
+    def batches(self): ...
+
+
+class AnthropicBackend:
+    """Backend that talks to the Anthropic API.
+
+    Clients are created on first use and send their requests through the
+    shared HTTP connection pool, so keep-alive connections are reused across
+    processors and Streamlit sessions.
+    """
+
+    def __init__(self, api_key: Optional[str] = ANTHROPIC_API_KEY, pool: Optional[HttpClientPool] = None):
+        self.api_key = api_key
+        self.pool = pool or http_pool
+        self._client = None
+        # event loop -> async client, as the pool's async HTTP clients are per loop
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> anthropic.Anthropic:
+        with self._lock:
+            if self._client is None:
+                # Retries are handled by the shared scheduler
+                self._client = anthropic.Anthropic(
+                    api_key=self.api_key, max_retries=0, timeout=self.pool.timeout, http_client=self.pool.client
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> anthropic.AsyncAnthropic:
+        """The async client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_clients:
+                self._async_clients[loop] = anthropic.AsyncAnthropic(
+                    api_key=self.api_key, max_retries=0, timeout=self.pool.timeout, http_client=self.pool.async_client
+                )
+            return self._async_clients[loop]
+
+    def create(self, **params):
+        return self.client.messages.create(**params)
+
+    def stream(self, **params):
+        return self.client.messages.stream(**params)
+
+    async def acreate(self, **params):
+        return await self.async_client.messages.create(**params)
+
+    def astream(self, **params):
+        return self.async_client.messages.stream(**params)
+
+    @property
+    def batches(self):
+        return self.client.messages.batches
+
+
+def make_message(text: str, model: Optional[str] = None, usage: Optional[Dict] = None, stop_reason: str = 'end_turn'):
+    """Build a response object shaped like an API message from plain values."""
+    usage = usage or {}
+    return SimpleNamespace(
+        id='msg_local',
+        model=model,
+        role='assistant',
+        content=[SimpleNamespace(type='text', text=text)],
+        stop_reason=stop_reason,
+        usage=SimpleNamespace(
+            input_tokens=usage.get('input_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0),
+            cache_creation_input_tokens=usage.get('cache_creation_input_tokens', 0),
+            cache_read_input_tokens=usage.get('cache_read_input_tokens', 0)
+        )
+    )
+
+
+def _request_text(params: Dict) -> str:
+    content = params['messages'][-1]['content']
+    if isinstance(content, list):
+        content = '\n'.join(block['text'] for block in content)
+    return content
+
+
+def fake_extraction_response(params: Dict) -> str:
+    """Deterministic TYPE/TEKST/ZEKERHEID output for an extraction request."""
+    content = _request_text(params)
+
+    name_match = re.search(r'Naam geïnterviewde: (.+)', content)
+    interviewee = name_match.group(1).strip() if name_match else "De geïnterviewde"
+    segment = content.split(':\n', 1)[-1] if 'Interview segment met' in content else content
+
+    blocks = []
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', segment) if len(s.strip()) > 10]
+    for i, sentence in enumerate(sentences):
+        statement_type = ('zegt', 'denkt', 'voelt', 'doet')[i % 4]
+        sentence = sentence.rstrip('.!?')
+        blocks.append(
+            f"TYPE: {statement_type}\n"
+            f"TEKST: {interviewee} {statement_type} {sentence[0].lower()}{sentence[1:]}\n"
+            f"ZEKERHEID: {1.0 - (i % 5) / 10:.1f}"
+        )
+    return '\n\n'.join(blocks)
+
+
+def fake_response(params: Dict) -> str:
+    """Deterministic answer for any request the processors send."""
+    content = _request_text(params)
+    if 'Naam geïnterviewde:' in content:
+        return fake_extraction_response(params)
+
+    statements = [line for line in content.split('\n') if line.startswith('- ') or '(Betrouwbaarheid' in line]
+    questions = re.findall(r'^- (.+\?)\s*$', content, flags=re.M)
+    lines = ["## Samenvatting", f"Er zijn {len(statements)} statements bekeken.", ""]
+    for question in questions or ["Algemene analyse"]:
+        lines += [f"## {question}", f"- {statements[0].lstrip('- ') if statements else 'Geen statements'}", ""]
+    return '\n'.join(lines)
+
+
+class _FakeStream:
+    """Synchronous stream over a fake response."""
+
+    def __init__(self, backend: 'FakeBackend', params: Dict):
+        self._backend = backend
+        self._params = params
+        self._message = None
+
+    def __enter__(self):
+        self._backend._maybe_fail()
+        time.sleep(self._backend.latency)
+        self._message = self._backend._message(self._params)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        for token in self._backend._tokens(self._message.content[0].text):
+            if self._backend.tokens_per_second:
+                time.sleep(1.0 / self._backend.tokens_per_second)
+            yield token
+
+    def get_final_message(self):
+        return self._message
+
+    def close(self):
+        pass
+
+
+class _FakeAsyncStream:
+    """Asynchronous stream over a fake response."""
+
+    def __init__(self, backend: 'FakeBackend', params: Dict):
+        self._backend = backend
+        self._params = params
+        self._message = None
+
+    async def __aenter__(self):
+        self._backend._maybe_fail()
+        await asyncio.sleep(self._backend.latency)
+        self._message = self._backend._message(self._params)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        for token in self._backend._tokens(self._message.content[0].text):
+            if self._backend.tokens_per_second:
+                await asyncio.sleep(1.0 / self._backend.tokens_per_second)
+            yield token
+
+    async def get_final_message(self):
+        return self._message
+
+    async def close(self):
+        pass
+
+
+class FakeBackend:
+    """In-process backend producing well-formed output without network access.
+
+    ``latency`` is the time to first token in seconds, ``tokens_per_second``
+    the output throughput (None for instant output) and ``failure_rate`` the
+    share of calls that raise a retryable API error (429 or 529). Responses
+    are deterministic for a given request; failures are reproducible with
+    ``seed``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tokens_per_second: Optional[float] = None,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        responder: Callable[[Dict], str] = fake_response
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.responder = responder
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._batches = None
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+            status = self._random.choice([429, 529])
+        if not fail:
+            return
+        response = httpx.Response(
+            status,
+            headers={'retry-after': '0'},
+            request=httpx.Request('POST', 'https://fake.invalid/v1/messages')
+        )
+        if status == 429:
+            raise anthropic.RateLimitError("injected rate limit", response=response, body=None)
+        raise anthropic.OverloadedError("injected overload", response=response, body=None)
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        size = max(1, int(CHARS_PER_TOKEN))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _message(self, params: Dict):
+        text = self.responder(params)
+        prompt_chars = len(str(params.get('system', ''))) + len(str(params.get('messages', '')))
+        return make_message(
+            text,
+            model=params.get('model'),
+            usage={
+                'input_tokens': int(prompt_chars / CHARS_PER_TOKEN),
+                'output_tokens': len(self._tokens(text))
+            }
+        )
+
+    def _generation_time(self, message) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return message.usage.output_tokens / self.tokens_per_second
+
+    def create(self, **params):
+        self._maybe_fail()
+        message = self._message(params)
+        time.sleep(self.latency + self._generation_time(message))
+        return message
+
+    def stream(self, **params):
+        return _FakeStream(self, params)
+
+    async def acreate(self, **params):
+        self._maybe_fail()
+        message = self._message(params)
+        await asyncio.sleep(self.latency + self._generation_time(message))
+        return message
+
+    def astream(self, **params):
+        return _FakeAsyncStream(self, params)
+
+    @property
+    def batches(self):
+        from .local_batches import LocalBatches
+        with self._lock:
+            if self._batches is None:
+                self._batches = LocalBatches(responder=self.responder, latency=self.latency)
+            return self._batches
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LLMBackend:
+    """Return the backend shared by all processors.
+
+    LLM_BACKEND selects the default backend; with LLM_CASSETTE set it is
+    wrapped in a CassetteBackend that records to or replays from that file.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = FakeBackend() if LLM_BACKEND == 'fake' else AnthropicBackend()
+            if LLM_CASSETTE:
+                from .cassette import CassetteBackend
+                inner = _backend if LLM_CASSETTE_MODE == 'record' else None
+                _backend = CassetteBackend(LLM_CASSETTE, LLM_CASSETTE_MODE, inner, LLM_CASSETTE_TIME_SCALE)
+        return _backend
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """Replace the shared backend, e.g. with a FakeBackend for benchmarks."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional
+from .llm_backend import fake_response
+
+
+class LocalBatches:
+    """In-process stand-in for ``client.messages.batches``.
+
+    Implements ``create``, ``retrieve``, ``results`` and ``cancel`` with the same
+    shapes as the Message Batches API, answering every request with
+    ``responder(params)`` after ``latency`` seconds. Requests fail with
+    probability ``failure_rate``, so error handling can be exercised offline.
+    """
+
+    def __init__(
+        self,
+        responder: Callable[[Dict], str] = fake_response,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.responder = responder
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._batches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, requests: List[Dict]):
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex[:16]}"
+        batch = {
+            'id': batch_id,
+            'requests': list(requests),
+            'results': {},
+            'status': 'in_progress',
+            'created_at': time.time()
+        }
+        with self._lock:
+            self._batches[batch_id] = batch
+        threading.Thread(target=self._process, args=(batch,), daemon=True).start()
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id: str):
+        with self._lock:
+            batch = self._batches[batch_id]
+            counts = {'processing': 0, 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+            for request in batch['requests']:
+                result = batch['results'].get(request['custom_id'])
+                counts[result.type if result else 'processing'] += 1
+            return SimpleNamespace(
+                id=batch_id,
+                type='message_batch',
+                processing_status=batch['status'],
+                request_counts=SimpleNamespace(**counts)
+            )
+
+    def results(self, batch_id: str) -> Iterator:
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch['status'] != 'ended':
+                raise RuntimeError(f"Batch {batch_id} is still {batch['status']}")
+            results = [
+                SimpleNamespace(custom_id=request['custom_id'], result=batch['results'][request['custom_id']])
+                for request in batch['requests']
+            ]
+        return iter(results)
+
+    def cancel(self, batch_id: str):
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch['status'] == 'in_progress':
+                batch['status'] = 'canceling'
+        return self.retrieve(batch_id)
+
+    def _message(self, params: Dict):
+        """Response message for one request of a batch."""
+        text = self.responder(params)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            stop_reason='end_turn',
+            usage=SimpleNamespace(
+                input_tokens=len(str(params)) // 4,
+                output_tokens=len(text) // 4,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0
+            )
+        )
+
+    def _process(self, batch: Dict):
+        time.sleep(self.latency)
+        for request in batch['requests']:
+            with self._lock:
+                canceled = batch['status'] == 'canceling'
+            if canceled:
+                result = SimpleNamespace(type='canceled')
+            elif self._random.random() < self.failure_rate:
+                result = SimpleNamespace(
+                    type='errored',
+                    error=SimpleNamespace(type='api_error', message='injected failure')
+                )
+            else:
+                try:
+                    result = SimpleNamespace(type='succeeded', message=self._message(request['params']))
+                except Exception as e:
+                    result = SimpleNamespace(
+                        type='errored',
+                        error=SimpleNamespace(type='api_error', message=f"{type(e).__name__}: {e}")
+                    )
+            with self._lock:
+                batch['results'][request['custom_id']] = result
+        with self._lock:
+            batch['status'] = 'ended'
@@ -0,0 +1,244 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import anthropic
+from ..config import (
+    API_REQUESTS_PER_MINUTE, API_INPUT_TOKENS_PER_MINUTE, API_OUTPUT_TOKENS_PER_MINUTE,
+    API_MAX_RETRIES, API_RETRY_BASE_DELAY, API_RETRY_MAX_DELAY, API_OUTPUT_TOKEN_ESTIMATE,
+    CHARS_PER_TOKEN
+)
+from .tracing import tracer
+
+# Lower numbers are served first when calls have to wait for capacity
+PRIORITY_INTERACTIVE = 0  # chat replies
+PRIORITY_ANALYSIS = 1  # research question analysis
+PRIORITY_EXTRACTION = 2  # statement extraction from transcripts
+
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    anthropic.OverloadedError,  # 529; not an InternalServerError subclass
+    anthropic.APIConnectionError
+)
+
+
+class TokenBucket:
+    """Token bucket that refills ``per_minute`` units evenly over a minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+def estimate_request_tokens(params: Dict) -> int:
+    """Estimate the input tokens of a messages API request."""
+    payload = json.dumps([params.get('system', ''), params.get('messages', [])], ensure_ascii=False)
+    return int(len(payload) / CHARS_PER_TOKEN) + 1
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the server's retry-after hint from an API error, if any."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+class RequestScheduler:
+    """Shared rate limiter and retry scheduler for all Anthropic calls.
+
+    Every call first waits until the request, input-token and output-token
+    buckets have room; waiting calls are served by priority, then in arrival
+    order. Rate limit, overload and connection errors are retried with
+    jittered exponential backoff, never sooner than the server's retry-after.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = API_REQUESTS_PER_MINUTE,
+        input_tokens_per_minute: float = API_INPUT_TOKENS_PER_MINUTE,
+        output_tokens_per_minute: float = API_OUTPUT_TOKENS_PER_MINUTE,
+        max_retries: int = API_MAX_RETRIES,
+        base_delay: float = API_RETRY_BASE_DELAY,
+        max_delay: float = API_RETRY_MAX_DELAY
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counters = {
+            'calls': 0,
+            'throttled': 0,
+            'throttle_seconds': 0.0,
+            'retried': 0,
+            'rate_limited': 0,
+            'failed': 0
+        }
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def acquire(self, priority: int, input_tokens: int, output_tokens: int):
+        """Block until capacity is available for a call, respecting priority."""
+        ticket = (priority, next(self._sequence))
+        throttled = False
+        start = time.monotonic()
+
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.input_tokens.wait_time(input_tokens, now),
+                    self.output_tokens.wait_time(output_tokens, now)
+                )
+                if self._waiting[0] == ticket and wait <= 0:
+                    break
+                throttled = True
+                # Re-check when capacity should be free, or when the queue changes
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.input_tokens.take(input_tokens)
+            self.output_tokens.take(output_tokens)
+            self.counters['calls'] += 1
+            if throttled:
+                self.counters['throttled'] += 1
+                self.counters['throttle_seconds'] += time.monotonic() - start
+            self._condition.notify_all()
+
+    def reconcile(self, reserved_output_tokens: int, usage) -> None:
+        """Correct the output-token bucket once the real usage of a call is known.
+
+        ``usage`` None means the call failed or was abandoned before its usage
+        was known; the whole reservation is given back.
+        """
+        actual = 0 if usage is None else getattr(usage, 'output_tokens', None)
+        if actual is None:
+            return
+        with self._condition:
+            if actual < reserved_output_tokens:
+                self.output_tokens.give_back(reserved_output_tokens - actual)
+            else:
+                self.output_tokens.take(actual - reserved_output_tokens)
+            self._condition.notify_all()
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: int = PRIORITY_EXTRACTION,
+        input_tokens: int = 0,
+        output_tokens: int = API_OUTPUT_TOKEN_ESTIMATE
+    ) -> Any:
+        """Run ``fn`` within the rate limits, retrying transient API errors."""
+        attempt = 0
+        while True:
+            self.acquire(priority, input_tokens, output_tokens)
+            try:
+                result = fn()
+            except RETRYABLE_ERRORS as e:
+                self.reconcile(output_tokens, None)
+                retry_after = _retry_after(e)
+                if isinstance(e, anthropic.RateLimitError):
+                    with self._condition:
+                        self.counters['rate_limited'] += 1
+                        if retry_after:
+                            # Hold back every caller, not just this one
+                            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+                if attempt >= self.max_retries:
+                    with self._condition:
+                        self.counters['failed'] += 1
+                    raise
+
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(backoff, retry_after or 0)
+                attempt += 1
+                with self._condition:
+                    self.counters['retried'] += 1
+                tracer.warning('api_retry', error=type(e).__name__, attempt=attempt, max_retries=self.max_retries, delay=round(delay, 2))
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.reconcile(output_tokens, None)
+                with self._condition:
+                    self.counters['failed'] += 1
+                raise
+
+            if hasattr(result, 'usage'):
+                self.reconcile(output_tokens, result.usage)
+            return result
+
+    def create_message(self, backend, params: Dict, priority: int = PRIORITY_EXTRACTION):
+        """``backend.create(**params)`` through the scheduler."""
+        output_tokens = min(params.get('max_tokens', API_OUTPUT_TOKEN_ESTIMATE), API_OUTPUT_TOKEN_ESTIMATE)
+        return self.call(
+            lambda: backend.create(**params),
+            priority,
+            estimate_request_tokens(params),
+            output_tokens
+        )
+
+    def open_stream(self, backend, params: Dict, priority: int = PRIORITY_EXTRACTION):
+        """Open ``backend.stream(**params)`` through the scheduler.
+
+        Only opening the stream is retried; the caller iterates the returned
+        stream, closes it and passes the final usage to ``reconcile``, or None
+        when the stream failed or was abandoned.
+        """
+        output_tokens = min(params.get('max_tokens', API_OUTPUT_TOKEN_ESTIMATE), API_OUTPUT_TOKEN_ESTIMATE)
+        return self.call(
+            lambda: backend.stream(**params).__enter__(),
+            priority,
+            estimate_request_tokens(params),
+            output_tokens
+        ), output_tokens
+
+    def stats(self) -> Dict:
+        """Return the throttling and retry counters."""
+        with self._condition:
+            stats = dict(self.counters)
+            stats['waiting'] = len(self._waiting)
+        return stats
+
+
+# Shared by every processor so all calls count against the same limits
+scheduler = RequestScheduler()
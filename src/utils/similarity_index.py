@@ -0,0 +1,244 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from ..config import (
+    SIMILARITY_HASH_FEATURES, SIMILARITY_LSH_TABLES, SIMILARITY_LSH_BITS, SIMILARITY_LSH_PROBES,
+    SIMILARITY_EXACT_BELOW, SIMILARITY_TOP_K
+)
+from ..processors.text_processor import dutch_terms
+from .statement_index import COMPACT_FRACTION, StatementIndex, statement_index
+from .tracing import DEBUG, tracer
+
+# Hashed features are folded onto this many hyperplane rows, which keeps the dense projection small
+_PROJECTION_FEATURES = 1 << 14
+
+
+def statement_features(text: str) -> List[str]:
+    """Stemmed content words plus consecutive word pairs, so word order counts a little."""
+    terms = dutch_terms(text)
+    return terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+
+
+class SimilarityIndex:
+    """Approximate nearest-neighbour search over statement vectors.
+
+    Statements become l2-normalised hashed vectors of their stems and stem
+    pairs, so no vocabulary has to be fitted and statements can be added and
+    removed one interview at a time. Random hyperplanes (``tables`` groups of
+    ``bits``) hash every vector into one bucket per table; a query only scores
+    the statements sharing a bucket with it, plus ``probes`` neighbouring
+    buckets per table, by exact cosine similarity. Corpora smaller than
+    ``exact_below`` are scored exhaustively.
+
+    The index is built from ``source`` on first use and kept up to date by
+    ``update_interview``/``remove_interview`` from storage. Removed
+    statements leave a gap in the doc ids until more than COMPACT_FRACTION of
+    them are gaps; then the statements are renumbered.
+    """
+
+    def __init__(
+        self,
+        source: StatementIndex = statement_index,
+        n_features: int = SIMILARITY_HASH_FEATURES,
+        tables: int = SIMILARITY_LSH_TABLES,
+        bits: int = SIMILARITY_LSH_BITS,
+        probes: int = SIMILARITY_LSH_PROBES,
+        exact_below: int = SIMILARITY_EXACT_BELOW,
+        seed: int = 0
+    ):
+        self.source = source
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes
+        self.exact_below = exact_below
+        self._vectorizer = HashingVectorizer(
+            analyzer=statement_features, n_features=n_features, alternate_sign=False, norm='l2', dtype=np.float32
+        )
+        rng = np.random.default_rng(seed)
+        self._hyperplanes = rng.standard_normal((_PROJECTION_FEATURES, tables * bits)).astype(np.float32)
+        self._bit_values = 1 << np.arange(bits, dtype=np.int64)
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        # doc id -> (filename, statement index, interviewee, type, confidence, text) or None once removed
+        self._docs: List[Optional[tuple]] = []
+        # filename -> doc ids, vectors and bucket keys of its statements
+        self._chunks: Dict[str, Tuple[np.ndarray, sp.csr_matrix, np.ndarray]] = {}
+        self._buckets: List[Dict[int, set]] = [{} for _ in range(self.tables)]
+        self._live = 0
+        # All vectors stacked for scoring, rebuilt on the first query after a change
+        self._matrix: Optional[sp.csr_matrix] = None
+        self._row_of: Optional[np.ndarray] = None
+        self._file_of: Optional[np.ndarray] = None  # row -> position of its interview in _chunks
+
+    def _signatures(self, vectors: sp.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Projections onto the hyperplanes and the resulting bucket key per table."""
+        folded = sp.csr_matrix(
+            (vectors.data, vectors.indices % _PROJECTION_FEATURES, vectors.indptr),
+            shape=(vectors.shape[0], _PROJECTION_FEATURES)
+        )
+        projected = folded @ self._hyperplanes
+        signs = (projected > 0).reshape(len(projected), self.tables, self.bits)
+        return projected, signs @ self._bit_values
+
+    def _add(self, filename: str, rows: List[tuple]):
+        if not rows:
+            return
+        vectors = self._vectorizer.transform([text for *_, text in rows])
+        _, keys = self._signatures(vectors)
+        doc_ids = np.arange(len(self._docs), len(self._docs) + len(rows))
+        for index, (interviewee, statement_type, confidence, text) in enumerate(rows):
+            self._docs.append((filename, index, interviewee, statement_type, confidence, text))
+
+        # Statements without a single content word cannot be similar to anything
+        has_features = np.diff(vectors.indptr) > 0
+        for table, buckets in enumerate(self._buckets):
+            for doc_id, key in zip(doc_ids[has_features].tolist(), keys[has_features, table].tolist()):
+                buckets.setdefault(key, set()).add(doc_id)
+        self._chunks[filename] = (doc_ids, vectors, keys)
+        self._live += len(rows)
+        self._matrix = None
+
+    def _remove(self, filename: str):
+        chunk = self._chunks.pop(filename, None)
+        if chunk is None:
+            return
+        doc_ids, _, keys = chunk
+        for table, buckets in enumerate(self._buckets):
+            for doc_id, key in zip(doc_ids.tolist(), keys[:, table].tolist()):
+                bucket = buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del buckets[key]
+        for doc_id in doc_ids.tolist():
+            self._docs[doc_id] = None
+        self._live -= len(doc_ids)
+        self._matrix = None
+        if len(self._docs) - self._live > COMPACT_FRACTION * len(self._docs):
+            self._compact()
+
+    def _compact(self):
+        """Renumber the statements without the gaps left by removed ones; relative order is kept."""
+        new_ids = np.cumsum([doc is not None for doc in self._docs]) - 1
+        self._docs = [doc for doc in self._docs if doc is not None]
+        self._chunks = {
+            filename: (new_ids[doc_ids], vectors, keys) for filename, (doc_ids, vectors, keys) in self._chunks.items()
+        }
+        self._buckets = [
+            {key: {int(new_ids[doc_id]) for doc_id in bucket} for key, bucket in buckets.items()}
+            for buckets in self._buckets
+        ]
+
+    def update_interview(self, filename: str, interviewee: str, statements: Iterable) -> None:
+        """Replace the statements of one interview."""
+        with self._lock:
+            if self._loaded:
+                self._remove(filename)
+                self._add(filename, [(interviewee, s.type.value, s.confidence, s.text) for s in statements])
+
+    def remove_interview(self, filename: str) -> None:
+        with self._lock:
+            if self._loaded:
+                self._remove(filename)
+
+    def load(self) -> None:
+        """Vectorise every statement of the source index."""
+        with self._lock, tracer.span('similarity_load') as span:
+            self._reset()
+            for filename, rows in self.source.interviews().items():
+                self._add(filename, rows)
+            self._loaded = True
+            span.set(statements=self._live, buckets=sum(len(b) for b in self._buckets))
+
+    def _stacked(self) -> Tuple[sp.csr_matrix, np.ndarray]:
+        if self._matrix is None:
+            chunks = list(self._chunks.values())
+            doc_ids = np.concatenate([ids for ids, _, _ in chunks]) if chunks else np.empty(0, np.int64)
+            self._matrix = sp.vstack([vectors for _, vectors, _ in chunks], format='csr') if chunks else None
+            self._row_of = np.full(len(self._docs), -1, dtype=np.int64)
+            self._row_of[doc_ids] = np.arange(len(doc_ids))
+            self._file_of = np.repeat(np.arange(len(chunks)), [len(ids) for ids, _, _ in chunks])
+        return self._matrix, self._row_of
+
+    def _candidates(self, query: sp.csr_matrix) -> np.ndarray:
+        """Doc ids sharing a bucket with the query in any table, including the probed neighbours."""
+        projected, keys = self._signatures(query)
+        # Bits whose projection is closest to zero are the likeliest to differ for a near neighbour
+        margins = np.abs(projected[0]).reshape(self.tables, self.bits)
+        candidates = set()
+        for table, buckets in enumerate(self._buckets):
+            key = int(keys[0, table])
+            for probe in [key] + [key ^ (1 << int(b)) for b in np.argsort(margins[table])[:self.probes]]:
+                candidates.update(buckets.get(probe, ()))
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    def similar(
+        self,
+        text: str,
+        top_k: int = SIMILARITY_TOP_K,
+        filenames: Optional[Iterable[str]] = None,
+        exclude: Optional[Tuple[str, int]] = None,
+        min_score: float = 0.0
+    ) -> List[Dict]:
+        """The ``top_k`` statements most similar to ``text``, best first.
+
+        ``exclude`` is the (filename, statement index) of the statement the
+        query came from. Hits have the same fields as ``StatementIndex.search``
+        with the cosine similarity as ``score``.
+        """
+        query = self._vectorizer.transform([text])
+        if not query.nnz:
+            return []
+        filenames = set(filenames) if filenames is not None else None
+
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            with tracer.span('similar', level=DEBUG, statements=self._live) as span:
+                matrix, row_of = self._stacked()
+                if matrix is None:
+                    return []
+                exact = self._live < self.exact_below
+                dense_query = query.toarray().ravel()
+                if exact:
+                    doc_ids = np.flatnonzero(row_of >= 0)
+                    scores = (matrix @ dense_query)[row_of[doc_ids]]
+                else:
+                    doc_ids = self._candidates(query)
+                    scores = matrix[row_of[doc_ids]] @ dense_query
+                keep = np.ones(len(doc_ids), dtype=bool)
+                if filenames is not None:
+                    allowed = [i for i, filename in enumerate(self._chunks) if filename in filenames]
+                    keep &= np.isin(self._file_of[row_of[doc_ids]], allowed)
+                if exclude is not None and exclude[0] in self._chunks:
+                    chunk_ids = self._chunks[exclude[0]][0]
+                    if exclude[1] < len(chunk_ids):
+                        keep &= doc_ids != chunk_ids[exclude[1]]
+                doc_ids, scores = doc_ids[keep], scores[keep]
+                span.set(exact=exact, candidates=len(doc_ids))
+
+                best = np.argsort(-scores, kind='stable')[:top_k]
+                hits = []
+                for i in best:
+                    if scores[i] <= min_score:
+                        break
+                    filename, index, interviewee, statement_type, confidence, text = self._docs[doc_ids[i]]
+                    hits.append({
+                        'filename': filename,
+                        'interviewee': interviewee,
+                        'statement': index,
+                        'text': text,
+                        'type': statement_type,
+                        'confidence': confidence,
+                        'score': float(scores[i])
+                    })
+                return hits
+
+
+# Kept in step with the statement index by storage
+similarity_index = SimilarityIndex()
@@ -0,0 +1,410 @@
+import bisect
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from ..config import DATA_DIR, INDEX_DIR
+from ..processors.text_processor import dutch_terms, dutch_words, stem_dutch
+from ..processors.relevance import bm25_weight
+from .tracing import DEBUG, tracer
+
+# Bump whenever the analysis of statement text changes so shards are rebuilt
+INDEX_VERSION = 1
+MAX_PREFIX_TERMS = 200  # terms a prefix query expands to at most
+COMPACT_FRACTION = 0.25  # removed documents, as a fraction of all doc ids, that trigger renumbering
+_POSITION_RANGE = 1 << 20  # phrase keys combine doc id and word position as doc * range + position
+
+_QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def parse_query(query: str) -> List[Tuple[str, object]]:
+    """Split a query into clauses that must all match.
+
+    ``"de app werkt"`` is a phrase, ``gebruik*`` a prefix and every other
+    content word a single term; stopwords are ignored.
+    """
+    clauses = []
+    for phrase, word in _QUERY_PATTERN.findall(query):
+        if phrase:
+            terms = dutch_terms(phrase)
+            if len(terms) > 1:
+                clauses.append(('phrase', terms))
+            elif terms:
+                clauses.append(('term', terms[0]))
+        elif word.endswith('*') and len(word) > 1:
+            prefix = ''.join(dutch_words(word[:-1]))
+            if prefix:
+                clauses.append(('prefix', prefix))
+        else:
+            clauses.extend(('term', term) for term in dutch_terms(word))
+    return clauses
+
+
+class StatementIndex:
+    """Persistent inverted index over the statements of all saved interviews.
+
+    Statement text is normalised (lowercase, accents removed), stopwords are
+    dropped and the remaining words are reduced to their Dutch Snowball stem.
+    Postings keep word positions, so quoted phrases match consecutive words.
+    Every interview has its own shard file in ``directory``, written by
+    ``update_interview`` and removed by ``remove_interview``; on first use the
+    shards are loaded and brought in line with the interview files. With
+    ``directory`` None the index lives in memory only and holds just what is
+    passed to ``update_interview``.
+
+    Removed statements leave a gap in the doc ids until more than
+    COMPACT_FRACTION of them are gaps; then the documents are renumbered.
+    """
+
+    def __init__(self, directory: Optional[str] = INDEX_DIR, data_dir: str = DATA_DIR):
+        self.directory = directory
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        self._reset()
+        self._loaded = directory is None
+
+    def _reset(self):
+        # doc id -> (filename, statement index, interviewee, type, confidence, text, length) or None once removed
+        self._docs: List[Optional[tuple]] = []
+        self._doc_terms: List[Optional[Set[str]]] = []
+        self._postings: Dict[str, Dict[int, List[int]]] = {}
+        self._by_interview: Dict[str, List[int]] = {}
+        self._live = 0
+        self._total_length = 0
+        self._vocabulary: Optional[List[str]] = None
+        # Query-time arrays, built lazily and dropped when the statements they cover change
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._doc_arrays: Optional[Dict[str, np.ndarray]] = None
+        self._codes: Dict[str, Dict[str, int]] = {'type': {}, 'interviewee': {}, 'filename': {}}
+
+    # Shards
+
+    def _shard_path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _write_shard(self, filename: str, interviewee: str, rows: List[list], source_mtime: Optional[float]):
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._shard_path(filename)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        shard = {
+            'version': INDEX_VERSION,
+            'filename': filename,
+            'interviewee': interviewee,
+            'source_mtime': source_mtime,
+            'statements': rows
+        }
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(shard, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            tracer.warning('index_write_failed', filename=filename, error=f"{type(e).__name__}: {e}")
+
+    def _source_mtime(self, filename: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(os.path.join(self.data_dir, filename))
+        except OSError:
+            return None
+
+    # In-memory postings
+
+    def _add_rows(self, filename: str, interviewee: str, rows: List[list]):
+        self._doc_arrays = None
+        doc_ids = []
+        for index, (text, statement_type, confidence, terms) in enumerate(rows):
+            doc_id = len(self._docs)
+            self._docs.append((filename, index, interviewee, statement_type, confidence, text, len(terms)))
+            self._doc_terms.append(set(terms))
+            for position, term in enumerate(terms):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._vocabulary = None
+                postings.setdefault(doc_id, []).append(position)
+                self._term_arrays.pop(term, None)
+            self._live += 1
+            self._total_length += len(terms)
+            doc_ids.append(doc_id)
+        self._by_interview[filename] = doc_ids
+
+    def _remove_docs(self, filename: str):
+        self._doc_arrays = None
+        for doc_id in self._by_interview.pop(filename, []):
+            for term in self._doc_terms[doc_id]:
+                self._term_arrays.pop(term, None)
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary = None
+            self._live -= 1
+            self._total_length -= self._docs[doc_id][6]
+            self._docs[doc_id] = None
+            self._doc_terms[doc_id] = None
+        if len(self._docs) - self._live > COMPACT_FRACTION * len(self._docs):
+            self._compact()
+
+    def _compact(self):
+        """Renumber the documents without the gaps left by removed ones; relative order is kept."""
+        new_ids = np.cumsum([doc is not None for doc in self._docs]) - 1
+        self._docs = [doc for doc in self._docs if doc is not None]
+        self._doc_terms = [terms for terms in self._doc_terms if terms is not None]
+        self._postings = {
+            term: {int(new_ids[doc_id]): positions for doc_id, positions in postings.items()}
+            for term, postings in self._postings.items()
+        }
+        self._by_interview = {
+            filename: [int(new_ids[doc_id]) for doc_id in doc_ids] for filename, doc_ids in self._by_interview.items()
+        }
+        self._term_arrays = {}
+        self._doc_arrays = None
+
+    # Maintenance
+
+    def update_interview(self, filename: str, interviewee: str, statements: Iterable) -> None:
+        """(Re)index the statements of one interview and write its shard."""
+        rows = [
+            [s.text, s.type.value, s.confidence, dutch_terms(s.text)]
+            for s in statements
+        ]
+        with self._lock:
+            self._write_shard(filename, interviewee, rows, self._source_mtime(filename))
+            if self._loaded:
+                self._remove_docs(filename)
+                self._add_rows(filename, interviewee, rows)
+
+    def remove_interview(self, filename: str) -> None:
+        """Drop an interview from the index and delete its shard."""
+        with self._lock:
+            if self.directory is not None:
+                try:
+                    os.remove(self._shard_path(filename))
+                except OSError:
+                    pass
+            if self._loaded:
+                self._remove_docs(filename)
+
+    def _index_file(self, filename: str) -> Optional[Tuple[str, List[list]]]:
+        """Analyse the statements of an interview file that has no up-to-date shard."""
+        try:
+            with open(os.path.join(self.data_dir, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(key in data for key in ['interviewee', 'statements']):
+            return None
+        rows = [
+            [s['text'], s['type'], s['confidence'], dutch_terms(s['text'])]
+            for s in data['statements']
+        ]
+        self._write_shard(filename, data['interviewee'], rows, self._source_mtime(filename))
+        return data['interviewee'], rows
+
+    def load(self) -> None:
+        """Load the shards, reindexing interview files that changed outside ``save_interview``."""
+        if self.directory is None:
+            return
+        with self._lock, tracer.span('index_load') as span:
+            self._reset()
+            os.makedirs(self.directory, exist_ok=True)
+            with os.scandir(self.data_dir) as entries:
+                interview_files = {
+                    entry.name for entry in entries
+                    if entry.is_file() and entry.name.endswith('.json') and not entry.name.startswith('analysis_')
+                }
+
+            loaded = rebuilt = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json'):
+                    continue
+                if entry.name not in interview_files:
+                    os.remove(entry.path)
+                    continue
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        shard = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if shard.get('version') != INDEX_VERSION or shard.get('source_mtime') != self._source_mtime(entry.name):
+                    continue
+                self._add_rows(entry.name, shard['interviewee'], shard['statements'])
+                loaded += 1
+
+            for filename in sorted(interview_files - set(self._by_interview)):
+                indexed = self._index_file(filename)
+                if indexed is not None:
+                    self._add_rows(filename, *indexed)
+                    rebuilt += 1
+
+            self._loaded = True
+            span.set(shards=loaded, reindexed=rebuilt, statements=self._live, terms=len(self._postings))
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    # Queries
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        terms = []
+        # The stem of a complete word can be shorter than the word ('kosten' -> 'kost')
+        for start in {prefix, stem_dutch(prefix)}:
+            i = bisect.bisect_left(self._vocabulary, start)
+            while i < len(self._vocabulary) and self._vocabulary[i].startswith(start) and len(terms) < MAX_PREFIX_TERMS:
+                terms.append(self._vocabulary[i])
+                i += 1
+        return list(dict.fromkeys(terms))
+
+    def _term(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sorted doc ids, term frequencies and phrase keys (doc * range + position) of a term."""
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term, {})
+            doc_ids = np.fromiter(sorted(postings), dtype=np.int64, count=len(postings))
+            frequencies = np.array([len(postings[d]) for d in doc_ids], dtype=np.float64)
+            keys = np.array(
+                [d * _POSITION_RANGE + p for d in doc_ids for p in postings[d]], dtype=np.int64
+            )
+            arrays = self._term_arrays[term] = (doc_ids, frequencies, keys)
+        return arrays
+
+    def _phrase(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # Shift the keys of the n-th word back by n, so a phrase start is a key shared by all words
+        starts = self._term(terms[0])[2]
+        for offset, term in enumerate(terms[1:], 1):
+            starts = np.intersect1d(starts, self._term(term)[2] - offset, assume_unique=True)
+        doc_ids, counts = np.unique(starts // _POSITION_RANGE, return_counts=True)
+        return doc_ids, counts.astype(np.float64)
+
+    def _clause_units(self, clause: Tuple[str, object]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(doc ids, term frequencies) for each scored unit of a clause."""
+        kind, value = clause
+        if kind == 'term':
+            return [self._term(value)[:2]]
+        if kind == 'prefix':
+            return [self._term(term)[:2] for term in self._prefix_terms(value)]
+        return [self._phrase(value)]
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        """Per-document lengths, confidences and codes for filtering, indexed by doc id."""
+        if self._doc_arrays is None:
+            columns = {'length': [], 'confidence': [], 'type': [], 'interviewee': [], 'filename': []}
+            for doc in self._docs:
+                if doc is None:
+                    doc = (None, 0, None, None, np.nan, None, 0)
+                filename, _, interviewee, statement_type, confidence, _, length = doc
+                columns['length'].append(length)
+                columns['confidence'].append(confidence)
+                for name, value in [('type', statement_type), ('interviewee', interviewee), ('filename', filename)]:
+                    columns[name].append(self._codes[name].setdefault(value, len(self._codes[name])))
+            self._doc_arrays = {
+                'length': np.array(columns['length'], dtype=np.float64),
+                'confidence': np.array(columns['confidence'], dtype=np.float64),
+                'type': np.array(columns['type'], dtype=np.int64),
+                'interviewee': np.array(columns['interviewee'], dtype=np.int64),
+                'filename': np.array(columns['filename'], dtype=np.int64)
+            }
+        return self._doc_arrays
+
+    def search(
+        self,
+        query: str,
+        types: Optional[Iterable[str]] = None,
+        interviewees: Optional[Iterable[str]] = None,
+        filenames: Optional[Iterable[str]] = None,
+        min_confidence: Optional[float] = None,
+        max_confidence: Optional[float] = None,
+        limit: Optional[int] = 50
+    ) -> List[Dict]:
+        """Statements matching every clause of ``query``, best BM25 score first.
+
+        ``types`` holds StatementType values ('denkt', 'voelt', ...). Each hit
+        has the interview ``filename``, ``interviewee``, ``statement`` index,
+        ``text``, ``type``, ``confidence`` and ``score``.
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        with self._lock:
+            self._ensure_loaded()
+            with tracer.span('search', level=DEBUG, clauses=len(clauses)) as span:
+                units = [self._clause_units(clause) for clause in clauses]
+                # A document must match every clause (any term of a prefix), rarest clause first
+                matching = None
+                for clause_units in sorted(units, key=lambda u: sum(len(ids) for ids, _ in u)):
+                    docs = np.unique(np.concatenate([ids for ids, _ in clause_units])) if clause_units else np.empty(0, np.int64)
+                    matching = docs if matching is None else np.intersect1d(matching, docs, assume_unique=True)
+                    if not len(matching):
+                        return []
+
+                arrays = self._arrays()
+                keep = np.ones(len(matching), dtype=bool)
+                for name, values in [('type', types), ('interviewee', interviewees), ('filename', filenames)]:
+                    if values is not None and (name == 'filename' or values):
+                        codes = [self._codes[name][v] for v in set(values) if v in self._codes[name]]
+                        keep &= np.isin(arrays[name][matching], codes)
+                if min_confidence is not None:
+                    keep &= arrays['confidence'][matching] >= min_confidence
+                if max_confidence is not None:
+                    keep &= arrays['confidence'][matching] <= max_confidence
+                matching = matching[keep]
+
+                # BM25 over all scored units, with the length normalisation of each document
+                average_length = self._total_length / self._live if self._live else 1.0
+                lengths = arrays['length'][matching]
+                scores = np.zeros(len(matching))
+                for clause_units in units:
+                    for doc_ids, frequencies in clause_units:
+                        if not len(doc_ids):
+                            continue
+                        positions = np.minimum(np.searchsorted(doc_ids, matching), len(doc_ids) - 1)
+                        tf = np.where(doc_ids[positions] == matching, frequencies[positions], 0.0)
+                        scores += bm25_weight(tf, len(doc_ids), self._live, lengths, average_length)
+
+                # Best first, ties in corpus order
+                order = np.lexsort((matching, -scores))
+                if limit:
+                    order = order[:limit]
+                hits = []
+                for i in order:
+                    filename, index, interviewee, statement_type, confidence, text, _ = self._docs[matching[i]]
+                    hits.append({
+                        'filename': filename,
+                        'interviewee': interviewee,
+                        'statement': index,
+                        'text': text,
+                        'type': statement_type,
+                        'confidence': confidence,
+                        'score': float(scores[i])
+                    })
+                span.set(matches=len(matching))
+                return hits
+
+    def interviews(self) -> Dict[str, List[tuple]]:
+        """The indexed statements per interview file as (interviewee, type, confidence, text) tuples."""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                filename: [self._docs[doc_id][2:6] for doc_id in doc_ids]
+                for filename, doc_ids in self._by_interview.items()
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'interviews': len(self._by_interview),
+                'statements': self._live,
+                'terms': len(self._postings)
+            }
+
+
+# Shared by storage (incremental updates) and the search functions
+statement_index = StatementIndex()
@@ -2,8 +2,46 @@ import json
 import os
 from datetime import datetime
 from typing import List, Dict, Optional
-from ..models import Interview, Statement, StatementType
+from ..models import Analysis, Interview, Statement, StatementType
 from ..config import DATA_DIR
+from .tracing import tracer
+from .statement_index import statement_index
+from .similarity_index import similarity_index
+
+def statement_to_dict(statement: Statement) -> Dict:
+    """Convert a statement to its JSON-serialisable form."""
+    return {
+        'text': statement.text,
+        'type': statement.type.value,
+        'source_text': statement.source_text,
+        'confidence': statement.confidence,
+        'metadata': statement.metadata
+    }
+
+def statement_from_dict(data: Dict) -> Statement:
+    """Rebuild a statement from its JSON-serialisable form."""
+    return Statement(
+        text=data['text'],
+        type=StatementType(data['type']),
+        source_text=data['source_text'],
+        confidence=data['confidence'],
+        metadata=data.get('metadata', {})
+    )
+
+def analysis_to_dict(analysis: Analysis) -> Dict:
+    """Convert a local analysis to its JSON-serialisable form; interviews are referenced by filename."""
+    return {
+        'interviews': [i.metadata.get('filename') for i in analysis.interviews],
+        'themes': analysis.themes,
+        'patterns': analysis.patterns,
+        'sentiment_scores': analysis.sentiment_scores,
+        'conclusions': analysis.conclusions,
+        'metadata': analysis.metadata
+    }
+
+def generate_interview_filename(interviewee: str) -> str:
+    """Generate a unique interview filename (microseconds avoid collisions)."""
+    return f"{interviewee.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
 
 def save_interview(interview: Interview) -> bool:
     """Save interview to local storage."""
@@ -16,16 +54,7 @@ def save_interview(interview: Interview) -> bool:
             'interviewee': interview.interviewee,
             'date': datetime.now().isoformat(),
             'raw_text': interview.raw_text,
-            'statements': [
-                {
-                    'text': s.text,
-                    'type': s.type.value,
-                    'source_text': s.source_text,
-                    'confidence': s.confidence,
-                    'metadata': s.metadata
-                }
-                for s in interview.statements
-            ],
+            'statements': [statement_to_dict(s) for s in interview.statements],
             'metadata': interview.metadata,
             'ready_for_analysis': interview.metadata.get('ready_for_analysis', False)
         }
@@ -34,16 +63,26 @@ def save_interview(interview: Interview) -> bool:
         filename = interview.metadata.get('filename') or f"{interview.interviewee}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         filepath = os.path.join(DATA_DIR, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(interview_data, f, ensure_ascii=False, indent=2)
+        with tracer.span('save', kind='interview', filename=filename, statements=len(interview.statements)) as span:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(interview_data, f, ensure_ascii=False, indent=2)
+            span.set(bytes=os.path.getsize(filepath))
+        
+        # Keep the search indexes in step with the stored statements
+        statement_index.update_interview(filename, interview.interviewee, interview.statements)
+        similarity_index.update_interview(filename, interview.interviewee, interview.statements)
         
         return True
     
     except Exception as e:
-        print(f"Error saving interview: {str(e)}")
+        tracer.error('save_failed', kind='interview', interviewee=interview.interviewee, error=f"{type(e).__name__}: {e}")
         return False
 
-def save_analysis_version(analysis_text: str, questions: List[str], metadata: Dict) -> str:
+def generate_analysis_version_filename() -> str:
+    """Generate a unique analysis version filename, so LLM calls can be linked to it before it is saved."""
+    return f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+
+def save_analysis_version(analysis_text: str, questions: List[str], metadata: Dict, filename: Optional[str] = None) -> str:
     """Save a version of the analysis and return its filename."""
     try:
         # Create versions directory
@@ -60,17 +99,18 @@ def save_analysis_version(analysis_text: str, questions: List[str], metadata: Di
         }
         
         # Generate filename
-        filename = f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = filename or generate_analysis_version_filename()
         filepath = os.path.join(versions_dir, filename)
         
         # Save version
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(version_data, f, ensure_ascii=False, indent=2)
+        with tracer.span('save', kind='analysis_version', filename=filename, chars=len(analysis_text)):
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(version_data, f, ensure_ascii=False, indent=2)
         
         return filename
     
     except Exception as e:
-        print(f"Error saving analysis version: {str(e)}")
+        tracer.error('save_failed', kind='analysis_version', error=f"{type(e).__name__}: {e}")
         return None
 
 def load_analysis_versions() -> List[Dict]:
@@ -98,7 +138,7 @@ def load_analysis_versions() -> List[Dict]:
         return versions
     
     except Exception as e:
-        print(f"Error loading analysis versions: {str(e)}")
+        tracer.error('reload_failed', kind='analysis_versions', error=f"{type(e).__name__}: {e}")
         return versions
 
 def get_latest_analysis_version() -> Optional[Dict]:
@@ -114,113 +154,85 @@ def load_interviews() -> List[Interview]:
         if not os.path.exists(DATA_DIR):
             return interviews
         
-        # Only process files in the root directory, not in subdirectories
-        for filename in [f for f in os.listdir(DATA_DIR) if os.path.isfile(os.path.join(DATA_DIR, f))]:
-            if not filename.endswith('.json') or filename.startswith('analysis_'):
-                continue
-            
-            filepath = os.path.join(DATA_DIR, filename)
+        with tracer.span('reload', kind='interviews') as span:
+            # Only process files in the root directory, not in subdirectories
+            with os.scandir(DATA_DIR) as entries:
+                filenames = [entry.name for entry in entries if entry.is_file()]
             
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Verify this is an interview file by checking required fields
-                if not all(key in data for key in ['interviewee', 'statements']):
+            for filename in filenames:
+                if not filename.endswith('.json') or filename.startswith('analysis_'):
                     continue
                 
-                # Convert statements back to objects
-                statements = [
-                    Statement(
-                        text=s['text'],
-                        type=StatementType(s['type']),
-                        source_text=s['source_text'],
-                        confidence=s['confidence'],
-                        metadata=s.get('metadata', {})
-                    )
-                    for s in data['statements']
-                ]
-                
-                # Create interview object
-                interview = Interview(
-                    interviewee=data['interviewee'],
-                    date=datetime.fromisoformat(data['date']),
-                    raw_text=data['raw_text'],
-                    statements=statements,
-                    metadata=data.get('metadata', {})
-                )
-                
-                # Add filename to metadata for deletion
-                interview.metadata['filename'] = filename
-                interview.metadata['ready_for_analysis'] = data.get('ready_for_analysis', False)
+                filepath = os.path.join(DATA_DIR, filename)
                 
-                interviews.append(interview)
-            except Exception as e:
-                print(f"Error loading interview {filename}: {str(e)}")
-                continue
+                try:
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    
+                    # Verify this is an interview file by checking required fields
+                    if not all(key in data for key in ['interviewee', 'statements']):
+                        continue
+                    
+                    # Convert statements back to objects
+                    statements = [statement_from_dict(s) for s in data['statements']]
+                    
+                    # Create interview object
+                    interview = Interview(
+                        interviewee=data['interviewee'],
+                        date=datetime.fromisoformat(data['date']),
+                        raw_text=data['raw_text'],
+                        statements=statements,
+                        metadata=data.get('metadata', {})
+                    )
+                    
+                    # Add filename to metadata for deletion
+                    interview.metadata['filename'] = filename
+                    interview.metadata['ready_for_analysis'] = data.get('ready_for_analysis', False)
+                    
+                    interviews.append(interview)
+                except Exception as e:
+                    tracer.warning('reload_skipped', filename=filename, error=f"{type(e).__name__}: {e}")
+                    continue
+            
+            span.set(files=len(filenames), interviews=len(interviews), statements=sum(len(i.statements) for i in interviews))
         
         return interviews
     
     except Exception as e:
-        print(f"Error loading interviews: {str(e)}")
+        tracer.error('reload_failed', kind='interviews', error=f"{type(e).__name__}: {e}")
         return interviews
 
 def delete_interview(filename: str) -> bool:
     """Delete an interview file from local storage."""
-    try:
-        print(f"\n=== Starting deletion process for: {filename} ===")
-        
-        # Get full path
+    with tracer.span('delete', filename=filename) as span:
         filepath = os.path.join(DATA_DIR, filename)
-        print(f"Full filepath: {filepath}")
-        print(f"DATA_DIR exists: {os.path.exists(DATA_DIR)}")
-        print(f"Current files in DATA_DIR: {os.listdir(DATA_DIR)}")
         
         # Safety checks
-        if not os.path.exists(filepath):
-            print(f"❌ File not found: {filepath}")
+        if not filename.endswith('.json') or filename.startswith('analysis_'):
+            tracer.warning('delete_refused', filename=filename, reason='not an interview file')
             return False
         
         if not os.path.isfile(filepath):
-            print(f"❌ Not a file: {filepath}")
-            return False
-            
-        if not filename.endswith('.json') or filename.startswith('analysis_'):
-            print(f"❌ Not an interview file: {filepath}")
+            tracer.warning('delete_refused', filename=filename, reason='file not found')
             return False
         
         try:
             # Verify it's an interview file by checking its contents
-            print("Reading file contents...")
             with open(filepath, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                if not all(key in data for key in ['interviewee', 'statements']):
-                    print(f"❌ Not a valid interview file: {filepath}")
-                    print(f"Found keys: {list(data.keys())}")
-                    return False
-                print("✓ Valid interview file format")
+            if not all(key in data for key in ['interviewee', 'statements']):
+                tracer.warning('delete_refused', filename=filename, reason='not a valid interview file', keys=list(data.keys()))
+                return False
+            
+            os.remove(filepath)
+            statement_index.remove_interview(filename)
+            similarity_index.remove_interview(filename)
         except Exception as e:
-            print(f"❌ Error verifying interview file: {str(e)}")
+            tracer.error('delete_failed', filename=filename, error=f"{type(e).__name__}: {e}")
             return False
         
-        # Remove file
-        print(f"Attempting to remove file: {filepath}")
-        os.remove(filepath)
-        
-        # Verify file is gone
-        if os.path.exists(filepath):
-            print(f"❌ File still exists after deletion attempt: {filepath}")
-            return False
-            
-        print(f"✓ Successfully deleted interview file: {filepath}")
-        print(f"Remaining files in DATA_DIR: {os.listdir(DATA_DIR)}")
+        span.set(deleted=True)
         return True
-    
-    except Exception as e:
-        print(f"❌ Error in delete_interview: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        return False
 
 def mark_for_analysis(filename: str, ready: bool = True) -> bool:
     """Mark or unmark an interview as ready for analysis."""
@@ -243,5 +255,5 @@ def mark_for_analysis(filename: str, ready: bool = True) -> bool:
         return True
     
     except Exception as e:
-        print(f"Error updating interview: {str(e)}")
+        tracer.error('save_failed', kind='ready_flag', filename=filename, error=f"{type(e).__name__}: {e}")
         return False 
\ No newline at end of file
@@ -0,0 +1,283 @@
+import contextvars
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from ..config import TRACE_LEVEL, TRACE_CONSOLE_LEVEL, TRACE_FILE
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR', OFF: 'OFF'}
+
+
+def parse_level(level) -> int:
+    """Accept a level number or name ('debug', 'INFO', 'off', ...)."""
+    if isinstance(level, int):
+        return level
+    for number, name in LEVEL_NAMES.items():
+        if name == str(level).upper():
+            return number
+    raise ValueError(f"Unknown trace level: {level}")
+
+
+class JsonLinesSink:
+    """Append every record as one JSON object per line."""
+
+    def __init__(self, path: str, level=DEBUG):
+        self.path = path
+        self.level = parse_level(level)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class ConsoleSink:
+    """Short human-readable lines on stderr."""
+
+    def __init__(self, level=WARNING, stream=None):
+        self.level = parse_level(level)
+        self.stream = stream or sys.stderr
+
+    def write(self, record: Dict):
+        attrs = ' '.join(f"{key}={value}" for key, value in record['attrs'].items())
+        duration = f" {record['duration_ms']:.1f}ms" if 'duration_ms' in record else ""
+        self.stream.write(f"[{record['level']}] {record['name']}{duration} {attrs}\n")
+
+
+class MemorySink:
+    """Keep the most recent records in memory, e.g. for benchmarks."""
+
+    def __init__(self, level=DEBUG, max_records: int = 100000):
+        self.level = parse_level(level)
+        self.records = deque(maxlen=max_records)
+
+    def write(self, record: Dict):
+        self.records.append(record)
+
+
+class Span:
+    """A timed, named unit of work. Attributes can be added while it runs."""
+
+    __slots__ = ('tracer', 'name', 'level', 'attrs', 'span_id', 'parent_id', 'start', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, level: int, attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.level = level
+        self.attrs = attrs
+        self.span_id = None
+        self.parent_id = None
+        self.start = 0.0
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount=1):
+        """Increment a numeric attribute."""
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = next(self.tracer._ids)
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        _current_span.reset(self._token)
+        record = self.tracer._record('span', self.name, self.level, self.attrs)
+        record.update(span_id=self.span_id, parent_id=self.parent_id, duration_ms=duration_ms)
+        if exc_type is not None:
+            record['status'] = 'error'
+            record['error'] = f"{exc_type.__name__}: {exc}"
+        else:
+            record['status'] = 'ok'
+        self.tracer._emit(record, self.level)
+        return False
+
+
+class _NoopSpan:
+    """Returned when a span's level is disabled; every method does nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key: str, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """Named spans and events with levels, written to one or more sinks.
+
+    A span or event below the lowest sink level costs one comparison and
+    returns a shared no-op object, so instrumentation can stay in hot paths.
+    Spans nest per thread (and per context, see ``wrap``) and record their
+    duration, status and attributes such as token usage or statement counts.
+    """
+
+    def __init__(self, sinks: Optional[List] = None):
+        self._ids = itertools.count(1)
+        self.sinks = []
+        self.level = OFF
+        for sink in sinks or []:
+            self.add_sink(sink)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self.level = min(s.level for s in self.sinks)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+        self.level = min((s.level for s in self.sinks), default=OFF)
+
+    def enabled(self, level: int = INFO) -> bool:
+        return level >= self.level
+
+    def span(self, name: str, level: int = INFO, **attrs):
+        if level < self.level:
+            return _NOOP_SPAN
+        return Span(self, name, level, attrs)
+
+    def event(self, name: str, level: int = INFO, **attrs):
+        if level < self.level:
+            return
+        parent = _current_span.get()
+        record = self._record('event', name, level, attrs)
+        record['parent_id'] = parent.span_id if parent is not None else None
+        self._emit(record, level)
+
+    def debug(self, name: str, **attrs):
+        self.event(name, DEBUG, **attrs)
+
+    def info(self, name: str, **attrs):
+        self.event(name, INFO, **attrs)
+
+    def warning(self, name: str, **attrs):
+        self.event(name, WARNING, **attrs)
+
+    def error(self, name: str, **attrs):
+        self.event(name, ERROR, **attrs)
+
+    @staticmethod
+    def wrap(fn):
+        """Bind ``fn`` to the current span so work in a thread pool nests under it."""
+        context = contextvars.copy_context()
+        # A context can only be entered by one thread at a time, so each call runs in its own copy
+        return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+    @staticmethod
+    def _record(kind: str, name: str, level: int, attrs: Dict) -> Dict:
+        return {
+            'ts': time.time(),
+            'type': kind,
+            'name': name,
+            'level': LEVEL_NAMES.get(level, str(level)),
+            'thread': threading.current_thread().name,
+            'attrs': attrs
+        }
+
+    def _emit(self, record: Dict, level: int):
+        for sink in self.sinks:
+            if level >= sink.level:
+                try:
+                    sink.write(record)
+                except Exception:
+                    pass  # tracing must never break the traced code
+
+
+def read_trace(path: str) -> List[Dict]:
+    """Load the records of a JSON-lines trace file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_spans(records: Iterable[Dict]) -> Dict[str, Dict]:
+    """Aggregate spans per name: counts, errors, duration percentiles and summed numeric attributes."""
+    durations: Dict[str, List[float]] = {}
+    summary: Dict[str, Dict] = {}
+    for record in records:
+        if record.get('type') != 'span':
+            continue
+        name = record['name']
+        entry = summary.setdefault(name, {'count': 0, 'errors': 0, 'totals': {}})
+        entry['count'] += 1
+        entry['errors'] += record.get('status') == 'error'
+        durations.setdefault(name, []).append(record['duration_ms'])
+        for key, value in record.get('attrs', {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                entry['totals'][key] = entry['totals'].get(key, 0) + value
+
+    for name, values in durations.items():
+        values.sort()
+        summary[name].update(
+            total_ms=sum(values),
+            mean_ms=statistics.fmean(values),
+            p50_ms=_percentile(values, 0.5),
+            p95_ms=_percentile(values, 0.95),
+            max_ms=values[-1]
+        )
+    return summary
+
+
+def _default_sinks() -> List:
+    sinks = []
+    if parse_level(TRACE_CONSOLE_LEVEL) < OFF:
+        sinks.append(ConsoleSink(TRACE_CONSOLE_LEVEL))
+    if TRACE_FILE and parse_level(TRACE_LEVEL) < OFF:
+        sinks.append(JsonLinesSink(TRACE_FILE, TRACE_LEVEL))
+    return sinks
+
+
+# Shared by every processor; configured through TRACE_LEVEL, TRACE_FILE and TRACE_CONSOLE_LEVEL
+tracer = Tracer(_default_sinks())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise a JSON-lines trace file per span name")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    print(f"{'span':<20} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total s':>9}  totals")
+    for name, entry in sorted(summarize_spans(read_trace(args.path)).items()):
+        totals = ', '.join(f"{key}={value:g}" for key, value in sorted(entry['totals'].items()))
+        print(f"{name:<20} {entry['count']:>7} {entry['errors']:>6} {entry['p50_ms']:>9.1f} "
+              f"{entry['p95_ms']:>9.1f} {entry['max_ms']:>9.1f} {entry['total_ms'] / 1000:>9.2f}  {totals}")
@@ -0,0 +1,25 @@
+from typing import Dict, List
+
+# Token counters reported by the messages API for every call
+USAGE_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_creation_input_tokens',
+    'cache_read_input_tokens'
+)
+
+def usage_to_dict(usage) -> Dict[str, int]:
+    """Convert an API usage object to a plain dict of token counts."""
+    return {field: getattr(usage, field, 0) or 0 for field in USAGE_FIELDS}
+
+def summarize_usage(records: List[Dict]) -> Dict:
+    """Sum token counts over calls and compute the share of input read from the prompt cache."""
+    summary = {field: sum(r.get(field, 0) for r in records) for field in USAGE_FIELDS}
+    summary['calls'] = len(records)
+    total_input = (
+        summary['input_tokens']
+        + summary['cache_creation_input_tokens']
+        + summary['cache_read_input_tokens']
+    )
+    summary['cache_read_ratio'] = summary['cache_read_input_tokens'] / total_input if total_input else 0.0
+    return summary
@@ -0,0 +1,68 @@
+"""Shared fixtures: every test runs offline against the FakeBackend.
+
+Calls go through an unthrottled RequestScheduler, and the ledger and the
+caches write to the test's temporary directory instead of ``data/``.
+"""
+from typing import Dict, List
+
+import pytest
+
+from src.models import Interview, Statement, StatementType
+from src.processors import ai_processor, analysis_processor, themes
+from src.utils import llm_backend
+from src.utils.cache import DiskCache
+from src.utils.ledger import ledger
+from src.utils.llm_backend import FakeBackend
+from src.utils.rate_limiter import RequestScheduler
+
+
+class RecordingBackend(FakeBackend):
+    """FakeBackend that keeps the parameters of every request it answers."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests: List[Dict] = []
+
+    def _message(self, params: Dict):
+        with self._lock:
+            self.requests.append(params)
+        return super()._message(params)
+
+    def request_texts(self) -> List[str]:
+        """The user message of every request, its content blocks joined."""
+        return [llm_backend._request_text(params) for params in self.requests]
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    scheduler = RequestScheduler(1e9, 1e12, 1e12, base_delay=0.01, max_delay=0.01)
+    for module in (ai_processor, analysis_processor, themes):
+        monkeypatch.setattr(module, 'scheduler', scheduler)
+    monkeypatch.setattr(ledger, 'directory', str(tmp_path / 'ledger'))
+    monkeypatch.setattr(ai_processor, 'segment_cache', DiskCache(str(tmp_path / 'segments')))
+    monkeypatch.setattr(analysis_processor, 'partial_cache', DiskCache(str(tmp_path / 'analysis')))
+    monkeypatch.setattr(llm_backend, '_backend', FakeBackend())
+
+
+@pytest.fixture
+def fake_backend(monkeypatch) -> RecordingBackend:
+    """The backend every processor uses during the test."""
+    backend = RecordingBackend()
+    monkeypatch.setattr(llm_backend, '_backend', backend)
+    return backend
+
+
+@pytest.fixture
+def make_interview():
+    """Build an Interview from (text, type value, confidence) tuples or plain texts."""
+    def make(interviewee: str, statements: List, filename: str = None) -> Interview:
+        built = []
+        for statement in statements:
+            text, statement_type, confidence = (statement, 'zegt', 0.8) if isinstance(statement, str) else statement
+            built.append(Statement(text=text, type=StatementType(statement_type), source_text=text, confidence=confidence))
+        return Interview(
+            interviewee=interviewee,
+            statements=built,
+            metadata={'filename': filename or f"interview_{interviewee.lower()}.json"}
+        )
+    return make
@@ -0,0 +1,72 @@
+from src.processors.duplicates import collapse_near_duplicates, duplicate_interview_groups, find_duplicate_interviews
+
+
+def test_near_duplicates_across_interviews_are_collapsed(make_interview):
+    erik = make_interview("Erik", [
+        ("De app is erg makkelijk in gebruik voor nieuwe medewerkers", 'denkt', 0.7),
+        ("Ik werk het liefst vanuit huis op dinsdag", 'doet', 0.9),
+    ])
+    sanne = make_interview("Sanne", [
+        ("De app is erg makkelijk in gebruik voor nieuwe medewerkers!", 'denkt', 0.9),
+        ("De kosten van het abonnement zijn te hoog", 'voelt', 0.6),
+    ])
+
+    collapsed = collapse_near_duplicates([erik, sanne])
+
+    assert collapsed['statements_before'] == 4
+    assert collapsed['statements_after'] == 3
+    assert collapsed['groups'] == 1
+    # The most confident copy is kept in its own interview, with the evidence of the whole group
+    kept_erik, kept_sanne = collapsed['interviews']
+    assert [s.text for s in kept_erik.statements] == ["Ik werk het liefst vanuit huis op dinsdag"]
+    duplicate = kept_sanne.statements[0]
+    assert duplicate.confidence == 0.9
+    assert duplicate.metadata['evidence_count'] == 2
+    assert duplicate.metadata['evidence_interviewees'] == ["Erik", "Sanne"]
+    assert collapsed['statement_indexes'] == [[1], [0, 1]]
+    # The originals are untouched
+    assert len(erik.statements) == 2 and 'evidence_count' not in sanne.statements[0].metadata
+
+
+def test_different_statements_are_kept(make_interview):
+    interview = make_interview("Erik", [
+        "De app is erg makkelijk in gebruik",
+        "De app is erg moeilijk te installeren op een oude laptop",
+        "Ik gebruik de app elke ochtend in de trein",
+    ])
+    collapsed = collapse_near_duplicates([interview])
+    assert collapsed['statements_after'] == 3 and collapsed['groups'] == 0
+    assert collapsed['statement_indexes'] == [[0, 1, 2]]
+
+
+def test_interviews_without_kept_statements_are_left_out(make_interview):
+    first = make_interview("Erik", [("Ik vind thuiswerken heel prettig en rustig", 'voelt', 0.9)])
+    second = make_interview("Sanne", [("Ik vind thuiswerken heel prettig en rustig.", 'voelt', 0.5)])
+    collapsed = collapse_near_duplicates([first, second])
+    assert [i.interviewee for i in collapsed['interviews']] == ["Erik"]
+    assert collapsed['statement_indexes'] == [[0]]
+
+
+def test_empty_corpus():
+    collapsed = collapse_near_duplicates([])
+    assert collapsed['interviews'] == [] and collapsed['statements_after'] == 0 and collapsed['groups'] == 0
+
+
+def test_duplicate_transcripts_are_found(make_interview):
+    transcript = " ".join(f"Vraag {i}: hoe bevalt het werken met de nieuwe app op afdeling {i}?" for i in range(40))
+    retyped = transcript.replace("afdeling 7?", "de afdeling van Sanne?")
+    other = " ".join(f"Onderwerp {i} gaat over de kantine en het eten op vrijdag {i}." for i in range(40))
+    interviews = []
+    for name, text in [("Erik", transcript), ("Sanne", retyped), ("Tom", other)]:
+        interview = make_interview(name, [])
+        interview.raw_text = text
+        interviews.append(interview)
+
+    matches = find_duplicate_interviews(transcript, interviews[1:])
+    assert [match['filename'] for match in matches] == ["interview_sanne.json"]
+    assert 0.8 <= matches[0]['similarity'] < 1.0
+
+    assert duplicate_interview_groups(interviews) == {
+        "interview_erik.json": ["interview_sanne.json"],
+        "interview_sanne.json": ["interview_erik.json"],
+    }
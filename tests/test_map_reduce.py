@@ -0,0 +1,109 @@
+import re
+
+import pytest
+
+from src.processors.analysis_processor import PENDING_SECTION, analyze_interviews, assemble_sections
+
+QUESTIONS = ["Wat vinden medewerkers van hun werkplek?"]
+TOPICS = [
+    "de kantine serveert te weinig vegetarisch eten", "het parkeren bij kantoor kost veel tijd",
+    "de nieuwe laptop start erg langzaam op", "vergaderingen duren vaak langer dan gepland",
+    "thuiswerken geeft meer rust om te schrijven", "de trein naar Utrecht is vaak vertraagd",
+    "het intranet is slecht doorzoekbaar", "collega's helpen elkaar graag met vragen",
+    "de salarisstrook is lastig te lezen", "de koffieautomaat is regelmatig stuk",
+    "trainingen zijn goed georganiseerd", "de werkdruk piekt aan het eind van het kwartaal",
+]
+# Small map chunks, so every interview is split over several partial analyses
+OPTIONS = dict(mode='map_reduce', chunk_tokens=50, use_cache=False, relevance_top_k=None)
+
+
+@pytest.fixture
+def interviews(make_interview):
+    return [
+        make_interview(name, [f"{name} zegt dat {topic}" for topic in TOPICS[4 * k:4 * k + 4]])
+        for k, name in enumerate(["Erik", "Sanne", "Tom"])
+    ]
+
+
+def _corpus(request_text):
+    """Corpus label and lines of an analysis request."""
+    label, rest = request_text.split(':\n', 1)
+    return label, rest.split('\nOnderzoeksvragen:')[0]
+
+
+def test_every_statement_is_analysed_once_then_synthesised(fake_backend, interviews):
+    result = analyze_interviews(interviews, QUESTIONS, **OPTIONS)
+
+    assert result['mode'] == 'map_reduce'
+    *maps, reduce = [_corpus(text) for text in fake_backend.request_texts()]
+    assert len(maps) == result['partial_analyses'] > len(interviews)
+    assert {label for label, _ in maps} == {"Interview Statements"}
+    sent = [line.split(' (Betrouwbaarheid')[0] for _, corpus in maps for line in corpus.split('\n')]
+    assert sorted(sent) == sorted(s.text for interview in interviews for s in interview.statements)
+
+    # The synthesis sees one block per partial, labelled with the interview and its part
+    label, corpus = reduce
+    assert label == "Deelanalyses"
+    parts = re.findall(r'^### Deelanalyse: (.+) \((\d+) statements\)$', corpus, flags=re.M)
+    assert len(parts) == len(maps)
+    assert sum(int(count) for _, count in parts) == 12
+    assert any(name.startswith("Erik (deel 1/") for name, _ in parts)
+    assert result['usage']['calls'] == len(maps) + 1
+    assert result['raw_response'].startswith("## Samenvatting")
+
+
+def test_partials_are_combined_until_they_fit_the_synthesis(fake_backend, interviews):
+    result = analyze_interviews(interviews, QUESTIONS, max_prompt_tokens=250, **OPTIONS)
+
+    corpora = [_corpus(text) for text in fake_backend.request_texts()]
+    combined = [corpus for label, corpus in corpora if label == "Deelanalyses"][:-1]
+    assert combined, "expected at least one level of combined partial analyses"
+    *_, (label, final) = corpora
+    assert label == "Deelanalyses"
+    assert re.findall(r'^### Deelanalyse: (Combinatie \d+\.\d+)', final, flags=re.M)
+    assert len(re.findall(r'^### Deelanalyse:', final, flags=re.M)) == result['partial_analyses']
+    # Statement counts add up through the combination levels
+    assert sum(int(n) for n in re.findall(r'\((\d+) statements\)$', final, flags=re.M)) == 12
+
+
+def test_cached_partials_are_not_sent_again(fake_backend, interviews):
+    options = {**OPTIONS, 'use_cache': True}
+    first = analyze_interviews(interviews, QUESTIONS, **options)
+    fake_backend.requests.clear()
+
+    second = analyze_interviews(interviews, QUESTIONS, **options)
+
+    assert [_corpus(text)[0] for text in fake_backend.request_texts()] == ["Deelanalyses"]
+    assert second['raw_response'] == first['raw_response']
+
+
+def test_auto_mode_sends_small_corpora_in_one_prompt(fake_backend, interviews):
+    result = analyze_interviews(interviews, QUESTIONS, mode='auto', relevance_top_k=None, use_cache=False)
+    assert result['mode'] == 'single'
+    assert [_corpus(text)[0] for text in fake_backend.request_texts()] == ["Interview Statements"]
+
+    result = analyze_interviews(interviews, QUESTIONS, mode='auto', max_prompt_tokens=100, chunk_tokens=50,
+                                relevance_top_k=None, use_cache=False)
+    assert result['mode'] == 'map_reduce'
+
+
+def test_near_duplicates_are_sent_once(fake_backend, make_interview):
+    interviews = [
+        make_interview("Erik", [("De app is erg makkelijk in gebruik voor nieuwe medewerkers", 'denkt', 0.7)]),
+        make_interview("Sanne", [("De app is erg makkelijk in gebruik voor nieuwe medewerkers!", 'denkt', 0.9)]),
+    ]
+    result = analyze_interviews(interviews, QUESTIONS, mode='single', relevance_top_k=None)
+    assert result['statements_total'] == 2 and result['duplicates_collapsed'] == 1
+    (_, corpus), = [_corpus(text) for text in fake_backend.request_texts()]
+    assert corpus == (
+        "De app is erg makkelijk in gebruik voor nieuwe medewerkers! "
+        "(Betrouwbaarheid: 0.90; 2x genoemd door 2 geïnterviewde(n))"
+    )
+
+
+def test_assemble_sections_marks_missing_parts_as_pending():
+    questions = ["Vraag een?", "Vraag twee?"]
+    assert assemble_sections(questions, {1: "Antwoord twee"}) == (
+        f"## Samenvatting\n{PENDING_SECTION}\n\n## Vraag een?\n{PENDING_SECTION}\n\n## Vraag twee?\nAntwoord twee"
+    )
+    assert assemble_sections(questions, {0: "Een", 1: "Twee"}, "Kort").startswith("## Samenvatting\nKort\n\n## Vraag een?\nEen")
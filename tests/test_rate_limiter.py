@@ -0,0 +1,121 @@
+import threading
+from types import SimpleNamespace
+
+import anthropic
+import pytest
+
+from src.utils.llm_backend import FakeBackend
+from src.utils.rate_limiter import (
+    PRIORITY_ANALYSIS, PRIORITY_EXTRACTION, PRIORITY_INTERACTIVE, RequestScheduler
+)
+
+PARAMS = dict(model='test', max_tokens=500, messages=[{'role': 'user', 'content': 'Hallo'}])
+
+
+def _flaky(backend, failures):
+    """A call that fails with an injected rate limit or overload the first ``failures`` times."""
+    def call():
+        backend.failure_rate = 1.0 if backend.calls < failures else 0.0
+        return backend.create(**PARAMS)
+    return call
+
+
+def test_waiting_calls_are_served_by_priority():
+    # 240 requests per minute: one more request every 0.25 s once the bucket is empty
+    scheduler = RequestScheduler(240, 1e9, 1e9)
+    scheduler.requests.take(scheduler.requests.capacity)
+    served = []
+
+    def acquire(priority):
+        scheduler.acquire(priority, 0, 0)
+        served.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=(p,)) for p in (PRIORITY_EXTRACTION, PRIORITY_ANALYSIS, PRIORITY_INTERACTIVE)]
+    # All three are queued long before the first request is available
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert served == [PRIORITY_INTERACTIVE, PRIORITY_ANALYSIS, PRIORITY_EXTRACTION]
+    assert scheduler.stats()['throttled'] == 3
+
+
+def test_transient_errors_are_retried():
+    scheduler = RequestScheduler(1e9, 1e9, 1e9, max_retries=3, base_delay=0.001, max_delay=0.001)
+    backend = FakeBackend(seed=1)
+    response = scheduler.call(_flaky(backend, 2), output_tokens=500)
+    assert response.content[0].text
+    assert backend.calls == 3
+    stats = scheduler.stats()
+    assert stats['calls'] == 3 and stats['retried'] == 2 and stats['failed'] == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = RequestScheduler(1e9, 1e9, 1e9, max_retries=1, base_delay=0.001, max_delay=0.001)
+    backend = FakeBackend(seed=1)
+    with pytest.raises((anthropic.RateLimitError, anthropic.OverloadedError)):
+        scheduler.call(_flaky(backend, 5), output_tokens=500)
+    assert backend.calls == 2
+    assert scheduler.stats()['failed'] == 1
+
+
+def test_other_errors_are_not_retried():
+    scheduler = RequestScheduler(1e9, 1e9, 1e9, max_retries=3)
+
+    def broken():
+        raise ValueError("kapot")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken)
+    stats = scheduler.stats()
+    assert stats['calls'] == 1 and stats['retried'] == 0 and stats['failed'] == 1
+
+
+def test_reconcile_corrects_the_output_reservation():
+    scheduler = RequestScheduler(1e9, 1e9, 6000)
+    capacity = scheduler.output_tokens.capacity
+
+    scheduler.output_tokens.take(1000)
+    scheduler.reconcile(1000, SimpleNamespace(output_tokens=100))
+    assert scheduler.output_tokens.level == capacity - 100
+
+    scheduler.output_tokens.take(1000)
+    scheduler.reconcile(1000, SimpleNamespace(output_tokens=1500))
+    assert scheduler.output_tokens.level == capacity - 100 - 1500
+
+    # Failed or abandoned calls give their whole reservation back
+    scheduler.output_tokens.take(1000)
+    scheduler.reconcile(1000, None)
+    assert scheduler.output_tokens.level == capacity - 100 - 1500
+
+
+def test_failed_calls_give_back_their_reservation():
+    scheduler = RequestScheduler(1e9, 1e9, 6000, max_retries=2, base_delay=0.001, max_delay=0.001)
+    backend = FakeBackend(seed=1)
+    with pytest.raises((anthropic.RateLimitError, anthropic.OverloadedError)):
+        scheduler.call(_flaky(backend, 5), output_tokens=1000)
+    assert scheduler.output_tokens.level == pytest.approx(scheduler.output_tokens.capacity)
+
+
+def test_create_message_reserves_and_reconciles_the_output_tokens():
+    scheduler = RequestScheduler(1e9, 1e9, 6000)
+    backend = FakeBackend()
+    response = scheduler.create_message(backend, PARAMS)
+    # Only the real output is charged; the refill over the call itself is negligible at 100 tokens/s
+    expected = scheduler.output_tokens.capacity - response.usage.output_tokens
+    assert scheduler.output_tokens.level == pytest.approx(expected, abs=1)
+
+
+def test_open_stream_returns_its_reservation():
+    scheduler = RequestScheduler(1e9, 1e9, 6000)
+    stream, reserved = scheduler.open_stream(FakeBackend(), PARAMS)
+    try:
+        text = ''.join(stream.text_stream)
+    finally:
+        stream.close()
+    assert reserved == PARAMS['max_tokens']
+    assert text
+    scheduler.reconcile(reserved, stream.get_final_message().usage)
+    expected = scheduler.output_tokens.capacity - stream.get_final_message().usage.output_tokens
+    assert scheduler.output_tokens.level == pytest.approx(expected, abs=1)
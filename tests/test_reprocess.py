@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+from src.processors.ai_processor import process_interview_with_ai, reprocess_interview_with_ai, stream_interview_with_ai
+from src.utils.llm_backend import _request_text
+
+SENTENCES = [f"Onderwerp {i:02d} van het gesprek gaat over de app en het werk." for i in range(12)]
+TEXT = " ".join(SENTENCES)
+OPTIONS = dict(max_segment_tokens=40, overlap_sentences=1, max_workers=1, use_cache=False)
+
+
+def _one_statement_per_sentence(params):
+    # Unlike fake_extraction_response, the statement does not depend on where the sentence is in the
+    # segment, so a sentence in the overlap of two segments gives the same statement in both
+    segment = _request_text(params).split(':\n', 1)[-1]
+    return '\n\n'.join(
+        f"TYPE: zegt\nTEKST: Erik zegt {sentence.rstrip('.').lower()}\nZEKERHEID: 0.9"
+        for sentence in re.split(r'(?<=\.)\s+', segment)
+    )
+
+
+@pytest.fixture(autouse=True)
+def extraction_backend(fake_backend):
+    fake_backend.responder = _one_statement_per_sentence
+    return fake_backend
+
+
+def _segment_texts(backend):
+    return [text.split(':\n', 1)[-1] for text in backend.request_texts()]
+
+
+def test_overlap_statements_are_kept_once(fake_backend):
+    interview = process_interview_with_ai(TEXT, "Erik", **OPTIONS)
+    assert len(fake_backend.requests) == len(interview.metadata['segment_map']) > 1
+    texts = [s.text for s in interview.statements]
+    assert len(texts) == len(SENTENCES) == len(set(texts))
+    assert all(s.metadata['segment_hash'] for s in interview.statements)
+
+
+def test_only_changed_segments_are_extracted_again(fake_backend):
+    interview = process_interview_with_ai(TEXT, "Erik", **OPTIONS)
+    interview.statements[0].text = "Erik zegt iets dat de onderzoeker heeft aangepast"
+    interview.statements[0].metadata['edited'] = True
+    fake_backend.requests.clear()
+
+    edited = TEXT.replace("Onderwerp 09 van", "Onderwerp negen van")
+    updated = reprocess_interview_with_ai(interview, edited, **OPTIONS)
+
+    info = updated.metadata['reprocessing']
+    assert len(fake_backend.requests) == info['extracted_segments'] < info['segments']
+    assert all("Onderwerp negen" in text for text in _segment_texts(fake_backend))
+    texts = [s.text for s in updated.statements]
+    # The manual edit in an unchanged segment survives, the corrected sentence is extracted anew
+    assert texts[0] == "Erik zegt iets dat de onderzoeker heeft aangepast"
+    assert any("onderwerp negen" in text for text in texts)
+    assert not any("onderwerp 09" in text for text in texts)
+    assert len(texts) == len(SENTENCES) == len(set(texts))
+
+
+def test_edits_of_removed_segments_are_kept_at_the_end(fake_backend):
+    interview = process_interview_with_ai(TEXT, "Erik", **OPTIONS)
+    interview.statements[5].text = "Erik zegt iets wat alleen de onderzoeker schreef"
+    interview.statements[5].metadata['edited'] = True
+
+    edited = TEXT.replace(SENTENCES[5], "")
+    updated = reprocess_interview_with_ai(interview, edited, **OPTIONS)
+
+    assert updated.metadata['reprocessing']['kept_edits'] == 1
+    assert updated.statements[-1].text == "Erik zegt iets wat alleen de onderzoeker schreef"
+    assert not any("onderwerp 05" in s.text for s in updated.statements)
+
+
+def test_streaming_yields_the_same_statements(fake_backend):
+    metrics = {}
+    streamed = list(stream_interview_with_ai(TEXT, "Erik", metrics=metrics, **OPTIONS))
+    processed = process_interview_with_ai(TEXT, "Erik", **OPTIONS)
+    assert [(s.text, s.metadata) for s in streamed] == [(s.text, s.metadata) for s in processed.statements]
+    assert metrics['segment_map'] == processed.metadata['segment_map']
+
+
+def test_unchanged_text_retries_only_the_failed_segments(fake_backend):
+    interview = process_interview_with_ai(TEXT, "Erik", **OPTIONS)
+    failed_hash = interview.metadata['segment_map'][2]['hash']
+    interview.statements = [s for s in interview.statements if s.metadata['segment_hash'] != failed_hash]
+    interview.metadata['failed_segments'] = [2]
+    fake_backend.requests.clear()
+
+    updated = reprocess_interview_with_ai(interview, TEXT, **OPTIONS)
+
+    assert len(fake_backend.requests) == 1
+    assert 'failed_segments' not in updated.metadata
+    assert [s.text for s in updated.statements] == [
+        s.text for s in process_interview_with_ai(TEXT, "Erik", **OPTIONS).statements
+    ]
+
+
+def test_cached_segments_are_not_sent_again(fake_backend):
+    options = {**OPTIONS, 'use_cache': True}
+    first = process_interview_with_ai(TEXT, "Erik", **options)
+    calls = len(fake_backend.requests)
+    second = process_interview_with_ai(TEXT, "Erik", **options)
+    assert len(fake_backend.requests) == calls
+    assert [s.text for s in second.statements] == [s.text for s in first.statements]
@@ -0,0 +1,83 @@
+from src.processors.text_processor import (
+    dutch_sentence_split, estimate_tokens, pack_sentence_ranges, packing_sentences, plan_segments, segment_hash,
+    segment_sentences
+)
+
+
+def _sentences(count):
+    return [f"Zin nummer {i:02d} gaat over het werk en de app." for i in range(count)]
+
+
+def _tokens(sentences, ranges):
+    return [sum(estimate_tokens(s) for s in sentences[a:b]) for a, b in ranges]
+
+
+def test_sentence_split_keeps_abbreviations_and_punctuation():
+    text = "Ik gebruik bijv. de app. Werkt het? Ja!\nNieuwe regel"
+    assert dutch_sentence_split(text) == ["Ik gebruik bijv. de app.", "Werkt het?", "Ja!", "Nieuwe regel"]
+
+
+def test_ranges_stay_within_the_budget_and_cover_every_sentence():
+    sentences = _sentences(20)
+    budget = 3 * estimate_tokens(sentences[0])
+    ranges = pack_sentence_ranges(sentences, budget, overlap_sentences=0)
+    assert all(tokens <= budget for tokens in _tokens(sentences, ranges))
+    # Without overlap the ranges are consecutive and cover every sentence once
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(sentences)
+    assert all(a == previous_end for (_, previous_end), (a, _) in zip(ranges, ranges[1:]))
+    assert ranges == [(0, 3), (3, 6), (6, 9), (9, 12), (12, 15), (15, 18), (18, 20)]
+
+
+def test_overlap_repeats_the_last_sentences_of_the_previous_range():
+    sentences = _sentences(10)
+    budget = 3 * estimate_tokens(sentences[0])
+    ranges = pack_sentence_ranges(sentences, budget, overlap_sentences=1)
+    assert ranges == [(0, 3), (2, 5), (4, 7), (6, 9), (8, 10)]
+    assert all(tokens <= budget for tokens in _tokens(sentences, ranges))
+
+
+def test_overlap_shrinks_rather_than_exceeding_the_budget():
+    sentences = _sentences(6)
+    budget = 2 * estimate_tokens(sentences[0])
+    # Two sentences of overlap plus a new one would not fit, so only one is repeated
+    ranges = pack_sentence_ranges(sentences, budget, overlap_sentences=2)
+    assert ranges == [(0, 2), (1, 3), (2, 4), (3, 5), (4, 6)]
+
+
+def test_long_sentences_are_broken_up_to_fit():
+    long_sentence = " ".join(["woord"] * 200) + "."
+    budget = 50
+    sentences = packing_sentences(long_sentence, budget)
+    assert len(sentences) > 1
+    assert all(estimate_tokens(s) <= budget for s in sentences)
+    assert " ".join(sentences) == long_sentence
+
+
+def test_segment_map_hashes_the_segments():
+    text = " ".join(_sentences(12))
+    segments, segment_map = plan_segments(text, 30, 1)
+    assert len(segments) == len(segment_map) > 1
+    assert [entry['hash'] for entry in segment_map] == [segment_hash(segment) for segment in segments]
+    sentences = packing_sentences(text, 30)
+    assert segment_sentences(text, segment_map, 30) == [sentences[e['start']:e['end']] for e in segment_map]
+
+    # Entries that no longer match the text are skipped
+    stale = [{**segment_map[0], 'hash': 'stale'}] + segment_map[1:]
+    assert segment_sentences(text, stale, 30) == [sentences[e['start']:e['end']] for e in segment_map[1:]]
+
+
+def test_edit_keeps_the_boundaries_of_unchanged_segments():
+    sentences = _sentences(30)
+    text = " ".join(sentences)
+    _, segment_map = plan_segments(text, 40, 1)
+
+    # Insert a sentence near the start; without alignment every later boundary would shift
+    edited = " ".join(sentences[:2] + ["Een nieuwe zin die eerder nog niet in het transcript stond."] + sentences[2:])
+    previous = segment_sentences(text, segment_map, 40)
+    _, edited_map = plan_segments(edited, 40, 1, previous)
+
+    old_hashes = [entry['hash'] for entry in segment_map]
+    new_hashes = [entry['hash'] for entry in edited_map]
+    # Only the segment holding the new sentence is new; every later one is reused as it was
+    assert [h in old_hashes for h in new_hashes] == [False] + [True] * (len(new_hashes) - 1)
+    assert new_hashes[1:] == old_hashes[1:]
@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+from src.utils.statement_index import COMPACT_FRACTION, StatementIndex, parse_query
+
+
+@pytest.fixture
+def index(make_interview):
+    index = StatementIndex(directory=None)
+    interviews = [
+        make_interview("Erik", [
+            ("Erik vindt de app makkelijk in gebruik", 'denkt', 0.9),
+            ("Erik gebruikt de app elke dag op zijn werk", 'doet', 0.7),
+            ("Erik maakt zich zorgen over de kosten van de app", 'voelt', 0.5),
+        ]),
+        make_interview("Sanne", [
+            ("Sanne zegt dat de app traag werkt", 'zegt', 0.8),
+            ("Sanne gebruikte vroeger een andere app", 'doet', 0.6),
+        ]),
+    ]
+    for interview in interviews:
+        index.update_interview(interview.metadata['filename'], interview.interviewee, interview.statements)
+    return index
+
+
+def _texts(hits):
+    return [hit['text'] for hit in hits]
+
+
+def test_parse_query():
+    assert parse_query('"de app werkt" gebruik* kosten') == [
+        ('phrase', ['app', 'werkt']), ('prefix', 'gebruik'), ('term', 'kost')
+    ]
+    assert parse_query('de het een') == []
+
+
+def test_term_query_matches_stems_and_ranks_by_bm25(index):
+    hits = index.search("kosten")
+    assert _texts(hits) == ["Erik maakt zich zorgen over de kosten van de app"]
+    assert hits[0]['filename'] == "interview_erik.json" and hits[0]['statement'] == 2
+    # Every statement mentions the app, so the shorter ones score higher
+    scores = [hit['score'] for hit in index.search("app", limit=None)]
+    assert len(scores) == 5 and scores == sorted(scores, reverse=True)
+
+
+def test_phrase_query_needs_consecutive_words(index):
+    assert _texts(index.search('"app traag"')) == ["Sanne zegt dat de app traag werkt"]
+    assert index.search('"traag app"') == []
+
+
+def test_prefix_query_expands_to_every_matching_term(index):
+    assert sorted(_texts(index.search("gebruik*"))) == [
+        "Erik gebruikt de app elke dag op zijn werk",
+        "Erik vindt de app makkelijk in gebruik",
+        "Sanne gebruikte vroeger een andere app",
+    ]
+
+
+def test_all_clauses_must_match(index):
+    assert _texts(index.search("app werk")) == ["Erik gebruikt de app elke dag op zijn werk"]
+    assert _texts(index.search("werkt")) == ["Sanne zegt dat de app traag werkt"]
+    assert index.search("app fiets") == []
+
+
+def test_filters(index):
+    assert sorted(_texts(index.search("app", types=['doet']))) == [
+        "Erik gebruikt de app elke dag op zijn werk", "Sanne gebruikte vroeger een andere app"
+    ]
+    assert {hit['interviewee'] for hit in index.search("app", interviewees=['Sanne'])} == {"Sanne"}
+    assert all(0.6 <= hit['confidence'] <= 0.8 for hit in index.search("app", min_confidence=0.6, max_confidence=0.8))
+    assert index.search("app", filenames=[]) == []
+
+
+def test_update_replaces_and_remove_drops_an_interview(index, make_interview):
+    updated = make_interview("Sanne", ["Sanne vindt de nieuwe versie van de app snel"])
+    index.update_interview("interview_sanne.json", "Sanne", updated.statements)
+    assert index.search("traag") == []
+    assert _texts(index.search("snel")) == ["Sanne vindt de nieuwe versie van de app snel"]
+
+    index.remove_interview("interview_erik.json")
+    assert index.search("kosten") == []
+    assert index.stats()['interviews'] == 1 and index.stats()['statements'] == 1
+
+
+def test_compaction_renumbers_without_changing_results(make_interview):
+    index = StatementIndex(directory=None)
+    for i in range(8):
+        interview = make_interview(f"Persoon{i}", [f"Persoon{i} vindt de app goed", f"Persoon{i} werkt graag thuis"])
+        index.update_interview(f"interview_{i}.json", interview.interviewee, interview.statements)
+
+    for i in range(0, 8, 2):
+        index.remove_interview(f"interview_{i}.json")
+        # Gaps are left until they pass COMPACT_FRACTION of the doc ids
+        assert len(index._docs) - index.stats()['statements'] <= COMPACT_FRACTION * len(index._docs)
+
+    # Removing half the statements compacted the doc ids at least once
+    assert len(index._docs) < 16
+    hits = index.search("thuis", limit=None)
+    assert sorted((hit['filename'], hit['statement']) for hit in hits) == [
+        (f"interview_{i}.json", 1) for i in range(1, 8, 2)
+    ]
+    assert [hit['text'] for hit in index.search('"werkt graag"', interviewees=["Persoon3"])] == ["Persoon3 werkt graag thuis"]
+
+
+def test_shards_are_reused_and_stale_files_reindexed(tmp_path):
+    data_dir, index_dir = tmp_path / "data", tmp_path / "index"
+    data_dir.mkdir()
+
+    def write(filename, texts):
+        data = {'interviewee': "Erik", 'statements': [{'text': t, 'type': 'zegt', 'confidence': 0.8} for t in texts]}
+        (data_dir / filename).write_text(json.dumps(data), encoding='utf-8')
+
+    write("interview_erik.json", ["Erik zegt dat de app werkt"])
+    assert _texts(StatementIndex(str(index_dir), str(data_dir)).search("app")) == ["Erik zegt dat de app werkt"]
+    assert os.listdir(index_dir) == ["interview_erik.json"]
+
+    # A file changed outside save_interview no longer has the mtime its shard records
+    write("interview_erik.json", ["Erik zegt dat de website werkt"])
+    os.utime(data_dir / "interview_erik.json", (1, 1))
+    index = StatementIndex(str(index_dir), str(data_dir))
+    assert index.search("app") == []
+    assert _texts(index.search("website")) == ["Erik zegt dat de website werkt"]
+
+    # Shards of deleted interviews are dropped on load
+    os.remove(data_dir / "interview_erik.json")
+    assert StatementIndex(str(index_dir), str(data_dir)).search("website") == []
+    assert os.listdir(index_dir) == []
@@ -0,0 +1,67 @@
+from src.models import StatementType
+from src.processors.ai_processor import StatementParser, parse_statements
+
+RESPONSE = """TYPE: zegt
+TEKST: Sanne zegt verschillende hobby's te hebben
+ZEKERHEID: 1.0  # Directe uitspraak
+
+TYPE: denkt
+TEKST: Sanne vindt haar hobby's belangrijk
+ZEKERHEID: 0.8
+
+TYPE: voelt
+TEKST: Sanne voelt zich ontspannen tijdens het tekenen
+ZEKERHEID: 0.7"""
+
+
+def _feed_in_chunks(text, size):
+    parser = StatementParser()
+    statements = []
+    for i in range(0, len(text), size):
+        statements.extend(parser.feed(text[i:i + size]))
+    return statements + parser.close()
+
+
+def _summary(statements):
+    return [(s.type, s.text, s.confidence) for s in statements]
+
+
+def test_complete_response():
+    statements = parse_statements(RESPONSE)
+    assert _summary(statements) == [
+        (StatementType.STATEMENT, "Sanne zegt verschillende hobby's te hebben", 1.0),
+        (StatementType.THOUGHT, "Sanne vindt haar hobby's belangrijk", 0.8),
+        (StatementType.FEELING, "Sanne voelt zich ontspannen tijdens het tekenen", 0.7),
+    ]
+
+
+def test_chunks_split_anywhere_give_the_same_statements():
+    expected = _summary(parse_statements(RESPONSE))
+    # Sizes that split keywords, values and the blank separator lines
+    for size in (1, 2, 3, 5, 7, 13, 64):
+        assert _summary(_feed_in_chunks(RESPONSE, size)) == expected
+
+
+def test_statement_is_returned_once_its_block_is_closed():
+    parser = StatementParser()
+    assert parser.feed("TYPE: doet\nTEKST: Erik gebruikt de app dage") == []
+    assert parser.feed("lijks\nZEKERHEID: 0.9\n") == []
+    statements = parser.feed("\nTYPE: zegt\n")
+    assert _summary(statements) == [(StatementType.ACTION, "Erik gebruikt de app dagelijks", 0.9)]
+    assert parser.close() == []
+
+
+def test_close_flushes_a_block_without_trailing_newline():
+    parser = StatementParser()
+    assert parser.feed("TYPE: zegt\nTEKST: Erik zegt dat het werkt\nZEKERHEID: 0.6") == []
+    assert _summary(parser.close()) == [(StatementType.STATEMENT, "Erik zegt dat het werkt", 0.6)]
+
+
+def test_invalid_blocks_are_skipped():
+    text = (
+        "TYPE: vraagt\nTEKST: Erik vraagt iets\nZEKERHEID: 0.9\n\n"
+        "TEKST: Erik zegt iets zonder type\n\n"
+        "TYPE: denkt\nTEKST: Erik denkt dat het kan\nZEKERHEID: hoog\n"
+    )
+    # An unreadable confidence falls back to the default
+    assert _summary(_feed_in_chunks(text, 4)) == [(StatementType.THOUGHT, "Erik denkt dat het kan", 0.8)]